@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime
+from sqlalchemy import Boolean, Column, Integer, Float, String, DateTime, Text, UniqueConstraint
 from datetime import datetime
 from .database import Base
 
@@ -12,7 +12,7 @@ class TrafficData(Base):
     free_flow_speed = Column(Float)
     confidence = Column(Float)
     road_closure = Column(String(50))
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class WeatherData(Base):
@@ -23,7 +23,9 @@ class WeatherData(Base):
     temperature = Column(Float)
     humidity = Column(Float)
     condition = Column(String(50))  # length required
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    description = Column(String(100))  # weather[0].description, what /weather/{city} reports as condition
+    wind_speed = Column(Float)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 class AirQualityData(Base):
     __tablename__ = "air_quality_data"
@@ -36,31 +38,36 @@ class AirQualityData(Base):
     co = Column(Float)
     no2 = Column(Float)
     o3 = Column(Float)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
 
 
 class TrafficHourly(Base):
     __tablename__ = "traffic_hourly"
+    __table_args__ = (UniqueConstraint("location", "hour_start", name="uq_traffic_hourly_location_hour"),)
     id = Column(Integer, primary_key=True)
     location = Column(String(100))  # ✅ specify length
     hour_start = Column(DateTime)
     avg_speed = Column(Float)
     free_flow_avg = Column(Float)
     samples = Column(Integer)
+    imputed = Column(Boolean, default=False)  # values filled by app.services.imputer (samples = 0 for whole missing hours)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class WeatherHourly(Base):
     __tablename__ = "weather_hourly"
+    __table_args__ = (UniqueConstraint("city", "hour_start", name="uq_weather_hourly_city_hour"),)
     id = Column(Integer, primary_key=True)
     city = Column(String(100))  # ✅ specify length
     hour_start = Column(DateTime)
     avg_temp = Column(Float)
     avg_humidity = Column(Float)
     samples = Column(Integer)
+    imputed = Column(Boolean, default=False)  # values filled by app.services.imputer (samples = 0 for whole missing hours)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class AirQualityHourly(Base):
     __tablename__ = "air_quality_hourly"
+    __table_args__ = (UniqueConstraint("city", "hour_start", name="uq_air_quality_hourly_city_hour"),)
 
     id = Column(Integer, primary_key=True)
     city = Column(String(100))
@@ -71,5 +78,67 @@ class AirQualityHourly(Base):
     avg_no2 = Column(Float)
     avg_o3 = Column(Float)
     samples = Column(Integer)
+    imputed = Column(Boolean, default=False)  # values filled by app.services.imputer (samples = 0 for whole missing hours)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+class CityHourlyJoined(Base):
+    """Weather × air quality × traffic aligned on hour_start (maintained by app.services.hourly_join)."""
+    __tablename__ = "city_hourly_joined"
+    __table_args__ = (UniqueConstraint("city", "hour_start", name="uq_joined_city_hour"),)
+
+    id = Column(Integer, primary_key=True)
+    city = Column(String(100))
+    hour_start = Column(DateTime, index=True)
+    avg_temp = Column(Float)
+    avg_humidity = Column(Float)
+    avg_aqi = Column(Float)
+    avg_pm25 = Column(Float)
+    avg_no2 = Column(Float)
+    avg_o3 = Column(Float)
+    avg_speed = Column(Float)
+    free_flow_avg = Column(Float)
+    congestion_ratio = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ForecastState(Base):
+    __tablename__ = "forecast_state"
+    __table_args__ = (UniqueConstraint("source", "series_key", "metric", name="uq_forecast_series"),)
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String(50))
+    series_key = Column(String(100))
+    metric = Column(String(50))
+    state = Column(Text)  # JSON-encoded Holt-Winters state
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ValidationState(Base):
+    __tablename__ = "validation_state"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(100), unique=True)
+    last_id = Column(Integer, default=0)   # rows with id <= last_id are already in stats
+    stats = Column(Text)  # JSON-encoded running stats (see app.utils.data_validator)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ImputationState(Base):
+    __tablename__ = "imputation_state"
+    __table_args__ = (UniqueConstraint("table_name", "series_key", name="uq_imputation_series"),)
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(100))
+    series_key = Column(String(100))
+    last_hour = Column(DateTime)  # gaps before this hour have been filled
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SchemaState(Base):
+    __tablename__ = "schema_state"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True)
+    fingerprint = Column(String(64))  # hash of the declared tables (see app.utils.db_migrator)
+    updated_at = Column(DateTime, default=datetime.utcnow)
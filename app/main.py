@@ -1,19 +1,131 @@
+from app.utils import startup
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
-from app.routes import weather, air_quality, traffic, analytics
-from app.db import models
+from app.routes import weather, air_quality, traffic, analytics, latest, recent, export, charts, forecast, health, admin
 from app.db.database import engine
+from app.utils.db_migrator import ensure_schema
+from app.utils import logs, metrics, profiler
+from app.services import chart_renderer
+from app.services.background import background
+from app.utils import admission, api_client
+import anyio
+from app.services.latest_index import latest_index
+from app.services.spatial_index import spatial_index
+from app.services.recent_store import recent_store
+from app.services.analytics_store import analytics_store
+
+
+def warm_analytics_state():
+    """Warm the detector, profile cube, forecaster and joined view (runs after the API is serving)."""
+    # imported here, off the event loop: the aggregator pulls in pandas, which
+    # API workers need not wait for, and the background loops find them loaded
+    with startup.report.phase("import_services", background=True):
+        from app.services import data_collector, data_aggregator
+        from app.services.anomaly_detector import anomaly_detector
+        from app.services.profile_cube import profile_cube
+        from app.services.forecaster import forecaster
+        from app.services import hourly_join
+
+    try:
+        with startup.report.phase("recent_store", background=True):
+            series = recent_store.warm()
+        print(f"✅ Recent-readings store loaded ({series} series).")
+    except Exception as e:
+        print(f"⚠️ Recent-readings store warm-up failed: {e}")
+
+    try:
+        with startup.report.phase("anomaly_detector", background=True):
+            warmed = anomaly_detector.rebuild()
+        print(f"✅ Anomaly detector warmed ({warmed} series).")
+    except Exception as e:
+        print(f"⚠️ Anomaly detector warm-up failed: {e}")
+
+    try:
+        with startup.report.phase("profile_cube", background=True):
+            profiles = profile_cube.warm()
+        print(f"✅ Hour-of-week profile cube loaded ({profiles} profiles).")
+    except Exception as e:
+        print(f"⚠️ Profile cube warm-up failed: {e}")
+
+    try:
+        with startup.report.phase("forecaster", background=True):
+            series = forecaster.load()
+        print(f"✅ Forecast states loaded ({series} series).")
+    except Exception as e:
+        print(f"⚠️ Forecast state load failed: {e}")
+
+    try:
+        with startup.report.phase("hourly_join_backfill", background=True):
+            backfilled = hourly_join.ensure_backfilled()
+        if backfilled:
+            print(f"✅ Joined hourly view backfilled ({backfilled} rows).")
+    except Exception as e:
+        print(f"⚠️ Joined hourly view backfill failed: {e}")
+    startup.report.warmed()
+
+
+def prepare_serving():
+    # Create missing tables / run column migrations unless schema_state says they are current
+    with startup.report.phase("schema"):
+        ensure_schema(engine)
+
+    # Warm the latest-reading index before serving
+    try:
+        with startup.report.phase("latest_index"):
+            loaded = latest_index.rebuild()
+        print(f"✅ Latest-reading index rebuilt ({loaded} keys).")
+    except Exception as e:
+        print(f"⚠️ Latest-reading index rebuild failed: {e}")
+
+    try:
+        with startup.report.phase("spatial_index"):
+            indexed = spatial_index.rebuild()
+        print(f"✅ Traffic spatial index rebuilt ({indexed} locations).")
+    except Exception as e:
+        print(f"⚠️ Traffic spatial index rebuild failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    logs.setup_logging()
+    prepare_serving()
+
+    # Upstream calls (in flight + queued) are capped by the admission gates;
+    # grow the threadpool by that cap so DB-backed routes keep their full share.
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens += admission.reserved_threads()
+
+    # Warm-up, then the collector (asyncio task) and aggregator (process pool)
+    await background.start(warmup=warm_analytics_state)
+    print("✅ Background services launched (warm-up, then collector and aggregator; the aggregator also syncs the analytics store).")
+
+    startup.report.ready()
+    summary = startup.report.to_dict()
+    print(f"🚀 Ready in {summary['ready_ms']:.0f} ms (import {summary['import_ms']:.0f} ms, "
+          + ", ".join(f"{p['phase']} {p['ms']:.0f} ms" for p in summary["phases"] if not p["background"]) + ")")
+    try:
+        yield
+    finally:
+        # finish cycles in flight, then release the worker pools and the DuckDB file
+        await background.stop()
+        chart_renderer.shutdown()
+        api_client.close_all()
+        try:
+            recent_store.save()
+        except Exception as e:
+            print(f"⚠️ Recent-readings snapshot failed: {e}")
+        analytics_store.close()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="UrbanPulse Live Data API",
     description="Fetch live urban data for Smart City Analytics",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
 )
 
 @app.get("/favicon.ico", include_in_schema=False)
@@ -28,11 +140,23 @@ app.include_router(weather.router, prefix="/api")
 app.include_router(air_quality.router, prefix="/api")
 app.include_router(traffic.router, prefix="/api")
 app.include_router(analytics.router, prefix="/api")  # ✅ This line is critical
+app.include_router(latest.router, prefix="/api")
+app.include_router(recent.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
+app.include_router(charts.router, prefix="/api")
+app.include_router(forecast.router, prefix="/api")
+app.include_router(health.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.get("/")
 def root():
     return {"message": "Welcome to UrbanPulse API - Live Data Service"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint (route, upstream, collector, aggregator, DB pool and cache metrics)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,23 +166,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from app.services import data_collector, data_aggregator
-import threading
-
-@app.on_event("startup")
-def start_background_services():
-    # Collector thread (every ~7 min)
-    collector_thread = threading.Thread(target=data_collector.start_background_collector, daemon=True)
-    collector_thread.start()
-
-    # Aggregator thread (every 2 hours)
-    def run_aggregator():
-        import time
-        while True:
-            data_aggregator.aggregate_hourly_data()
-            time.sleep(2 * 60 * 60)  # every 2 hours
-    agg_thread = threading.Thread(target=run_aggregator, daemon=True)
-    agg_thread.start()
+# Opt-in request profiling (X-Profile header, ?profile= or PROFILE_SAMPLE_RATE)
+app.add_middleware(profiler.ProfilerMiddleware)
 
-    print("✅ Background collector and aggregator launched.")
+# Outermost, so route latency includes CORS handling and the streamed body
+app.add_middleware(metrics.MetricsMiddleware)
 
+startup.report.imported()
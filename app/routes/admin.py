@@ -0,0 +1,54 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException
+from app.config import settings
+from app.utils import profiler
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """Admin endpoints need ADMIN_TOKEN to be configured and sent as X-Admin-Token."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+def list_profiles(limit: int = 50):
+    """Recent request profiles, newest first (timings and SQL totals)."""
+    return {
+        "sample_rate": settings.PROFILE_SAMPLE_RATE,
+        "profiles": profiler.profiles(max(1, limit)),
+    }
+
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str):
+    """One profile with its SQL statements (slowest first) and top functions."""
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return profile
+
+
+@router.delete("/profiles")
+def clear_profiles():
+    profiler.clear_profiles()
+    return {"status": "cleared"}
+
+
+@router.get("/slow-queries")
+def list_slow_queries(limit: int = 100):
+    """Statements slower than SLOW_QUERY_MS from any engine, newest first."""
+    return {
+        "threshold_ms": settings.SLOW_QUERY_MS,
+        "queries": profiler.slow_queries(max(1, limit)),
+    }
+
+
+@router.delete("/slow-queries")
+def clear_slow_queries():
+    profiler.clear_slow_queries()
+    return {"status": "cleared"}
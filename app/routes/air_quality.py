@@ -1,11 +1,15 @@
+from urllib.parse import parse_qs, urlsplit
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-import requests
-from app.config import OPEN_METEO_URL
+from app.config import OPEN_METEO_URL, CITY, LATEST_MAX_AGE, LATITUDE, LONGITUDE
 from app.db.database import get_db
 from app.db import models
+from app.services.latest_index import latest_index
+from app.utils.api_client import client, DeadlineExceeded, UpstreamError, UpstreamHTTPError, UpstreamTimeout
+from app.utils.deadline import Deadline, live_deadline, mark_stale
+from app.utils.profiler import ProfiledRoute
 
-router = APIRouter(prefix="/air_quality", tags=["Air Quality"])
+router = APIRouter(prefix="/air_quality", tags=["Air Quality"], route_class=ProfiledRoute)
 
 
 # ---------- Utility: Calculate AQI from PM2.5 ----------
@@ -37,14 +41,61 @@ def calculate_aqi(pm25: float | None) -> float | None:
         return None
 
 
+def aqi_category(aqi_value: float | None) -> str:
+    """CPCB AQI category for an AQI value."""
+    if aqi_value is None:
+        return "No Data"
+    elif aqi_value <= 50:
+        return "Good"
+    elif aqi_value <= 100:
+        return "Satisfactory"
+    elif aqi_value <= 200:
+        return "Moderate"
+    elif aqi_value <= 300:
+        return "Poor"
+    elif aqi_value <= 400:
+        return "Very Poor"
+    return "Severe"
+
+
+def _request_meta():
+    """Coordinates and timezone the stored readings were requested with (Open-Meteo answers in GMT unless asked)."""
+    query = {k: v[0] for k, v in parse_qs(urlsplit(OPEN_METEO_URL).query).items()}
+    coordinates = {
+        "latitude": float(query.get("latitude", LATITUDE)),
+        "longitude": float(query.get("longitude", LONGITUDE)),
+    }
+    return coordinates, query.get("timezone", "GMT")
+
+
+def _from_record(record):
+    coordinates, tz = _request_meta()
+    return {
+        "source": "UrbanPulse latest stored reading",
+        "city": CITY,
+        "coordinates": coordinates,
+        "air_quality": {
+            name: record[field] if record[field] is not None else 0.0
+            for name, field in [("pm10", "pm10"), ("pm2_5", "pm25"), ("co", "co"),
+                                ("no2", "no2"), ("o3", "o3"), ("aqi", "aqi")]
+        },
+        "category": aqi_category(record["aqi"]),
+        "timezone": tz,
+        "observed_at": record["timestamp"],
+        "from_cache": True,
+    }
+
+
 # ---------- Main Endpoint: Live Air Quality ----------
 @router.get("/")
-def get_air_quality():
-    """Fetch live air quality data using Open-Meteo API."""
+def get_air_quality(live: bool = False, deadline: Deadline = Depends(live_deadline)):
+    """Fetch live air quality data using Open-Meteo API (served from the latest stored reading when fresh, or marked stale past the deadline)."""
+    cached = None if live else latest_index.get_fresh("air_quality", CITY, LATEST_MAX_AGE)
+    if cached:
+        return _from_record(cached)
+
     try:
-        response = requests.get(OPEN_METEO_URL, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = client("open_meteo").get(OPEN_METEO_URL, deadline=deadline)
 
         if not isinstance(data, dict) or "hourly" not in data:
             raise HTTPException(status_code=502, detail="Invalid response from Open-Meteo API")
@@ -57,22 +108,7 @@ def get_air_quality():
         o3 = (hourly.get("ozone") or [None])[-1]
 
         aqi_value = calculate_aqi(pm25)
-
-        # --- AQI Category ---
-        if aqi_value is None:
-            category = "No Data"
-        elif aqi_value <= 50:
-            category = "Good"
-        elif aqi_value <= 100:
-            category = "Satisfactory"
-        elif aqi_value <= 200:
-            category = "Moderate"
-        elif aqi_value <= 300:
-            category = "Poor"
-        elif aqi_value <= 400:
-            category = "Very Poor"
-        else:
-            category = "Severe"
+        category = aqi_category(aqi_value)
 
         # --- Safe structured return ---
         return {
@@ -94,9 +130,18 @@ def get_air_quality():
             "timezone": data.get("timezone", "Asia/Kolkata"),
         }
 
-    except requests.Timeout:
+    except HTTPException:
+        raise
+    except DeadlineExceeded:
+        stored = latest_index.get("air_quality", CITY)
+        if stored is None:
+            raise HTTPException(status_code=504, detail="Air Quality API timeout (deadline exceeded, no stored reading)")
+        return mark_stale("air_quality", _from_record(stored), stored)
+    except UpstreamTimeout:
         raise HTTPException(status_code=504, detail="Air Quality API timeout")
-    except requests.RequestException as e:
+    except UpstreamHTTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Open-Meteo API error: {e.text}")
+    except UpstreamError as e:
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
@@ -1,9 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from app.db.database import get_db
-from app.db.models import TrafficHourly, WeatherHourly, AirQualityHourly
+from app.db.models import TrafficHourly, WeatherHourly, AirQualityHourly, CityHourlyJoined
+from app.services.anomaly_detector import anomaly_detector
+from app.services.profile_cube import profile_cube, METRICS, RAW_FIELDS
+from app.services.latest_index import latest_index
+from app.services import hourly_join
+from app.services.analytics_store import (
+    analytics_store, AnalyticsQueryTimeout, AnalyticsStoreUnavailable, ReadOnlyQueryError,
+)
+from app.routes.admin import require_admin
+from app.utils import downsample
+import numpy as np
+from app.config import settings
+from app.utils.profiler import ProfiledRoute
+from datetime import datetime, timedelta, timezone
 
-router = APIRouter(prefix="/analytics", tags=["Analytics"])
+router = APIRouter(prefix="/analytics", tags=["Analytics"], route_class=ProfiledRoute)
 
 @router.get("/traffic/hourly")
 def get_traffic_hourly(db: Session = Depends(get_db)):
@@ -26,3 +40,189 @@ def get_air_hourly(db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="No air hourly data found")
     return data
 
+@router.get("/anomalies")
+def get_anomalies(since: datetime | None = None, series: str | None = None, limit: int = 100):
+    """Recent congestion-collapse / AQI-spike events, newest first."""
+    return {
+        "events": anomaly_detector.events(since=since, series=series, limit=max(1, min(limit, 500))),
+        "series": anomaly_detector.states(),
+    }
+
+@router.get("/profile/{source}/{key}")
+def get_profile(source: str, key: str, metric: str, at: datetime | None = None, week: bool = False):
+    """Expected hour-of-week band for a city/location metric, alongside the current value."""
+    if source not in METRICS or metric not in METRICS[source]:
+        raise HTTPException(status_code=404, detail=f"Unknown profile: {source}/{metric}")
+    try:
+        how, band = profile_cube.band(source, key, metric, at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Traffic key must be 'lat,lon'")
+    if band is None:
+        raise HTTPException(status_code=404, detail=f"No profile for {source}/{key}/{metric}")
+
+    result = {"source": source, "key": key, "metric": metric, "hour_of_week": how, "expected": band}
+
+    if at is None:
+        latest = latest_index.get(source, key)
+        current = None
+        if latest is not None:
+            if metric == "congestion_ratio":
+                speed, free_flow = latest.get("current_speed"), latest.get("free_flow_speed")
+                current = speed / free_flow if speed is not None and free_flow else None
+            else:
+                current = latest.get(RAW_FIELDS[metric])
+        status = None
+        if current is not None and band.get("p10") is not None:
+            status = "below" if current < band["p10"] else "above" if current > band["p90"] else "normal"
+        result.update({
+            "current": current,
+            "observed_at": latest["timestamp"] if latest else None,
+            "status": status,
+        })
+
+    if week:
+        result["week"] = profile_cube.week(source, key, metric)
+    return result
+
+@router.get("/joined")
+def get_joined(
+    city: str | None = None,
+    hours: int = 168,
+    window: int = 24,
+    max_points: int | None = None,
+    db: Session = Depends(get_db),
+):
+    """Hour-aligned weather × air quality × traffic series with rolling correlations."""
+    import pandas as pd
+    city = city or settings.CITY
+    since = (datetime.now(timezone.utc) - timedelta(hours=max(1, hours))).replace(tzinfo=None)
+    rows = (
+        db.query(CityHourlyJoined)
+        .filter(CityHourlyJoined.city == city, CityHourlyJoined.hour_start >= since)
+        .order_by(CityHourlyJoined.hour_start)
+        .all()
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No joined hourly data for {city}")
+
+    columns = ["hour_start"] + hourly_join.JOINED_COLUMNS
+    df = pd.DataFrame([{col: getattr(row, col) for col in columns} for row in rows], columns=columns)
+    df = df.astype({col: float for col in hourly_join.JOINED_COLUMNS})
+    correlations = hourly_join.rolling_correlations(df, max(3, window))
+
+    if max_points and len(df) > max_points:
+        # equal-count buckets keep rows and rolling correlations aligned
+        groups = np.arange(len(df)) * max_points // len(df)
+        df = df.groupby(groups).agg({"hour_start": "first", **{col: "mean" for col in hourly_join.JOINED_COLUMNS}})
+        for corr in correlations.values():
+            rolling = pd.Series(corr["rolling"], dtype=float).groupby(groups).mean()
+            corr["rolling"] = [None if pd.isna(v) else float(v) for v in rolling]
+
+    return {
+        "city": city,
+        "window": window,
+        "rows": [
+            {col: (None if pd.isna(value) else value) for col, value in record.items()}
+            for record in df.to_dict(orient="records")
+        ],
+        "correlations": correlations,
+    }
+
+
+SERIES_TABLES = {
+    "traffic": (TrafficHourly, "location"),
+    "weather": (WeatherHourly, "city"),
+    "air_quality": (AirQualityHourly, "city"),
+}
+
+
+@router.get("/series/{source}")
+def get_series(
+    source: str,
+    metric: str,
+    key: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    max_points: int = 1000,
+    mode: str = "lttb",
+    db: Session = Depends(get_db),
+):
+    """Hourly series of one city/location over any range, downsampled to at most ``max_points`` (lttb, minmax or avg)."""
+    if source not in SERIES_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    if mode not in downsample.MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
+    model, key_col = SERIES_TABLES[source]
+    table = model.__table__
+    if metric not in table.c or metric in ("id", key_col, "hour_start", "imputed", "created_at"):
+        raise HTTPException(status_code=400, detail=f"Unknown metric for {source}: {metric}")
+
+    max_points = max(10, min(max_points, 10000))
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    start = start or end - timedelta(days=30)
+    filters = [table.c[key_col] == key]
+
+    raw_points, first, last = db.query(
+        func.count(), func.min(table.c.hour_start), func.max(table.c.hour_start)
+    ).select_from(table).filter(table.c.hour_start >= start, table.c.hour_start < end, *filters).one()
+
+    result = {"source": source, "metric": metric, "key": key, "mode": mode,
+              "raw_points": raw_points, "bucket_seconds": None}
+
+    if raw_points <= max_points:
+        rows = db.execute(
+            select(table.c.hour_start, table.c[metric])
+            .where(table.c.hour_start >= start, table.c.hour_start < end, *filters)
+            .order_by(table.c.hour_start)
+        ).all()
+        result["points"] = [{"t": t, "v": v} for t, v in rows]
+        return result
+
+    # bucket over the span that actually has data, not the requested window
+    dialect = db.bind.dialect.name
+    stats = ("avg",) if mode == "avg" else ("min", "max")
+    # minmax emits two points per bucket; lttb picks from min/max of 2x finer SQL buckets
+    buckets = max_points // 2 if mode == "minmax" else max_points * 2 if mode == "lttb" else max_points
+    stmt, width = downsample.bucket_query(table, "hour_start", [metric], first, last + timedelta(hours=1),
+                                          buckets, dialect, where=filters, stats=stats)
+    rows = db.execute(stmt).mappings().all()
+    result["bucket_seconds"] = width
+
+    def ts(epoch):
+        return datetime.fromtimestamp(int(epoch), tz=timezone.utc)
+
+    if mode == "avg":
+        result["points"] = [{"t": ts(row["bucket"]), "v": row[metric]} for row in rows]
+        return result
+
+    # min first, max half a bucket later, so LTTB sees both extremes in time order
+    points = [
+        point for row in rows
+        for point in ((float(row["bucket"]), row[f"min_{metric}"]),
+                      (float(row["bucket"]) + width / 2, row[f"max_{metric}"]))
+    ]
+    x = np.array([t for t, _ in points])
+    y = np.array([np.nan if v is None else float(v) for _, v in points])
+    if mode == "lttb":
+        x, y = downsample.downsample(x, y, max_points, "lttb")
+    result["points"] = [{"t": ts(t), "v": None if np.isnan(v) else float(v)} for t, v in zip(x, y)]
+    return result
+
+
+@router.get("/query", dependencies=[Depends(require_admin)])
+def run_query(sql: str, limit: int = 1000):
+    """Read-only SQL (one SELECT) against the DuckDB analytics store, e.g. group-bys and window functions (admin only)."""
+    import duckdb
+    import pandas as pd
+    try:
+        df = analytics_store.read_only_query(sql, limit=max(1, limit))
+    except ReadOnlyQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AnalyticsQueryTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalyticsStoreUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except duckdb.Error as e:
+        raise HTTPException(status_code=400, detail=f"Query failed: {e}")
+    df = df.astype(object).where(pd.notna(df), None)
+    return {"columns": list(df.columns), "rows": df.values.tolist(), "row_count": len(df)}
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from app.services import chart_renderer, data_analytics
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/charts", tags=["Charts"], route_class=ProfiledRoute)
+
+
+@router.get("/{name}")
+def get_chart(name: str, format: str = "png"):
+    """Trend chart rendered from the rolling analytics frames; re-rendered only when the data changed."""
+    if format not in chart_renderer.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+
+    specs = data_analytics.load_trend_specs()
+    if name not in specs:
+        raise HTTPException(status_code=404, detail=f"No data for chart: {name}")
+
+    try:
+        path = chart_renderer.render(specs[name], format)
+    except TimeoutError:
+        # the render keeps running in the pool; a retry is served from the cache once it lands
+        raise HTTPException(
+            status_code=503,
+            detail=f"Chart {name} is still rendering; retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chart rendering failed: {str(e)}")
+
+    return FileResponse(
+        path,
+        media_type=chart_renderer.MEDIA_TYPES[format],
+        headers={"Cache-Control": "public, max-age=60"},
+    )
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from app.services import data_exporter
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/export", tags=["Export"], route_class=ProfiledRoute)
+
+
+@router.get("/{table}")
+def export_table(
+    table: str,
+    format: str = "ndjson",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    gzip: bool = False,
+):
+    """
+    Bulk export of a raw or hourly table over [start, end).
+    The first request streams the export while spooling it to disk; later identical
+    requests (HTTP Range included) are served from the finished file. Pass an
+    explicit ``end`` to resume a download later.
+    """
+    if table not in data_exporter.TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown table: {table}")
+    if format not in data_exporter.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+
+    if end is None:
+        # pin the snapshot so repeated requests in the same minute share one file
+        end = datetime.now(timezone.utc).replace(second=0, microsecond=0, tzinfo=None)
+
+    media_type = "application/gzip" if gzip and format != "parquet" else data_exporter.MEDIA_TYPES[format]
+    filename = data_exporter.file_name(table, format, gzip)
+
+    path = data_exporter.finished_export(table, format, start, end, gzip)
+    if path is not None:
+        return FileResponse(path, media_type=media_type, filename=filename)
+
+    # first request for this snapshot: stream while spooling; Range is served once the file is complete
+    try:
+        body = data_exporter.stream_export(table, format, start, end, gzip)
+    except RuntimeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
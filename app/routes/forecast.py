@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from app.config import settings
+from app.services.forecaster import forecaster, SERIES, SEASON
+from app.services.latest_index import location_key
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/forecast", tags=["Forecast"], route_class=ProfiledRoute)
+
+
+@router.get("/{source}")
+def get_forecast(source: str, key: str | None = None, hours: int = 6):
+    """Next-N-hours forecast with 95% intervals from the stored Holt-Winters state (AQI or traffic speed)."""
+    if source not in SERIES:
+        raise HTTPException(status_code=404, detail=f"Unknown forecast source: {source}")
+    if key is None:
+        key = settings.CITY if source == "air_quality" else location_key(settings.LATITUDE, settings.LONGITUDE)
+
+    try:
+        result = forecaster.forecast(source, key, max(1, min(hours, settings.FORECAST_MAX_HOURS)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Traffic key must be 'lat,lon'")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"No forecast state for {source}/{key}")
+    if not result["points"]:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Insufficient data for {source}/{key}: {result['samples']} of {SEASON + 1} hourly points",
+        )
+
+    return {"source": source, "key": key, "metric": SERIES[source][2], **result}
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Header
+from app.routes.admin import require_admin
+from app.utils import data_validator, startup
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/health", tags=["Health"], route_class=ProfiledRoute)
+
+
+@router.get("/data")
+def get_data_health(full: bool = False, x_admin_token: str | None = Header(None)):
+    """
+    Data-quality report for the hourly tables; validates only rows added since the last check.
+    ``full=true`` rescans every row and rewrites the checkpoints, so it is admin only.
+    """
+    if full:
+        require_admin(x_admin_token)
+    tables = data_validator.run(full=full)
+    return {
+        "status": "ok" if all(t["status"] == "ok" for t in tables) else "warn",
+        "tables": tables,
+    }
+
+
+@router.get("/startup")
+def get_startup_report():
+    """Import time and per-phase startup timings of this worker (ready = serving, warm = background warm-up done)."""
+    return startup.report.to_dict()
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+from app.services.latest_index import latest_index, SOURCES, age_seconds
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/latest", tags=["Latest"], route_class=ProfiledRoute)
+
+
+def serialize(source, key, record):
+    return {
+        "source": source,
+        "key": key,
+        **record,
+        "age_seconds": round(age_seconds(record), 1),
+    }
+
+
+@router.get("/")
+def get_latest(source: str | None = None):
+    """Latest stored reading for every city/location (optionally one source)."""
+    if source is not None and source not in SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    return [serialize(src, key, record) for src, key, record in latest_index.items(source)]
+
+
+@router.get("/{source}/{key}")
+def get_latest_reading(source: str, key: str):
+    """Latest stored reading for one city (weather, air_quality) or 'lat,lon' location (traffic)."""
+    if source not in SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    try:
+        record = latest_index.get(source, key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Traffic key must be 'lat,lon'")
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No stored {source} reading for {key}")
+    return serialize(source, key, record)
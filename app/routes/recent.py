@@ -0,0 +1,63 @@
+import time
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.db.database import get_db
+from app.services.latest_index import normalize_key
+from app.services.recent_store import recent_store, COLUMNS
+from app.utils.metrics import record_cache
+from app.utils.profiler import ProfiledRoute
+
+router = APIRouter(prefix="/recent", tags=["Recent"], route_class=ProfiledRoute)
+
+
+def serialize(rows, columns):
+    """Columnar response: ISO timestamps plus one list per column (NaN -> null)."""
+    stamps = np.datetime_as_string((rows[:, 0] * 1e6).astype("datetime64[us]"), unit="s", timezone="UTC")
+    result = {"t": stamps.tolist()}
+    for i, column in enumerate(columns, start=1):
+        values = rows[:, i]
+        result[column] = np.where(np.isnan(values), None, values).tolist()
+    return result
+
+
+@router.get("/")
+def get_recent_stats():
+    """Series, rows and memory held per source, and since when each source is fully in memory."""
+    return {
+        "hours": settings.RECENT_HOURS,
+        "capacity": settings.RECENT_CAPACITY,
+        "sources": recent_store.stats(),
+    }
+
+
+@router.get("/{source}/{key}")
+def get_recent(source: str, key: str, hours: float = 24, metric: str | None = None, db: Session = Depends(get_db)):
+    """Raw readings of the last ``hours`` for one city or 'lat,lon' location, oldest first (memory slice when held in memory)."""
+    if source not in COLUMNS:
+        raise HTTPException(status_code=404, detail=f"Unknown source: {source}")
+    if metric is not None and metric not in COLUMNS[source]:
+        raise HTTPException(status_code=400, detail=f"Unknown metric for {source}: {metric}")
+    start = time.time() - max(hours, 0.0) * 3600
+    try:
+        rows = recent_store.range(source, key, start)
+        from_memory = rows is not None
+        record_cache("recent", from_memory)
+        if not from_memory:
+            block = recent_store.read_db(db, source, start, key=key)
+            rows = block.get(normalize_key(source, key), np.empty((0, len(COLUMNS[source]) + 1)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Traffic key must be 'lat,lon'")
+
+    columns = COLUMNS[source] if metric is None else (metric,)
+    if metric is not None:
+        rows = rows[:, [0, COLUMNS[source].index(metric) + 1]]
+    return {
+        "source": source,
+        "key": key,
+        "hours": hours,
+        "count": len(rows),
+        "from_memory": from_memory,
+        **serialize(rows, columns),
+    }
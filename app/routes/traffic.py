@@ -1,28 +1,73 @@
 from fastapi import APIRouter, HTTPException
-import requests
 import os
 from dotenv import load_dotenv
-from app.utils.api_client import APIClient
-from app.config import TOMTOM_KEY
+from app.utils.api_client import client, DeadlineExceeded, UpstreamError, UpstreamHTTPError, UpstreamTimeout
+from app.utils.deadline import Deadline, live_deadline, mark_stale
+from app.config import TOMTOM_KEY, TRAFFIC_NEARBY_METERS, TRAFFIC_NEARBY_MAX_AGE, TRAFFIC_NEARBY_MAX_RADIUS, TOMTOM_FLOW_URL
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from app.db.database import get_db
 from app.db import models
+from app.services.spatial_index import spatial_index
+from app.utils.metrics import record_cache
+from app.utils.profiler import ProfiledRoute
 
 # Load .env variables
 load_dotenv()
 TOMTOM_KEY = os.getenv("TOMTOM_KEY")
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 if not TOMTOM_KEY:
     raise RuntimeError("TomTom API key not configured. Please add TOMTOM_API_KEY to your .env")
 
+@router.get("/traffic/nearby")
+def get_nearby_traffic(
+    lat: float,
+    lon: float,
+    k: int = 5,
+    radius: float | None = None,
+    max_age: float | None = None,
+):
+    """Stored traffic readings near a point: within ``radius`` meters (capped at TRAFFIC_NEARBY_MAX_RADIUS), or the ``k`` nearest."""
+    if radius is not None:
+        radius = max(0.0, min(radius, TRAFFIC_NEARBY_MAX_RADIUS))
+        hits = spatial_index.within_radius(lat, lon, radius, max_age=max_age)
+    else:
+        hits = spatial_index.nearest(lat, lon, k=max(1, min(k, 100)), max_age=max_age)
+    return [{**record, "distance_m": round(distance, 1)} for distance, record in hits]
+
+
+def _from_record(lat, lon, distance, record):
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "current_speed": record["current_speed"],
+        "free_flow_speed": record["free_flow_speed"],
+        "confidence": record["confidence"],
+        "road_closure": record["road_closure"],
+        "coordinates": [],
+        "observed_at": record["timestamp"],
+        "from_cache": True,
+        "reading_location": record["location"],
+        "distance_m": round(distance, 1),
+    }
+
+
 @router.get("/traffic/{lat}/{lon}")
-def get_traffic(lat: float, lon: float):
-    """Fetch live traffic flow data for a given location dynamically."""
-    
-    url = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
+def get_traffic(lat: float, lon: float, live: bool = False, deadline: Deadline = Depends(live_deadline)):
+    """Fetch live traffic flow data for a given location dynamically (nearest stored reading, marked stale, past the deadline)."""
+    nearby = [] if live else spatial_index.nearest(
+        lat, lon, k=1,
+        max_distance_m=TRAFFIC_NEARBY_METERS,
+        max_age=TRAFFIC_NEARBY_MAX_AGE,
+    )
+    if not live:
+        record_cache("traffic_nearby", bool(nearby))
+    if nearby:
+        return _from_record(lat, lon, *nearby[0])
+
+    url = TOMTOM_FLOW_URL
     params = {
         "point": f"{lat},{lon}",
         "unit": "KMPH",
@@ -30,15 +75,20 @@ def get_traffic(lat: float, lon: float):
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()  # Raises HTTPError for 4xx/5xx
-    except requests.HTTPError as e:
-        raise HTTPException(status_code=response.status_code, detail=f"TomTom API error: {response.text}")
-    except requests.RequestException as e:
+        data = client("tomtom").get(url, params=params, deadline=deadline)
+    except DeadlineExceeded:
+        stored = spatial_index.nearest(lat, lon, k=1, max_distance_m=TRAFFIC_NEARBY_METERS)
+        if not stored:
+            raise HTTPException(status_code=504, detail="TomTom API timeout (deadline exceeded, no stored reading nearby)")
+        distance, record = stored[0]
+        return mark_stale("traffic", _from_record(lat, lon, distance, record), record)
+    except UpstreamHTTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"TomTom API error: {e.text}")
+    except UpstreamTimeout:
+        raise HTTPException(status_code=504, detail="TomTom API timeout")
+    except UpstreamError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
 
-
-    data = response.json()
     flow = data.get("flowSegmentData", {})
     coords = flow.get("coordinates", {}).get("coordinate", [])
     
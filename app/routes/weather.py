@@ -1,26 +1,54 @@
 from fastapi import APIRouter, HTTPException
-import requests
-from app.config import OPENWEATHER_KEY
-from app.utils.api_client import APIClient
+from app.config import OPENWEATHER_KEY, LATEST_MAX_AGE, OPENWEATHER_WEATHER_URL
+from app.utils.api_client import client, DeadlineExceeded, UpstreamError, UpstreamHTTPError, UpstreamTimeout
+from app.utils.deadline import Deadline, live_deadline, mark_stale
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from app.db.database import get_db
 from app.db import models
+from app.services.latest_index import latest_index
+from app.utils.profiler import ProfiledRoute
 
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
+
+
+def _from_record(city, record):
+    return {
+        "city": city,
+        "temperature": record["temperature"],
+        "humidity": record["humidity"],
+        # rows stored before description existed only have the short condition
+        "condition": record.get("description") or record["condition"],
+        "wind_speed": record.get("wind_speed"),
+        "observed_at": record["timestamp"],
+        "from_cache": True,
+    }
+
 
 @router.get("/weather/{city}")
-def get_weather(city: str):
-    """Fetch live weather data for a city"""
+def get_weather(city: str, live: bool = False, deadline: Deadline = Depends(live_deadline)):
+    """Fetch live weather data for a city (served from the latest stored reading when fresh, or marked stale past the deadline)"""
+    cached = None if live else latest_index.get_fresh("weather", city, LATEST_MAX_AGE)
+    if cached:
+        return _from_record(city, cached)
     if not OPENWEATHER_KEY:
         raise HTTPException(status_code=500, detail="OpenWeather API key not configured")
-    url = f"http://api.openweathermap.org/data/2.5/weather"
+    url = OPENWEATHER_WEATHER_URL
     params = {"q": city, "appid": OPENWEATHER_KEY, "units": "metric"}
-    r = requests.get(url, params=params, timeout=10)
-    if r.status_code != 200:
-        raise HTTPException(status_code=r.status_code, detail=r.text)
-    data = r.json()
+    try:
+        data = client("openweather").get(url, params=params, deadline=deadline)
+    except DeadlineExceeded:
+        stored = latest_index.get("weather", city)
+        if stored is None:
+            raise HTTPException(status_code=504, detail="OpenWeather API timeout (deadline exceeded, no stored reading)")
+        return mark_stale("weather", _from_record(city, stored), stored)
+    except UpstreamHTTPError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.text)
+    except UpstreamTimeout:
+        raise HTTPException(status_code=504, detail="OpenWeather API timeout")
+    except UpstreamError as e:
+        raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
     return {
         "city": city,
         "temperature": data["main"]["temp"],
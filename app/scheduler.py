@@ -5,19 +5,15 @@ This file is executed only by the Render Worker Service.
 """
 
 import time
-import logging
 from app.services.data_collector import collect_all_data
 from app.config import settings
+from app.utils.logs import get_logger, setup_logging
 
 # Interval comes from your .env (COLLECTION_INTERVAL)
 INTERVAL = float(settings.COLLECTION_INTERVAL)
 
-# Logging setup
-logger = logging.getLogger("Scheduler")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s"
-)
+# Queued JSON logging (see app.utils.logs)
+logger = get_logger("scheduler")
 
 def run_scheduler():
     logger.info(f"🔥 UrbanPulse Scheduler started | Interval: {INTERVAL} seconds")
@@ -28,9 +24,10 @@ def run_scheduler():
         except Exception as e:
             logger.exception(f"❌ Scheduler error: {e}")
 
-        logger.info(f"⏳ Sleeping for {INTERVAL} seconds...\n")
+        logger.info(f"⏳ Sleeping for {INTERVAL} seconds...")
         time.sleep(INTERVAL)
 
 
 if __name__ == "__main__":
+    setup_logging()
     run_scheduler()
@@ -0,0 +1,249 @@
+"""
+Embedded columnar analytics store (DuckDB file at ANALYTICS_DB_PATH).
+
+Mirrors the raw and hourly tables from the transactional database so heavy
+group-bys and window queries never run against the database the collector
+writes to and the API reads from. Each sync pulls only rows past the mirror's
+own watermark, in ANALYTICS_SYNC_CHUNK partitions:
+
+- raw tables are append-only: rows with id > max(id),
+- hourly tables are also re-aggregated in place (created_at is bumped), so rows
+  with id > max(id) or created_at > max(created_at) replace the mirror row with
+  the same natural key (which also drops duplicates removed upstream); rows the
+  imputer updated in place keep created_at and are passed in as ``refresh`` ids.
+
+The DuckDB database runs with external file access disabled, so the ad-hoc
+query endpoint can only read the mirrored tables; its queries are interrupted
+after ANALYTICS_QUERY_TIMEOUT. duckdb and pandas are imported on first use, so
+importing this module stays cheap for API workers.
+
+DuckDB lets one process open the file, and read-only opens are refused while
+it is open for writing, so the store needs a single API worker process (run
+uvicorn without --workers > 1). Other processes get AnalyticsStoreUnavailable.
+"""
+
+import os
+import threading
+from datetime import datetime
+from sqlalchemy import Boolean, DateTime, Float, Integer, or_, select
+from app.config import settings
+from app.db import database, models
+
+# mirrored table -> (model, natural key columns or None for append-only)
+MIRRORS = {
+    "traffic_data": (models.TrafficData, None),
+    "weather_data": (models.WeatherData, None),
+    "air_quality_data": (models.AirQualityData, None),
+    "traffic_hourly": (models.TrafficHourly, ["location", "hour_start"]),
+    "weather_hourly": (models.WeatherHourly, ["city", "hour_start"]),
+    "air_quality_hourly": (models.AirQualityHourly, ["city", "hour_start"]),
+    "city_hourly_joined": (models.CityHourlyJoined, ["city", "hour_start"]),
+}
+
+
+def _duck_type(column):
+    if isinstance(column.type, Boolean):
+        return "BOOLEAN"
+    if isinstance(column.type, Integer):
+        return "BIGINT"
+    if isinstance(column.type, Float):
+        return "DOUBLE"
+    if isinstance(column.type, DateTime):
+        return "TIMESTAMP"
+    return "VARCHAR"
+
+
+def _watermark_column(model):
+    for name in ("created_at", "updated_at"):
+        if name in model.__table__.c:
+            return name
+    return None
+
+
+class ReadOnlyQueryError(ValueError):
+    pass
+
+
+class AnalyticsQueryTimeout(Exception):
+    pass
+
+
+class AnalyticsStoreUnavailable(RuntimeError):
+    """The DuckDB file is held by another process."""
+
+
+class AnalyticsStore:
+    def __init__(self, path=None):
+        self.path = path or settings.ANALYTICS_DB_PATH
+        self._conn = None
+        self._write_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._generations = {}  # table -> syncs that changed the mirror (this process)
+
+    # ---------- Connection / schema ----------
+    def _connection(self):
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    import duckdb
+                    try:
+                        conn = duckdb.connect(self.path, config={"enable_external_access": False})
+                    except duckdb.IOException as e:
+                        raise AnalyticsStoreUnavailable(
+                            f"{self.path} is open in another process; the analytics store needs a single API worker ({e})"
+                        )
+                    for table, (model, _) in MIRRORS.items():
+                        cols = ", ".join(f"{c.name} {_duck_type(c)}" for c in model.__table__.columns)
+                        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols})")
+                        for c in model.__table__.columns:  # columns added to the model since the file was created
+                            conn.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {c.name} {_duck_type(c)}")
+                    self._conn = conn
+        return self._conn
+
+    def cursor(self):
+        """A connection for the calling thread (DuckDB cursors are not shared across threads)."""
+        return self._connection().cursor()
+
+    def close(self):
+        with self._open_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- Sync ----------
+    def _watermarks(self, cur, table, model):
+        wm_col = _watermark_column(model)
+        max_id, max_ts = cur.execute(
+            f"SELECT MAX(id), {f'MAX({wm_col})' if wm_col else 'NULL'} FROM {table}"
+        ).fetchone()
+        return max_id, max_ts
+
+    def _apply(self, cur, table, keys, df):
+        cur.register("delta", df)
+        try:
+            cols = ", ".join(df.columns)
+            if keys:
+                match = " AND ".join(f"{table}.{k} IS NOT DISTINCT FROM delta.{k}" for k in keys)
+                cur.execute(f"DELETE FROM {table} USING delta WHERE {match}")
+                cur.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM delta)")
+            cur.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM delta")
+        finally:
+            cur.unregister("delta")
+
+    def sync_table(self, table, engine=None, chunk=None, refresh_ids=None):
+        """Copy rows past the mirror's watermark, plus ``refresh_ids``. Returns the number of rows copied."""
+        engine = engine or database.engine
+        chunk = chunk or settings.ANALYTICS_SYNC_CHUNK
+        model, keys = MIRRORS[table]
+        t = model.__table__
+        wm_col = _watermark_column(model) if keys else None
+        import pandas as pd
+
+        with self._write_lock:
+            cur = self.cursor()
+            try:
+                max_id, max_ts = self._watermarks(cur, table, model)
+                stmt = select(*t.columns).order_by(t.c.id)
+                if max_id is not None:
+                    condition = t.c.id > max_id
+                    if wm_col and max_ts is not None:
+                        condition = or_(condition, t.c[wm_col] > max_ts)
+                    if refresh_ids:
+                        condition = or_(condition, t.c.id.in_(refresh_ids))
+                    stmt = stmt.where(condition)
+
+                copied = 0
+                with engine.connect() as conn:
+                    result = conn.execution_options(stream_results=True, yield_per=chunk).execute(stmt)
+                    for rows in result.partitions():
+                        df = pd.DataFrame(rows, columns=list(t.columns.keys()))
+                        for col in t.columns:
+                            if isinstance(col.type, DateTime):
+                                df[col.name] = pd.to_datetime(df[col.name], utc=True).dt.tz_localize(None)
+                        if keys:
+                            df = df.drop_duplicates(subset=keys, keep="last")
+                        cur.execute("BEGIN TRANSACTION")
+                        try:
+                            self._apply(cur, table, keys, df)
+                            cur.execute("COMMIT")
+                        except Exception:
+                            cur.execute("ROLLBACK")
+                            raise
+                        copied += len(df)
+            finally:
+                cur.close()
+            if copied:
+                self._generations[table] = self._generations.get(table, 0) + 1
+        return copied
+
+    def generation(self, table):
+        """Counter bumped by every sync that copied rows into ``table``; lets callers cache derived data."""
+        return self._generations.get(table, 0)
+
+    def sync(self, tables=None, engine=None, refresh=None):
+        """Bring every mirror up to date; ``refresh`` maps table -> ids to re-copy. Returns {table: rows copied}."""
+        refresh = refresh or {}
+        return {table: self.sync_table(table, engine, refresh_ids=refresh.get(table)) for table in (tables or MIRRORS)}
+
+    # ---------- Queries ----------
+    def query(self, sql, params=None):
+        """Run a query against the mirror and return a DataFrame."""
+        cur = self.cursor()
+        try:
+            return cur.execute(sql, params or []).df()
+        finally:
+            cur.close()
+
+    def read_only_query(self, sql, params=None, limit=None, timeout=None):
+        """
+        Single SELECT only, capped at ``limit`` rows (ANALYTICS_QUERY_MAX_ROWS by default)
+        and interrupted after ``timeout`` seconds (ANALYTICS_QUERY_TIMEOUT).
+        """
+        import duckdb
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            raise ReadOnlyQueryError(str(e))
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ReadOnlyQueryError("Only a single SELECT statement is allowed")
+        limit = min(limit or settings.ANALYTICS_QUERY_MAX_ROWS, settings.ANALYTICS_QUERY_MAX_ROWS)
+        timeout = timeout or settings.ANALYTICS_QUERY_TIMEOUT
+        body = sql.strip().rstrip(";")
+        cur = self.cursor()
+        timer = threading.Timer(timeout, cur.interrupt)
+        timer.daemon = True
+        timer.start()
+        try:
+            return cur.execute(f"SELECT * FROM ({body}) AS q LIMIT {int(limit)}", params or []).df()
+        except duckdb.InterruptException:
+            raise AnalyticsQueryTimeout(f"Query exceeded {timeout:g}s and was interrupted")
+        finally:
+            timer.cancel()
+            cur.close()
+
+    def tables(self):
+        cur = self.cursor()
+        try:
+            return {
+                table: cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in MIRRORS
+            }
+        finally:
+            cur.close()
+
+
+# single instance shared by the aggregator, analytics services and routes
+analytics_store = AnalyticsStore()
+
+
+def hourly_frame(source_table, since=None, columns=None):
+    """Rows of a mirrored hourly table (optionally since a timestamp), oldest first."""
+    cols = ", ".join(columns) if columns else "*"
+    where, params = "", []
+    if since is not None:
+        if not isinstance(since, datetime):
+            import pandas as pd
+            since = pd.Timestamp(since).to_pydatetime()
+        where, params = "WHERE hour_start >= ?", [since]
+    return analytics_store.query(f"SELECT {cols} FROM {source_table} {where} ORDER BY hour_start", params)
@@ -0,0 +1,267 @@
+"""
+Streaming anomaly detection over traffic congestion and AQI series.
+
+Every series (e.g. hourly congestion ratio at one location) keeps:
+- EWMA mean and variance, updated in O(1) per point,
+- a fixed-size ring window of recent values for a robust median/MAD score.
+
+A point is flagged when its robust z-score (and EWMA z-score) crosses
+ANOMALY_THRESHOLD in the direction that matters for the metric: congestion
+ratio (avg_speed / free_flow) collapsing, AQI spiking. Warm-up from history
+uses vectorized sliding windows instead of replaying point by point.
+"""
+
+import math
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app.config import settings
+from app.db import database, models
+from app.services.latest_index import as_utc, location_key
+
+MAD_SCALE = 0.6745  # makes MAD-based z comparable to a normal z-score
+MEAN_AD_SCALE = 1.2533  # sigma / mean absolute deviation, the scale used when MAD is 0
+
+# metric -> direction that counts as anomalous
+DIRECTIONS = {
+    "congestion_ratio": "low",
+    "aqi": "high",
+}
+
+
+def congestion_ratio(speed, free_flow):
+    if speed is None or not free_flow:
+        return None
+    return float(speed) / float(free_flow)
+
+
+class SeriesState:
+    __slots__ = ("mean", "var", "count", "window", "pos", "last_ts")
+
+    def __init__(self, window_size):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.window = np.full(window_size, np.nan)
+        self.pos = 0
+        self.last_ts = None
+
+    def robust_stats(self):
+        values = self.window[~np.isnan(self.window)]
+        if values.size == 0:
+            return None, None
+        median = float(np.median(values))
+        mad = float(np.median(np.abs(values - median)))
+        return median, mad
+
+    def mean_ad(self, median):
+        values = self.window[~np.isnan(self.window)]
+        return float(np.mean(np.abs(values - median)))
+
+    def push(self, value, alpha):
+        if self.count == 0:
+            self.mean, self.var = value, 0.0
+        else:
+            diff = value - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1 - alpha) * (self.var + diff * incr)
+        self.window[self.pos] = value
+        self.pos = (self.pos + 1) % self.window.size
+        self.count += 1
+
+
+def robust_z_scores(points, medians, mads, mean_ads):
+    """
+    Robust z of each point: MAD-based, or mean-absolute-deviation based when more than
+    half the window sits on the median (MAD 0). A window with no spread at all scores 0,
+    so the score is always finite. Works on scalars and arrays alike.
+    """
+    points, medians = np.asarray(points, dtype=float), np.asarray(medians, dtype=float)
+    mads, mean_ads = np.asarray(mads, dtype=float), np.asarray(mean_ads, dtype=float)
+    scale = np.where(mads > 0, mads / MAD_SCALE, MEAN_AD_SCALE * mean_ads)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(scale > 0, (points - medians) / scale, 0.0)
+
+
+class AnomalyDetector:
+    def __init__(self, window_size=None, alpha=None, threshold=None, min_points=None, max_events=500):
+        self.window_size = window_size or settings.ANOMALY_WINDOW
+        self.alpha = alpha or settings.ANOMALY_EWMA_ALPHA
+        self.threshold = threshold or settings.ANOMALY_THRESHOLD
+        self.min_points = min_points or settings.ANOMALY_MIN_POINTS
+        self._series = {}
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def _state(self, series_id):
+        state = self._series.get(series_id)
+        if state is None:
+            state = self._series[series_id] = SeriesState(self.window_size)
+        return state
+
+    def _scores(self, state, value):
+        median, mad = state.robust_stats()
+        robust_z = None
+        if median is not None:
+            robust_z = float(robust_z_scores(value, median, mad, state.mean_ad(median)))
+        std = math.sqrt(state.var)
+        ewma_z = (value - state.mean) / std if std > 0 else 0.0
+        return median, mad, robust_z, ewma_z
+
+    def _is_anomaly(self, direction, robust_z, ewma_z):
+        if robust_z is None:
+            return False
+        if direction == "low":
+            return robust_z <= -self.threshold and ewma_z <= -self.threshold / 2
+        if direction == "high":
+            return robust_z >= self.threshold and ewma_z >= self.threshold / 2
+        return abs(robust_z) >= self.threshold and abs(ewma_z) >= self.threshold / 2
+
+    def observe(self, source, metric, key, value, timestamp=None):
+        """Score and absorb one point. Returns the anomaly event or None."""
+        if value is None:
+            return None
+        value = float(value)
+        if not math.isfinite(value):
+            return None
+        timestamp = as_utc(timestamp) or datetime.now(timezone.utc)
+        series_id = f"{source}:{metric}:{key}"
+
+        with self._lock:
+            state = self._state(series_id)
+            if state.last_ts is not None and timestamp <= state.last_ts:
+                return None  # re-aggregated hour or out-of-order point
+            event = None
+            if state.count >= self.min_points:
+                median, mad, robust_z, ewma_z = self._scores(state, value)
+                if self._is_anomaly(DIRECTIONS.get(metric, "both"), robust_z, ewma_z):
+                    event = {
+                        "series": series_id,
+                        "source": source,
+                        "metric": metric,
+                        "key": key,
+                        "timestamp": timestamp,
+                        "value": value,
+                        "expected": median,
+                        "mad": mad,
+                        "robust_z": robust_z,
+                        "ewma_mean": state.mean,
+                        "ewma_z": ewma_z,
+                    }
+                    self._events.append(event)
+            state.push(value, self.alpha)
+            state.last_ts = timestamp
+        return event
+
+    def warm_start(self, source, metric, key, timestamps, values):
+        """Prime a series from history; flags historical anomalies with vectorized rolling median/MAD."""
+        values = np.asarray(values, dtype=float)
+        mask = np.isfinite(values)
+        timestamps = [ts for ts, ok in zip(timestamps, mask) if ok]
+        values = values[mask]
+        if values.size == 0:
+            return 0
+        series_id = f"{source}:{metric}:{key}"
+
+        flagged = 0
+        w = self.window_size
+        if values.size > w:
+            windows = sliding_window_view(values[:-1], w)          # window ending just before each point
+            medians = np.median(windows, axis=1)
+            deviations = np.abs(windows - medians[:, None])
+            mads = np.median(deviations, axis=1)
+            points = values[w:]
+            robust_z = robust_z_scores(points, medians, mads, deviations.mean(axis=1))
+            direction = DIRECTIONS.get(metric, "both")
+            hits = robust_z <= -self.threshold if direction == "low" else (
+                robust_z >= self.threshold if direction == "high" else np.abs(robust_z) >= self.threshold)
+            events = [{
+                "series": series_id, "source": source, "metric": metric, "key": key,
+                "timestamp": as_utc(timestamps[w + i]), "value": float(points[i]),
+                "expected": float(medians[i]), "mad": float(mads[i]),
+                "robust_z": float(robust_z[i]), "ewma_mean": None, "ewma_z": None,
+            } for i in np.flatnonzero(hits)]
+            flagged = len(events)
+
+        with self._lock:
+            if flagged:
+                self._events.extend(events)
+            state = self._series[series_id] = SeriesState(w)
+            for value in values:
+                state.push(float(value), self.alpha)
+            state.last_ts = as_utc(timestamps[-1])
+        return flagged
+
+    def events(self, since=None, series=None, limit=100):
+        events = list(self._events)
+        if since is not None:
+            since = as_utc(since)
+            events = [e for e in events if e["timestamp"] >= since]
+        if series is not None:
+            events = [e for e in events if series in e["series"]]
+        return events[-limit:][::-1]
+
+    def states(self):
+        result = []
+        for series_id, state in list(self._series.items()):
+            median, mad = state.robust_stats()
+            result.append({
+                "series": series_id,
+                "count": state.count,
+                "ewma_mean": state.mean,
+                "ewma_std": math.sqrt(state.var),
+                "median": median,
+                "mad": mad,
+                "last_timestamp": state.last_ts,
+            })
+        return result
+
+    def rebuild(self, db=None, hours=None):
+        """Warm every hourly series from the last ``hours`` of traffic_hourly / air_quality_hourly."""
+        own_session = db is None
+        db = db or database.SessionLocal()
+        hours = hours or self.window_size * 4
+        since = (datetime.now(timezone.utc) - timedelta(hours=hours)).replace(tzinfo=None)
+        series = {}
+        try:
+            for row in (
+                db.query(models.TrafficHourly)
+                .filter(models.TrafficHourly.hour_start >= since)
+                .order_by(models.TrafficHourly.hour_start)
+            ):
+                ts, vals = series.setdefault(("traffic_hourly", "congestion_ratio", row.location), ([], []))
+                ratio = congestion_ratio(row.avg_speed, row.free_flow_avg)
+                ts.append(row.hour_start)
+                vals.append(np.nan if ratio is None else ratio)
+            for row in (
+                db.query(models.AirQualityHourly)
+                .filter(models.AirQualityHourly.hour_start >= since)
+                .order_by(models.AirQualityHourly.hour_start)
+            ):
+                ts, vals = series.setdefault(("air_quality_hourly", "aqi", row.city), ([], []))
+                ts.append(row.hour_start)
+                vals.append(np.nan if row.avg_aqi is None else row.avg_aqi)
+        finally:
+            if own_session:
+                db.close()
+
+        for (source, metric, key), (ts, vals) in series.items():
+            self.warm_start(source, metric, key, ts, vals)
+        return len(series)
+
+
+# single instance shared by the collector, aggregator and analytics routes
+anomaly_detector = AnomalyDetector()
+
+
+# ---------- Feed helpers ----------
+def observe_traffic(source, lat, lon, speed, free_flow, timestamp=None, location=None):
+    key = location or location_key(lat, lon)
+    return anomaly_detector.observe(source, "congestion_ratio", key, congestion_ratio(speed, free_flow), timestamp)
+
+
+def observe_aqi(source, city, aqi, timestamp=None):
+    return anomaly_detector.observe(source, "aqi", city, aqi, timestamp)
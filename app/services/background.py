@@ -0,0 +1,162 @@
+"""
+Background services of the API process: startup warm-up, collector and
+aggregator, started and stopped by the app's lifespan.
+
+- I/O work runs as asyncio tasks on the server's event loop. Each collection
+  cycle fetches the providers concurrently with the pooled async client and
+  hands the DB commits to a worker thread; the task sleeps on a stop event, so
+  shutdown is immediate between cycles and waits for a cycle in flight instead
+  of abandoning it mid-commit.
+- CPU-heavy work (pandas aggregation, gap filling, joined-view refresh) runs in
+  a spawned process pool, so it never competes with request handling for the
+  GIL. The worker returns the hourly rows it wrote; this process feeds them to
+  its in-memory consumers (spatial index, anomaly detector, profile cube,
+  forecaster) and syncs the DuckDB analytics store, which admits a single
+  writing process. Worker log records are relayed into this process's log queue.
+
+After each aggregation cycle the recent-readings store is snapshotted to disk.
+BACKGROUND_PROCESSES=0 aggregates in a thread of the API process instead.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.config import settings
+from app.utils import api_client, logs
+
+log = logs.get_logger("background")
+
+
+# ---------- Worker side ----------
+def _init_worker(log_queue):
+    logs.log_to_queue(log_queue)
+
+
+# ---------- API-process side ----------
+class BackgroundServices:
+    def __init__(self):
+        self._task = None
+        self._stopping = None
+        self._pool = None
+        self._relay = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: never fork a process that is running server threads
+            context = multiprocessing.get_context("spawn")
+            log_queue, self._relay = logs.start_worker_relay(context)
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.BACKGROUND_PROCESSES,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(log_queue,),
+            )
+        return self._pool
+
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._relay is not None:
+            self._relay.stop()  # drains records the workers already queued
+            self._relay = None
+
+    async def _sleep(self, seconds):
+        """Sleep unless asked to stop first; True means stop."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---------- Loops ----------
+    async def _collector(self):
+        from app.services import data_collector
+        from app.services.recent_store import recent_store
+        log.info(f"Collector started (interval: {settings.COLLECTION_INTERVAL} seconds)")
+        # the recent store answers from memory only while it sees every stored reading
+        recent_store.sole_writer = settings.RECENT_SOLE_WRITER
+        try:
+            while not self._stopping.is_set():
+                try:
+                    await data_collector.collect_all_data_async()
+                except Exception:
+                    log.exception("Unhandled collector error:")
+                if await self._sleep(settings.COLLECTION_INTERVAL):
+                    break
+        finally:
+            recent_store.sole_writer = False
+
+    async def _aggregate_once(self):
+        from app.services import data_aggregator
+        if settings.BACKGROUND_PROCESSES <= 0:
+            await asyncio.to_thread(data_aggregator.aggregate_hourly_data)
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._get_pool(), data_aggregator.aggregate_job)
+        except BrokenProcessPool:
+            # a worker died; the next cycle starts a fresh pool
+            self._shutdown_pool()
+            raise
+        await asyncio.to_thread(data_aggregator.finish_job, result)
+
+    async def _aggregator(self):
+        from app.services.recent_store import recent_store
+        log.info(f"Aggregator started (interval: {settings.AGGREGATION_INTERVAL} seconds, "
+                 f"{settings.BACKGROUND_PROCESSES or 'no'} worker processes)")
+        while not self._stopping.is_set():
+            try:
+                await self._aggregate_once()
+            except Exception:
+                log.exception("Unhandled aggregator error:")
+            try:
+                await asyncio.to_thread(recent_store.save)
+            except Exception:
+                log.exception("Recent-readings snapshot failed:")
+            if await self._sleep(settings.AGGREGATION_INTERVAL):
+                break
+
+    async def _run(self, warmup):
+        if warmup is not None:
+            try:
+                await asyncio.to_thread(warmup)
+            except Exception:
+                log.exception("Background warm-up failed:")
+        if not self._stopping.is_set():
+            await asyncio.gather(self._collector(), self._aggregator())
+
+    # ---------- Lifecycle ----------
+    async def start(self, warmup=None):
+        """Run ``warmup`` (blocking, in a thread), then the collector and aggregator loops."""
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(warmup), name="urbanpulse-background")
+
+    async def stop(self, timeout=None):
+        """
+        Let cycles in flight finish (up to ``timeout`` seconds, then cancel),
+        stop the worker pool and drain its log records.
+        """
+        timeout = settings.BACKGROUND_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        if self._task is not None:
+            self._stopping.set()
+            done, _ = await asyncio.wait({self._task}, timeout=timeout)
+            if not done:
+                log.warning(f"Background work still running after {timeout}s; cancelling it.")
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await api_client.aclose_all()
+        self._shutdown_pool()
+        log.info("Background services stopped.")
+
+
+# single instance driven by app.main's lifespan
+background = BackgroundServices()
@@ -0,0 +1,185 @@
+"""
+Chart rendering service for UrbanPulse.
+
+Charts are described by a plain spec (title, labels, series arrays) and
+rendered in a process pool with the headless Agg backend, reusing one figure
+per size inside each worker. Output is cached on disk under a hash of the
+series data plus chart parameters, so unchanged data never re-renders.
+
+Spec format:
+    {
+        "title": "...", "xlabel": "...", "ylabel": "...",
+        "size": (8, 5), "grid": True,
+        "series": [{"x": <array>, "y": <array>, "label": "...", "color": None, "marker": None}],
+    }
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from app.config import settings
+from app.utils.metrics import record_cache
+
+FORMATS = ("png", "svg")
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ---------- Cache key ----------
+def _as_array(values):
+    arr = np.asarray(values)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[s]").astype("int64")
+    if arr.dtype.kind == "O":
+        try:
+            return np.asarray(values, dtype="datetime64[s]").astype("int64")
+        except (TypeError, ValueError):
+            return np.asarray(values, dtype=float)
+    return arr.astype(float)
+
+
+def chart_key(spec, fmt):
+    """Content hash of the series data plus every chart parameter."""
+    h = hashlib.sha256()
+    params = {k: v for k, v in spec.items() if k != "series"}
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(fmt.encode())
+    for series in spec["series"]:
+        meta = {k: v for k, v in series.items() if k not in ("x", "y")}
+        h.update(json.dumps(meta, sort_keys=True, default=str).encode())
+        h.update(_as_array(series["x"]).tobytes())
+        h.update(_as_array(series["y"]).tobytes())
+    return h.hexdigest()[:32]
+
+
+def cache_path(key, fmt):
+    return os.path.join(settings.CHART_CACHE_DIR, f"{key}.{fmt}")
+
+
+# ---------- Worker side ----------
+_figures = {}
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _figure(size):
+    """One reusable figure per size in each worker process."""
+    import matplotlib.pyplot as plt
+    fig = _figures.get(size)
+    if fig is None:
+        fig = plt.figure(figsize=size)
+        _figures[size] = fig
+    fig.clf()
+    return fig
+
+
+def _render(spec, fmt, path):
+    fig = _figure(tuple(spec.get("size") or (8, 5)))
+    ax = fig.add_subplot(1, 1, 1)
+    for series in spec["series"]:
+        x = np.asarray(series["x"])
+        if x.dtype.kind == "O":
+            x = x.astype("datetime64[s]")
+        ax.plot(
+            x, np.asarray(series["y"], dtype=float),
+            label=series.get("label"),
+            color=series.get("color"),
+            marker=series.get("marker"),
+        )
+    ax.set_title(spec.get("title", ""))
+    ax.set_xlabel(spec.get("xlabel", ""))
+    ax.set_ylabel(spec.get("ylabel", ""))
+    if spec.get("grid"):
+        ax.grid(True)
+    if any(series.get("label") for series in spec["series"]):
+        ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fig.savefig(tmp_path, format=fmt)
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------- Client side ----------
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: never fork a process that is running server threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.CHART_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def render(spec, fmt="png", inline=False):
+    """Return the path of the rendered chart, rendering only on a cache miss."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported chart format: {fmt}")
+    path = cache_path(chart_key(spec, fmt), fmt)
+    if os.path.exists(path):
+        record_cache("chart", True)
+        os.utime(path)  # keep hot charts at the back of the eviction queue
+        return path
+    record_cache("chart", False)
+    os.makedirs(settings.CHART_CACHE_DIR, exist_ok=True)
+    if inline:
+        _init_worker()
+        _render(spec, fmt, path)
+    else:
+        try:
+            _get_pool().submit(_render, spec, fmt, path).result(timeout=settings.CHART_RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            # a worker died; start a fresh pool and retry once
+            shutdown()
+            _get_pool().submit(_render, spec, fmt, path).result(timeout=settings.CHART_RENDER_TIMEOUT)
+    evict()
+    return path
+
+
+def evict(max_files=None):
+    """Keep only the newest ``max_files`` cached charts (renders still writing their .tmp file are left alone)."""
+    max_files = settings.CHART_CACHE_MAX_FILES if max_files is None else max_files
+    entries = [
+        entry for entry in os.scandir(settings.CHART_CACHE_DIR)
+        if entry.is_file() and not entry.name.endswith(".tmp")
+    ]
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def render_to(spec, dest, fmt="png", inline=False):
+    """Render (or reuse the cached chart) and copy it to ``dest``."""
+    path = render(spec, fmt, inline=inline)
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    shutil.copyfile(path, dest)
+    return dest
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -1,33 +1,75 @@
 import warnings
 warnings.filterwarnings("ignore")
 
+import logging
+import time
 import pandas as pd
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import create_engine, text
+from sqlalchemy import DateTime, bindparam, create_engine, text
 from app.config import settings
+from app.services.spatial_index import spatial_index
+from app.services.anomaly_detector import observe_traffic, observe_aqi
+from app.services.profile_cube import profile_cube
+from app.services.forecaster import forecaster
+from app.services import hourly_join
+from app.services import imputer
+from app.services.analytics_store import analytics_store
+from app.utils.metrics import Counter, Histogram, instrument_engine
+from app.utils.logs import get_logger, setup_logging
 
 # === DATABASE CONNECTION ===
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+instrument_engine(engine, "aggregator")
+
+# === METRICS ===
+STEP_SECONDS = Histogram(
+    "urbanpulse_aggregator_duration_seconds", "Aggregation step duration per target table",
+    ["table"], buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+STEP_ROWS = Counter("urbanpulse_aggregator_rows", "Rows written per target table", ["table"])
 
 # === LOGGING ===
-def log(msg, level="INFO"):
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(f"{now} | {level} | {msg}", flush=True)
+_logger = get_logger("aggregator")
+_LEVELS = {"INFO": logging.INFO, "WARN": logging.WARNING, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+
+def log(msg, level="INFO", **fields):
+    """Queued structured log line; ``fields`` (table, rows, duration_ms, ...) become JSON keys."""
+    _logger.log(_LEVELS.get(level, logging.INFO), msg, extra=fields)
 
 # === GENERIC UPSERT ===
+def _typed(sql, data):
+    """text() with datetime params bound as DateTime, so every dialect stores/compares them the same way."""
+    stmt = text(sql)
+    dt_keys = [k for k, v in data.items() if isinstance(v, datetime) and f":{k}" in sql]
+    return stmt.bindparams(*[bindparam(k, type_=DateTime) for k in dt_keys]) if dt_keys else stmt
+
 def upsert_hourly(conn, table, conflict_cols, data_dict):
-    cols = ", ".join(data_dict.keys())
-    vals = ", ".join([f":{k}" for k in data_dict.keys()])
-    update_cols = [k for k in data_dict.keys() if k not in conflict_cols]
-    update_clause = (
-        ", ".join([f"{k}=VALUES({k})" for k in update_cols]) if update_cols else "id=id"
-    )
-    sql = f"""
-        INSERT INTO {table} ({cols})
-        VALUES ({vals})
-        ON DUPLICATE KEY UPDATE {update_clause}
     """
-    conn.execute(text(sql), data_dict)
+    Update the row for this key/hour or insert it. Portable (no ON DUPLICATE KEY),
+    and dedups as it writes: if older duplicates of the key exist, only the newest
+    row is kept, so the cleanup script rarely has anything left to do.
+    """
+    where = " AND ".join(f"{c} = :{c}" for c in conflict_cols)
+    ids = [r[0] for r in conn.execute(
+        _typed(f"SELECT id FROM {table} WHERE {where} ORDER BY id DESC", data_dict),
+        {c: data_dict[c] for c in conflict_cols},
+    )]
+    if not ids:
+        cols = ", ".join(data_dict.keys())
+        vals = ", ".join([f":{k}" for k in data_dict.keys()])
+        conn.execute(_typed(f"INSERT INTO {table} ({cols}) VALUES ({vals})", data_dict), data_dict)
+        return
+
+    update_cols = [k for k in data_dict.keys() if k not in conflict_cols]
+    if update_cols:
+        set_clause = ", ".join(f"{k} = :{k}" for k in update_cols)
+        conn.execute(_typed(f"UPDATE {table} SET {set_clause} WHERE id = :_id", data_dict), {**data_dict, "_id": ids[0]})
+    if len(ids) > 1:
+        conn.execute(
+            _typed(f"DELETE FROM {table} WHERE {where} AND id < :_id", data_dict),
+            {**{c: data_dict[c] for c in conflict_cols}, "_id": ids[0]},
+        )
+        log(f"🧹 Removed {len(ids) - 1} duplicate rows from {table}.")
 
 # === TIME WINDOW ===
 def get_time_window(minutes=20):
@@ -55,14 +97,15 @@ def aggregate_traffic(conn):
         df = pd.read_sql_query(text(query), conn, params={"start": start, "end": end})
     except Exception as e:
         log(f"Traffic SELECT failed: {e}", level="ERROR")
-        return
+        return []
 
     log(f"🚦 Traffic rows fetched (last 20 min): {len(df)}")
 
     if df.empty:
         log("No recent traffic data; skipping.", level="WARN")
-        return
+        return []
 
+    rows = []
     for _, row in df.iterrows():
         location = f"{float(row['latitude']):.4f},{float(row['longitude']):.4f}"
         hour_start = start.replace(minute=0, second=0, microsecond=0)
@@ -72,11 +115,14 @@ def aggregate_traffic(conn):
             "avg_speed": float(row["avg_speed"]) if row["avg_speed"] is not None else None,
             "free_flow_avg": float(row["free_flow_avg"]) if row["free_flow_avg"] is not None else None,
             "samples": int(row["samples"]),
+            "imputed": False,
             "created_at": datetime.now(timezone.utc),
         }
         upsert_hourly(conn, "traffic_hourly", ["location", "hour_start"], data)
+        rows.append(data)
 
     log("✅ Traffic hourly data aggregated successfully.")
+    return rows
 
 # === WEATHER AGGREGATION ===
 def aggregate_weather(conn):
@@ -94,14 +140,15 @@ def aggregate_weather(conn):
         df = pd.read_sql_query(text(query), conn, params={"start": start, "end": end})
     except Exception as e:
         log(f"Weather SELECT failed: {e}", level="ERROR")
-        return
+        return []
 
     log(f"🌦 Weather rows fetched (last 20 min): {len(df)}")
 
     if df.empty:
         log("No recent weather data; skipping.", level="WARN")
-        return
+        return []
 
+    rows = []
     for _, row in df.iterrows():
         hour_start = start.replace(minute=0, second=0, microsecond=0)
         data = {
@@ -110,11 +157,14 @@ def aggregate_weather(conn):
             "avg_temp": float(row["avg_temp"]) if row["avg_temp"] is not None else None,
             "avg_humidity": float(row["avg_humidity"]) if row["avg_humidity"] is not None else None,
             "samples": int(row["samples"]),
+            "imputed": False,
             "created_at": datetime.now(timezone.utc),
         }
         upsert_hourly(conn, "weather_hourly", ["city", "hour_start"], data)
+        rows.append(data)
 
     log("✅ Weather hourly data aggregated successfully.")
+    return rows
 
 # === AIR QUALITY AGGREGATION ===
 def aggregate_air_quality(conn):
@@ -135,14 +185,15 @@ def aggregate_air_quality(conn):
         df = pd.read_sql_query(text(query), conn, params={"start": start, "end": end})
     except Exception as e:
         log(f"Air Quality SELECT failed: {e}", level="ERROR")
-        return
+        return []
 
     log(f"🌫 Air Quality rows fetched (last 20 min): {len(df)}")
 
     if df.empty:
         log("No recent air quality data; skipping.", level="WARN")
-        return
+        return []
 
+    rows = []
     for _, row in df.iterrows():
         hour_start = start.replace(minute=0, second=0, microsecond=0)
         data = {
@@ -154,31 +205,132 @@ def aggregate_air_quality(conn):
             "avg_o3": float(row["avg_o3"]) if row["avg_o3"] is not None else None,
             "avg_aqi": float(row["avg_aqi"]) if row["avg_aqi"] is not None else None,
             "samples": int(row["samples"]),
+            "imputed": False,
             "created_at": datetime.now(timezone.utc),
         }
         upsert_hourly(conn, "air_quality_hourly", ["city", "hour_start"], data)
+        rows.append(data)
 
     log("✅ Air Quality hourly data aggregated successfully.")
+    return rows
+
+# === IN-MEMORY CONSUMERS ===
+def _add_profiles(touched):
+    for source, data in touched:
+        key = data["location"] if source == "traffic" else data["city"]
+        profile_cube.add_row(source, key, data["hour_start"], data)
+
+def publish(touched):
+    """
+    Feed aggregated hourly rows to this process's in-memory consumers (spatial
+    index, anomaly detector, profile cube, forecaster) and persist their state.
+    """
+    for source, data in touched:
+        hour_start = data["hour_start"]
+        if source == "traffic":
+            location = data["location"]
+            spatial_index.add_hourly(location, hour_start, data["avg_speed"], data["free_flow_avg"], data["samples"])
+            observe_traffic("traffic_hourly", None, None, data["avg_speed"], data["free_flow_avg"], hour_start, location=location)
+            forecaster.update("traffic", location, hour_start, data["avg_speed"])
+        elif source == "air_quality":
+            observe_aqi("air_quality_hourly", data["city"], data["avg_aqi"], hour_start)
+            forecaster.update("air_quality", data["city"], hour_start, data["avg_aqi"])
+    _add_profiles(touched)
+    profile_cube.save()
+    forecaster.save()
 
 # === MASTER AGGREGATOR ===
-def aggregate_hourly_data():
+STEPS = (
+    ("traffic_hourly", "traffic", aggregate_traffic),
+    ("weather_hourly", "weather", aggregate_weather),
+    ("air_quality_hourly", "air_quality", aggregate_air_quality),
+)
+
+def run_cycle(before_impute):
+    """
+    Aggregate the last window, fill gaps and refresh the joined view.
+    ``before_impute(touched)`` runs once the hourly upserts are committed.
+    Returns {"touched": [(source, row), ...], "steps": [(table, rows, seconds), ...],
+    "imputed": {table: [ids of rows the imputer updated in place]}}.
+    """
     log("🕒 Starting data aggregation cycle...")
+    cycle_start = time.perf_counter()
+    touched, steps, imputed = [], [], {}
     try:
+        written = []
         with engine.begin() as conn:
-            aggregate_traffic(conn)
-            aggregate_weather(conn)
-            aggregate_air_quality(conn)
-        log("🏁 Aggregation cycle completed successfully.")
+            for table, source, step in STEPS:
+                step_start = time.perf_counter()
+                rows = step(conn) or []
+                elapsed = time.perf_counter() - step_start
+                written.extend((source, data) for data in rows)
+                steps.append((table, len(rows), elapsed))
+                log(f"📦 {table}: {len(rows)} rows upserted", table=table, rows=len(rows),
+                    duration_ms=round(elapsed * 1000, 2))
+        touched = written  # only rows that were committed
+        before_impute(touched)
+        imputer.run(engine=engine, progress=log, changed=imputed)
+        start, _ = get_time_window()
+        step_start = time.perf_counter()
+        joined = hourly_join.refresh(start.replace(minute=0, second=0, microsecond=0), engine)
+        elapsed = time.perf_counter() - step_start
+        steps.append(("city_hourly_joined", joined or 0, elapsed))
+        log(f"🔗 Joined hourly view refreshed ({joined} rows).", table="city_hourly_joined", rows=joined,
+            duration_ms=round(elapsed * 1000, 2))
+        log("🏁 Aggregation cycle completed successfully.", duration_ms=round((time.perf_counter() - cycle_start) * 1000, 2))
     except Exception as e:
         log(f"Aggregation failed: {e}", level="ERROR")
+    return {"touched": touched, "steps": steps, "imputed": imputed}
+
+def record_steps(steps):
+    for table, rows, elapsed in steps:
+        STEP_SECONDS.observe(elapsed, table=table)
+        STEP_ROWS.inc(rows, table=table)
+
+def sync_analytics_store(imputed=None):
+    # runs even if the cycle's aggregation failed, to keep the mirror current
+    try:
+        sync_start = time.perf_counter()
+        copied = analytics_store.sync(engine=engine, refresh=imputed)
+        log(f"🦆 Analytics store synced ({sum(copied.values())} rows).", rows=sum(copied.values()),
+            duration_ms=round((time.perf_counter() - sync_start) * 1000, 2))
+    except Exception as e:
+        log(f"Analytics store sync failed: {e}", level="ERROR")
+
+def aggregate_hourly_data():
+    """One full cycle in this process (CLI, benchmarks, BACKGROUND_PROCESSES=0)."""
+    result = run_cycle(before_impute=publish)
+    record_steps(result["steps"])
+    sync_analytics_store(result["imputed"])
+
+# === PROCESS POOL ===
+def aggregate_job():
+    """
+    Worker-process side of a cycle (see app.services.background). The profile
+    cube is reloaded from the API process's last save and updated locally, so
+    seasonal gap filling sees this cycle's rows; the in-memory consumers that
+    matter live in the API process, which gets the touched rows back.
+    """
+    profile_cube.load()
+    return run_cycle(before_impute=_add_profiles)
+
+def finish_job(result):
+    """API-process side of a pooled cycle: publish the rows, record metrics, sync DuckDB."""
+    try:
+        publish(result["touched"])
+    except Exception as e:
+        log(f"Publishing aggregated rows failed: {e}", level="ERROR")
+    record_steps(result["steps"])
+    sync_analytics_store(result.get("imputed"))
 
 # === SCHEDULER LOOP ===
 if __name__ == "__main__":
     import time
+    setup_logging()
     INTERVAL_MINUTES = 15
     while True:
         aggregate_hourly_data()
-        print(f"⏳ Sleeping for {INTERVAL_MINUTES * 60} seconds...\n")
+        log(f"⏳ Sleeping for {INTERVAL_MINUTES * 60} seconds...")
         time.sleep(INTERVAL_MINUTES * 60)
 
 
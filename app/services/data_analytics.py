@@ -1,97 +1,90 @@
 import os
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
-from app.db.models import TrafficHourly, WeatherHourly, AirQualityHourly
+import threading
+from datetime import datetime, timedelta
+from app.config import settings
+from app.services import chart_renderer
+from app.services.analytics_store import analytics_store, hourly_frame
+from app.utils.logs import get_logger, setup_logging
 
 OUTPUT_DIR = "app/static/dashboard"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-STATE_FILE = os.path.join(OUTPUT_DIR, "last_fetch_state.json")
 
-def log(msg):
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
-    print(f"{now} | {msg}")
+# Trend frames are the last ANALYTICS_WINDOW_DAYS of hourly rows, read from the
+# DuckDB analytics store (synced incrementally), never from the OLTP database.
+SOURCES = {
+    "traffic": ("traffic_hourly", ["id", "location", "hour_start", "avg_speed", "free_flow_avg", "samples", "created_at"]),
+    "weather": ("weather_hourly", ["id", "city", "hour_start", "avg_temp", "avg_humidity", "samples", "created_at"]),
+    "air": ("air_quality_hourly", ["id", "city", "hour_start", "avg_pm25", "avg_aqi", "samples", "created_at"]),
+}
 
-def load_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    return {"traffic": 0, "weather": 0, "air": 0}
+log = get_logger("analytics").info
 
-def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f)
+# chart specs of the last load_trend_specs() call and the version they were built at
+_specs = {"version": None, "specs": {}}
+_specs_lock = threading.Lock()
+
+def window_start():
+    """Start of the rolling window, on the hour so frames stay the same within an hour."""
+    start = datetime.utcnow() - timedelta(days=settings.ANALYTICS_WINDOW_DAYS)
+    return start.replace(minute=0, second=0, microsecond=0)
+
+def load_frame(source):
+    """Rolling window of one source from the analytics store."""
+    table, columns = SOURCES[source]
+    return hourly_frame(table, window_start(), columns)
 
 def fetch_historical_data():
-    session = SessionLocal()
+    """Sync the hourly mirrors, then return the (traffic, weather, air) frames and the number of new rows."""
     try:
-        state = load_state()
-
-        traffic = session.query(TrafficHourly).filter(TrafficHourly.id > state["traffic"]).all()
-        weather = session.query(WeatherHourly).filter(WeatherHourly.id > state["weather"]).all()
-        air = session.query(AirQualityHourly).filter(AirQualityHourly.id > state["air"]).all()
-
-        df_t = pd.DataFrame([{
-            "id": t.id, "location": t.location, "hour_start": t.hour_start,
-            "avg_speed": t.avg_speed, "free_flow_avg": t.free_flow_avg, "samples": t.samples
-        } for t in traffic])
-
-        df_w = pd.DataFrame([{
-            "id": w.id, "city": w.city, "hour_start": w.hour_start,
-            "avg_temp": w.avg_temp, "avg_humidity": w.avg_humidity, "samples": w.samples
-        } for w in weather])
-
-        df_a = pd.DataFrame([{
-            "id": a.id, "city": a.city, "hour_start": a.hour_start,
-            "avg_pm25": a.avg_pm25, "avg_aqi": a.avg_aqi, "samples": a.samples
-        } for a in air])
-
-        for df in [df_t, df_w, df_a]:
-            if not df.empty:
-                df['hour_start'] = pd.to_datetime(df['hour_start'], errors='coerce')
-
-        # Update last seen IDs
-        if not df_t.empty: state["traffic"] = int(df_t["id"].max())
-        if not df_w.empty: state["weather"] = int(df_w["id"].max())
-        if not df_a.empty: state["air"] = int(df_a["id"].max())
-        save_state(state)
-
-        log("✅ Historical data fetched successfully!")
-        return df_t, df_w, df_a
+        copied = analytics_store.sync([table for table, _ in SOURCES.values()])
+        new_rows = sum(copied.values())
+        frames = [load_frame(source) for source in SOURCES]
+        log(f"✅ Analytics store synced ({new_rows} new rows)")
+        return (*frames, new_rows)
     except Exception as e:
         log(f"❌ Error fetching historical data: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-    finally:
-        session.close()
-
-def plot_trends(df_t, df_w, df_a):
-    """Generates and saves trend charts."""
+        import pandas as pd
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), 0
+
+# ---------- Charts ----------
+def _trend_spec(df, y, title, ylabel):
+    return {
+        "title": title,
+        "xlabel": "hour_start",
+        "ylabel": ylabel,
+        "size": (6.4, 4.8),
+        "series": [{"x": df["hour_start"].to_numpy(), "y": df[y].to_numpy(dtype=float)}],
+    }
+
+def trend_specs(df_t, df_w, df_a):
+    """Chart specs for the dashboard trends, keyed by chart name."""
+    specs = {}
     if not df_t.empty:
-        plt.figure()
-        df_t.plot(x='hour_start', y='avg_speed', title='Average Traffic Speed Over Time', legend=False)
-        plt.ylabel("Speed (km/h)")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "traffic_trend.png"))
-        plt.close()
-
+        specs["traffic_trend"] = _trend_spec(df_t, "avg_speed", "Average Traffic Speed Over Time", "Speed (km/h)")
     if not df_w.empty:
-        plt.figure()
-        df_w.plot(x='hour_start', y='avg_temp', title='Temperature Over Time (°C)', legend=False)
-        plt.ylabel("Temperature (°C)")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "weather_trend.png"))
-        plt.close()
-
+        specs["weather_trend"] = _trend_spec(df_w, "avg_temp", "Temperature Over Time (°C)", "Temperature (°C)")
     if not df_a.empty:
-        plt.figure()
-        df_a.plot(x='hour_start', y='avg_aqi', title='Air Quality Index (AQI) Over Time', legend=False)
-        plt.ylabel("AQI")
-        plt.tight_layout()
-        plt.savefig(os.path.join(OUTPUT_DIR, "air_trend.png"))
-        plt.close()
+        specs["air_trend"] = _trend_spec(df_a, "avg_aqi", "Air Quality Index (AQI) Over Time", "AQI")
+    return specs
+
+def specs_version():
+    """Changes whenever the trend frames can: the window moved to a new hour or a sync copied rows."""
+    return window_start(), tuple(analytics_store.generation(table) for table, _ in SOURCES.values())
+
+def load_trend_specs():
+    """Chart specs built from the analytics store (no OLTP access); frames are re-read only when they changed."""
+    version = specs_version()
+    with _specs_lock:
+        if _specs["version"] == version:
+            return _specs["specs"]
+    specs = trend_specs(load_frame("traffic"), load_frame("weather"), load_frame("air"))
+    with _specs_lock:
+        _specs.update(version=version, specs=specs)
+    return specs
+
+def plot_trends(df_t, df_w, df_a):
+    """Renders trend charts through the chart service and copies them into the dashboard."""
+    for name, spec in trend_specs(df_t, df_w, df_a).items():
+        chart_renderer.render_to(spec, os.path.join(OUTPUT_DIR, f"{name}.png"))
 
     log("📊 Trend charts updated!")
 
@@ -125,20 +118,26 @@ def generate_html_dashboard():
     </body>
     </html>
     """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     with open(os.path.join(OUTPUT_DIR, "dashboard.html"), "w", encoding="utf-8") as f:
         f.write(html)
     log("🌍 Dashboard HTML updated!")
 
 def run_analytics_cycle():
     log("🔍 Running smart data analytics fetcher...")
-    df_t, df_w, df_a = fetch_historical_data()
+    df_t, df_w, df_a, new_rows = fetch_historical_data()
     if df_t.empty and df_w.empty and df_a.empty:
-        log("⚠️ No new data to visualize.")
+        log("⚠️ No data to visualize.")
+        return
+    charts = ["traffic_trend.png", "weather_trend.png", "air_trend.png"]
+    if new_rows == 0 and all(os.path.exists(os.path.join(OUTPUT_DIR, c)) for c in charts):
+        log("⚠️ No new data since last cycle; charts are current.")
         return
     plot_trends(df_t, df_w, df_a)
     generate_html_dashboard()
     log("🎯 Dashboard generation complete!")
 
 if __name__ == "__main__":
+    setup_logging()
     run_analytics_cycle()
 
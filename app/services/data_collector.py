@@ -1,12 +1,17 @@
-import os
+import asyncio
 import time
 import threading
-import logging
 from datetime import datetime, timezone
-import requests
 from sqlalchemy.orm import Session
 from app.db import database, models
-from app.config import settings
+from app.config import settings, TOMTOM_FLOW_URL, OPENWEATHER_WEATHER_URL
+from app.services.latest_index import latest_index, record_from_row
+from app.services.spatial_index import spatial_index
+from app.services.recent_store import recent_store
+from app.services.anomaly_detector import observe_traffic, observe_aqi
+from app.utils.api_client import client
+from app.utils.metrics import Counter, Histogram
+from app.utils.logs import get_logger, setup_logging
 
 # === CONFIG ===
 LATITUDE = float(settings.LATITUDE)
@@ -18,22 +23,22 @@ TOMTOM_KEY = settings.TOMTOM_KEY
 COLLECTION_INTERVAL = float(settings.COLLECTION_INTERVAL)
 
 # === LOGGING ===
-LOG_DIR = "logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-log_file = os.path.join(LOG_DIR, "collector.log")
+# queued JSON logging: file/console I/O happens on the log writer thread
+log = get_logger("collector")
 
-file_handler = logging.FileHandler(log_file, mode="a", encoding="utf-8")
-console_handler = logging.StreamHandler()
-formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
 
-logger = logging.getLogger("Collector")
-logger.setLevel(logging.INFO)
-logger.handlers = []
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-log = logger
+def _ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+# === METRICS ===
+CYCLE_SECONDS = Histogram(
+    "urbanpulse_collector_cycle_duration_seconds", "Duration of one collection cycle (all sources)",
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+RESULTS = Counter(
+    "urbanpulse_collector_results", "Collected readings per source by result (success, failure, empty)",
+    ["source", "result"],
+)
 
 
 # ---------- AQI Calculation (CPCB Standard) ----------
@@ -63,109 +68,169 @@ def calculate_aqi(pm25):
         return None
 
 
+# ---------- Upstream requests ----------
+# (source, provider, url, query params); fetched with the shared pooled client
+def _requests():
+    return [
+        ("traffic", "tomtom", TOMTOM_FLOW_URL,
+         {"point": f"{LATITUDE},{LONGITUDE}", "unit": "KMPH", "key": TOMTOM_KEY}),
+        ("weather", "openweather", OPENWEATHER_WEATHER_URL,
+         {"q": CITY, "units": "metric", "appid": OPENWEATHER_KEY}),
+        ("air_quality", "open_meteo", OPEN_METEO_URL, None),
+    ]
+
+
+LABELS = {"traffic": "Traffic", "weather": "Weather", "air_quality": "Air Quality"}
+
+
+# ---------- Storing ----------
+def _store_traffic(db, payload, source_start):
+    data = payload.get("flowSegmentData", {})
+
+    entry = models.TrafficData(
+        latitude=LATITUDE,
+        longitude=LONGITUDE,
+        current_speed=data.get("currentSpeed"),
+        free_flow_speed=data.get("freeFlowSpeed"),
+        confidence=data.get("confidence"),
+        road_closure=str(data.get("roadClosure")),
+        timestamp=datetime.now(timezone.utc),
+    )
+
+    db.add(entry)
+    indexed = record_from_row("traffic", entry)
+    db.commit()
+    latest_index.update("traffic", *indexed)
+    recent_store.append("traffic", *indexed)
+    spatial_index.add(LATITUDE, LONGITUDE, {**indexed[1], "kind": "raw"})
+    observe_traffic("traffic_raw", LATITUDE, LONGITUDE, entry.current_speed, entry.free_flow_speed, indexed[1]["timestamp"])
+    log.info(f"Traffic stored ({LATITUDE}, {LONGITUDE})",
+             extra={"source": "traffic", "rows": 1, "duration_ms": _ms(source_start)})
+    RESULTS.inc(source="traffic", result="success")
+
+
+def _store_weather(db, payload, source_start):
+    main = payload.get("main", {})
+    weather = payload.get("weather", [{}])[0]
+
+    entry = models.WeatherData(
+        city=CITY,
+        temperature=main.get("temp"),
+        humidity=main.get("humidity"),
+        condition=weather.get("main"),
+        description=weather.get("description"),
+        wind_speed=payload.get("wind", {}).get("speed"),
+        timestamp=datetime.now(timezone.utc),
+    )
+
+    db.add(entry)
+    indexed = record_from_row("weather", entry)
+    db.commit()
+    latest_index.update("weather", *indexed)
+    recent_store.append("weather", *indexed)
+    log.info(f"Weather stored | {CITY}: {main.get('temp')}°C, {main.get('humidity')}%",
+             extra={"source": "weather", "rows": 1, "duration_ms": _ms(source_start)})
+    RESULTS.inc(source="weather", result="success")
+
+
+def _store_air_quality(db, payload, source_start):
+    hourly = payload.get("hourly", {})
+
+    if not hourly:
+        log.warning("No hourly air quality data available.",
+                    extra={"source": "air_quality", "rows": 0, "duration_ms": _ms(source_start)})
+        RESULTS.inc(source="air_quality", result="empty")
+        return
+
+    pm25 = (hourly.get("pm2_5") or [None])[-1]
+    pm10 = (hourly.get("pm10") or [None])[-1]
+    co = (hourly.get("carbon_monoxide") or [None])[-1]
+    no2 = (hourly.get("nitrogen_dioxide") or [None])[-1]
+    o3 = (hourly.get("ozone") or [None])[-1]
+
+    aqi_value = calculate_aqi(pm25)
+
+    entry = models.AirQualityData(
+        city=CITY,
+        pm25=pm25,
+        pm10=pm10,
+        co=co,
+        no2=no2,
+        o3=o3,
+        aqi=aqi_value,
+        timestamp=datetime.now(timezone.utc),
+    )
+
+    db.add(entry)
+    indexed = record_from_row("air_quality", entry)
+    db.commit()
+    latest_index.update("air_quality", *indexed)
+    recent_store.append("air_quality", *indexed)
+    observe_aqi("air_quality_raw", CITY, aqi_value, indexed[1]["timestamp"])
+
+    log.info(f"Air Quality stored | {CITY}: PM2.5={pm25}, AQI={aqi_value}",
+             extra={"source": "air_quality", "rows": 1, "duration_ms": _ms(source_start)})
+    RESULTS.inc(source="air_quality", result="success")
+
+
+STORERS = {"traffic": _store_traffic, "weather": _store_weather, "air_quality": _store_air_quality}
+
+
+def _store_all(fetched, started):
+    """Store each source's payload; ``fetched`` maps source -> (payload or exception, fetch start)."""
+    db: Session = database.SessionLocal()
+    try:
+        for source, (payload, source_start) in fetched.items():
+            try:
+                if isinstance(payload, Exception):
+                    raise payload
+                STORERS[source](db, payload, source_start)
+            except Exception as e:
+                db.rollback()
+                log.error(f"{LABELS[source]} collection failed: {e}",
+                          extra={"source": source, "duration_ms": _ms(source_start)})
+                RESULTS.inc(source=source, result="failure")
+    finally:
+        db.close()
+        CYCLE_SECONDS.observe(time.perf_counter() - started)
+        log.info("Data collection cycle complete.", extra={"source": "collector", "duration_ms": _ms(started)})
+
+
 # ---------- Core Collection Function ----------
 def collect_all_data():
     """Collect traffic, weather, and air quality data and store them in DB."""
     now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z")
     log.info(f"Collecting all data at {now_str}")
+    started = time.perf_counter()
 
-    db: Session = database.SessionLocal()
-
-    try:
-        # --- TRAFFIC ---
-        try:
-            traffic_url = (
-                "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
-                f"?point={LATITUDE},{LONGITUDE}&unit=KMPH&key={TOMTOM_KEY}"
-            )
-            resp = requests.get(traffic_url, timeout=10)
-            resp.raise_for_status()
-
-            data = resp.json().get("flowSegmentData", {})
-
-            entry = models.TrafficData(
-                latitude=LATITUDE,
-                longitude=LONGITUDE,
-                current_speed=data.get("currentSpeed"),
-                free_flow_speed=data.get("freeFlowSpeed"),
-                confidence=data.get("confidence"),
-                road_closure=str(data.get("roadClosure")),
-                timestamp=datetime.now(timezone.utc),
-            )
-
-            db.add(entry)
-            db.commit()
-            log.info(f"Traffic stored ({LATITUDE}, {LONGITUDE})")
-        except Exception as e:
-            log.error(f"Traffic collection failed: {e}")
-
-        # --- WEATHER ---
+    fetched = {}
+    for source, provider, url, params in _requests():
+        source_start = time.perf_counter()
         try:
-            weather_url = (
-                f"https://api.openweathermap.org/data/2.5/weather"
-                f"?q={CITY}&units=metric&appid={OPENWEATHER_KEY}"
-            )
-            resp = requests.get(weather_url, timeout=10)
-            resp.raise_for_status()
-
-            data = resp.json()
-            main = data.get("main", {})
-            condition = data.get("weather", [{}])[0].get("main")
-
-            entry = models.WeatherData(
-                city=CITY,
-                temperature=main.get("temp"),
-                humidity=main.get("humidity"),
-                condition=condition,
-                timestamp=datetime.now(timezone.utc),
-            )
-
-            db.add(entry)
-            db.commit()
-            log.info(f"Weather stored | {CITY}: {main.get('temp')}°C, {main.get('humidity')}%")
+            fetched[source] = (client(provider).get(url, params=params), source_start)
         except Exception as e:
-            log.error(f"Weather collection failed: {e}")
+            fetched[source] = (e, source_start)
+    _store_all(fetched, started)
 
-        # --- AIR QUALITY ---
-        try:
-            resp = requests.get(OPEN_METEO_URL, timeout=10)
-            resp.raise_for_status()
-
-            data = resp.json()
-            hourly = data.get("hourly", {})
-
-            if not hourly:
-                log.warning("No hourly air quality data available.")
-            else:
-                pm25 = (hourly.get("pm2_5") or [None])[-1]
-                pm10 = (hourly.get("pm10") or [None])[-1]
-                co = (hourly.get("carbon_monoxide") or [None])[-1]
-                no2 = (hourly.get("nitrogen_dioxide") or [None])[-1]
-                o3 = (hourly.get("ozone") or [None])[-1]
-
-                aqi_value = calculate_aqi(pm25)
-
-                entry = models.AirQualityData(
-                    city=CITY,
-                    pm25=pm25,
-                    pm10=pm10,
-                    co=co,
-                    no2=no2,
-                    o3=o3,
-                    aqi=aqi_value,
-                    timestamp=datetime.now(timezone.utc),
-                )
 
-                db.add(entry)
-                db.commit()
+async def collect_all_data_async():
+    """collect_all_data() with the three providers fetched concurrently on the event loop."""
+    now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z")
+    log.info(f"Collecting all data at {now_str}")
+    started = time.perf_counter()
 
-                log.info(f"Air Quality stored | {CITY}: PM2.5={pm25}, AQI={aqi_value}")
+    async def fetch(provider, url, params):
+        source_start = time.perf_counter()
+        try:
+            return await client(provider).aget(url, params=params), source_start
         except Exception as e:
-            log.error(f"Air Quality collection failed: {e}")
+            return e, source_start
 
-    finally:
-        db.close()
-        log.info("Data collection cycle complete.")
+    planned = _requests()
+    results = await asyncio.gather(*(fetch(provider, url, params) for _, provider, url, params in planned))
+    fetched = {source: result for (source, *_), result in zip(planned, results)}
+    # DB writes and in-memory index updates stay blocking; keep them off the loop
+    await asyncio.to_thread(_store_all, fetched, started)
 
 
 # ---------- Scheduler ----------
@@ -187,6 +252,7 @@ def start_background_collector():
 
 
 if __name__ == "__main__":
+    setup_logging()
     start_background_collector()
     try:
         while True:
@@ -0,0 +1,306 @@
+"""
+Streaming bulk export for UrbanPulse raw and hourly tables.
+
+Rows are read through a server-side cursor in fixed-size chunks and written
+out chunk by chunk (NDJSON lines, CSV rows or Parquet row groups), so memory
+use stays constant no matter how much history is exported.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import hashlib
+from datetime import datetime, date
+from sqlalchemy import select
+from app.config import settings
+from app.db import database, models
+
+# table name -> (model, time column)
+TABLES = {
+    "traffic_data": (models.TrafficData, "timestamp"),
+    "weather_data": (models.WeatherData, "timestamp"),
+    "air_quality_data": (models.AirQualityData, "timestamp"),
+    "traffic_hourly": (models.TrafficHourly, "hour_start"),
+    "weather_hourly": (models.WeatherHourly, "hour_start"),
+    "air_quality_hourly": (models.AirQualityHourly, "hour_start"),
+}
+
+FORMATS = ("ndjson", "csv", "parquet")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# ---------- Reading ----------
+def iter_chunks(table, start=None, end=None, chunk_size=None):
+    """Yield lists of row mappings for ``table`` ordered by id, ``chunk_size`` rows at a time."""
+    model, time_col = TABLES[table]
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    columns = model.__table__.c
+    query = select(model.__table__).order_by(columns.id)
+    if start is not None:
+        query = query.where(columns[time_col] >= start)
+    if end is not None:
+        query = query.where(columns[time_col] < end)
+
+    with database.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for partition in result.mappings().partitions(chunk_size):
+            yield partition
+
+
+def column_names(table):
+    model, _ = TABLES[table]
+    return [col.name for col in model.__table__.columns]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+# ---------- Writers ----------
+def write_ndjson(chunks, fileobj):
+    rows = 0
+    out = io.TextIOWrapper(fileobj, encoding="utf-8", newline="\n", write_through=True)
+    for chunk in chunks:
+        out.write("".join(json.dumps(dict(row), default=_json_default) + "\n" for row in chunk))
+        rows += len(chunk)
+    out.detach()
+    return rows
+
+
+def write_csv(chunks, fileobj, columns):
+    rows = 0
+    out = io.TextIOWrapper(fileobj, encoding="utf-8", newline="", write_through=True)
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for chunk in chunks:
+        writer.writerows([[row[col] for col in columns] for row in chunk])
+        rows += len(chunk)
+    out.detach()
+    return rows
+
+
+def write_parquet(chunks, path, table, compression="snappy"):
+    """Write row groups to ``path`` (a file path or a writable binary file object)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+    model, _ = TABLES[table]
+    type_map = {
+        "Integer": pa.int64(),
+        "Float": pa.float64(),
+        "String": pa.string(),
+        "DateTime": pa.timestamp("us"),
+        "Boolean": pa.bool_(),
+    }
+    schema = pa.schema([
+        (col.name, type_map.get(type(col.type).__name__, pa.string()))
+        for col in model.__table__.columns
+    ])
+
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for chunk in chunks:
+            data = {name: [row[name] for row in chunk] for name in schema.names}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))  # one row group per chunk
+            rows += len(chunk)
+    return rows
+
+
+def export_table(table, fmt, path, start=None, end=None, compress=False, chunk_size=None):
+    """Export ``table`` to ``path``. Returns the number of rows written."""
+    with open(path, "wb") as raw:
+        return write_export(table, fmt, raw, start, end, compress, chunk_size)
+
+
+def write_export(table, fmt, raw, start=None, end=None, compress=False, chunk_size=None):
+    """Export ``table`` to the binary file object ``raw``. Returns the number of rows written."""
+    if table not in TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected one of {', '.join(FORMATS)})")
+
+    chunks = iter_chunks(table, start, end, chunk_size)
+    if fmt == "parquet":
+        # Parquet compresses per column chunk; gzip-wrapping the file would break readers.
+        return write_parquet(chunks, raw, table, compression="gzip" if compress else "snappy")
+
+    fileobj = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+    try:
+        if fmt == "ndjson":
+            return write_ndjson(chunks, fileobj)
+        return write_csv(chunks, fileobj, column_names(table))
+    finally:
+        if compress:
+            fileobj.close()
+
+
+def file_name(table, fmt, compress):
+    suffix = ".gz" if compress and fmt != "parquet" else ""
+    return f"{table}.{fmt}{suffix}"
+
+
+# ---------- Spooled exports (API) ----------
+_active = set()             # spool paths being written by this process (other workers write their own temp file)
+_active_guard = threading.Lock()
+_DONE = object()
+
+
+def spool_path(table, fmt, start=None, end=None, compress=False):
+    """File under EXPORT_DIR keyed by the request parameters; identical requests share it."""
+    params = f"{table}|{fmt}|{start}|{end}|{compress}"
+    digest = hashlib.sha256(params.encode()).hexdigest()[:16]
+    return os.path.join(settings.EXPORT_DIR, f"{digest}-{file_name(table, fmt, compress)}")
+
+
+def cleanup_exports(max_age=None):
+    """Delete finished spooled export files older than ``max_age`` seconds."""
+    max_age = settings.EXPORT_TTL if max_age is None else max_age
+    if not os.path.isdir(settings.EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(settings.EXPORT_DIR):
+        if name.endswith(".part"):
+            continue  # an export still being written (possibly by another worker)
+        path = os.path.join(settings.EXPORT_DIR, name)
+        if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _ClientGone(Exception):
+    pass
+
+
+class _TeeFile(io.RawIOBase):
+    """
+    Write-only file object that hands each write to the response queue and, when
+    ``spool`` is set, also writes it to the spool file.
+    """
+
+    def __init__(self, out, spool=None):
+        self.out = out
+        self.spool = spool
+        self.position = 0
+        self.detached = False   # set once the client is gone: keep spooling, stop queueing
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def send(self, item):
+        if not self.detached:
+            self.out.put(item)
+
+    def write(self, data):
+        data = bytes(data)
+        if self.spool is not None:
+            self.spool.write(data)
+        elif self.detached:
+            raise _ClientGone()  # nothing left to write for
+        self.position += len(data)
+        if data:
+            self.send(data)
+        return len(data)
+
+
+def _spool(table, fmt, start, end, compress, path, tee):
+    """Producer thread: write the export through ``tee`` and publish the file under ``path`` when complete."""
+    # unique per writer: another worker may be spooling the same export; os.replace keeps whichever lands last
+    tmp_path = f"{path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.part"
+    try:
+        with open(tmp_path, "wb") as spool:
+            tee.spool = spool
+            write_export(table, fmt, tee, start, end, compress)
+        os.replace(tmp_path, path)
+        tee.send(_DONE)
+    except Exception as e:
+        tee.send(e)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with _active_guard:
+            _active.discard(path)
+
+
+def _stream_only(table, fmt, start, end, compress, tee):
+    """Producer thread without a spool file (another request is already spooling the same export)."""
+    try:
+        write_export(table, fmt, tee, start, end, compress)
+        tee.send(_DONE)
+    except _ClientGone:
+        pass
+    except Exception as e:
+        tee.send(e)
+
+
+def _drain(tee, first):
+    item = first
+    try:
+        while item is not _DONE:
+            if isinstance(item, Exception):
+                raise item  # headers are already sent: the client sees a truncated body
+            yield item
+            item = tee.out.get()
+    finally:
+        # client disconnected (or done): let the producer finish the spool file on its own
+        tee.detached = True
+        while not tee.out.empty():
+            tee.out.get_nowait()
+
+
+def finished_export(table, fmt, start=None, end=None, compress=False):
+    """Path of the complete spool file for these parameters, or None while it does not exist yet."""
+    path = spool_path(table, fmt, start, end, compress)
+    return path if os.path.exists(path) else None
+
+
+def stream_export(table, fmt, start=None, end=None, compress=False):
+    """
+    Start an export and return an iterator over its bytes for a streaming response.
+    The same bytes are written to the spool file, which becomes available to
+    finished_export() (and so to Range requests) once the export completes.
+    If this process is already spooling the same export, the data is streamed
+    straight from the DB without a second spool copy.
+    Errors raised before the first bytes are produced propagate to the caller.
+    """
+    path = spool_path(table, fmt, start, end, compress)
+    tee = _TeeFile(queue.Queue(maxsize=settings.EXPORT_STREAM_BUFFER))
+    with _active_guard:
+        spooling = path not in _active
+        if spooling:
+            _active.add(path)
+    if spooling:
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        cleanup_exports()
+        target = _spool
+        args = (table, fmt, start, end, compress, path, tee)
+    else:
+        target = _stream_only
+        args = (table, fmt, start, end, compress, tee)
+    threading.Thread(target=target, args=args, name="export", daemon=True).start()
+
+    first = tee.out.get()
+    if isinstance(first, Exception):
+        raise first
+    return _drain(tee, first)
+
@@ -1,16 +1,31 @@
+import calendar
 import pandas as pd
-import matplotlib.pyplot as plt
-from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
-from app.db.models import TrafficHourly, WeatherHourly, AirQualityHourly
-
-def fetch_data():
-    """Fetch historical aggregated data"""
-    session = SessionLocal()
-    traffic = pd.read_sql(session.query(TrafficHourly).statement, session.bind)
-    weather = pd.read_sql(session.query(WeatherHourly).statement, session.bind)
-    air = pd.read_sql(session.query(AirQualityHourly).statement, session.bind)
-    session.close()
+from app.services import chart_renderer
+from app.services.analytics_store import analytics_store
+from app.utils import downsample
+
+def _bucketed(table, columns, max_points):
+    """Whole-history series aggregated in the analytics store to at most max_points time buckets."""
+    start, end = analytics_store.query(f"SELECT MIN(hour_start), MAX(hour_start) FROM {table}").iloc[0]
+    if pd.isna(start):
+        return pd.DataFrame(columns=["hour_start"] + columns)
+    start, end = pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()
+    width = downsample.bucket_seconds(start, end + pd.Timedelta(hours=1), max_points)
+    origin = calendar.timegm(start.utctimetuple())
+    averages = ", ".join(f"AVG({col}) AS {col}" for col in columns)
+    return analytics_store.query(f"""
+        SELECT make_timestamp(CAST(({origin} + floor((epoch(hour_start) - {origin}) / {width}) * {width}) * 1000000 AS BIGINT)) AS hour_start,
+               {averages}
+        FROM {table}
+        GROUP BY 1 ORDER BY 1
+    """)
+
+def fetch_data(max_points=1000):
+    """Fetch historical aggregated data from the analytics store, bucketed to at most max_points per series"""
+    analytics_store.sync(["traffic_hourly", "weather_hourly", "air_quality_hourly"])
+    traffic = _bucketed("traffic_hourly", ["avg_speed", "free_flow_avg"], max_points)
+    weather = _bucketed("weather_hourly", ["avg_temp", "avg_humidity"], max_points)
+    air = _bucketed("air_quality_hourly", ["avg_aqi"], max_points)
     return traffic, weather, air
 
 def visualize():
@@ -21,40 +36,48 @@ def visualize():
         print("⚠️ No data found for visualization.")
         return
 
+    specs = {}
+
     # 🛣️ Traffic Trends
     if not traffic_df.empty:
-        plt.figure(figsize=(8, 5))
-        plt.plot(traffic_df['hour_start'], traffic_df['avg_speed'], marker='o', label='Avg Speed (km/h)')
-        plt.plot(traffic_df['hour_start'], traffic_df['free_flow_avg'], marker='x', label='Free Flow Speed (km/h)')
-        plt.title('Traffic Speed Trends (Hourly)')
-        plt.xlabel('Hour')
-        plt.ylabel('Speed (km/h)')
-        plt.legend()
-        plt.grid(True)
-        plt.show()
+        specs["traffic"] = {
+            "title": "Traffic Speed Trends (Hourly)", "xlabel": "Hour", "ylabel": "Speed (km/h)", "grid": True,
+            "series": [
+                {"x": traffic_df["hour_start"].to_numpy(), "y": traffic_df["avg_speed"].to_numpy(dtype=float),
+                 "marker": "o", "label": "Avg Speed (km/h)"},
+                {"x": traffic_df["hour_start"].to_numpy(), "y": traffic_df["free_flow_avg"].to_numpy(dtype=float),
+                 "marker": "x", "label": "Free Flow Speed (km/h)"},
+            ],
+        }
 
     # 🌦️ Weather Trends
     if not weather_df.empty:
-        plt.figure(figsize=(8, 5))
-        plt.plot(weather_df['hour_start'], weather_df['avg_temp'], color='orange', marker='o', label='Temperature (°C)')
-        plt.plot(weather_df['hour_start'], weather_df['avg_humidity'], color='blue', marker='x', label='Humidity (%)')
-        plt.title('Weather Trends (Hourly)')
-        plt.xlabel('Hour')
-        plt.ylabel('Values')
-        plt.legend()
-        plt.grid(True)
-        plt.show()
+        specs["weather"] = {
+            "title": "Weather Trends (Hourly)", "xlabel": "Hour", "ylabel": "Values", "grid": True,
+            "series": [
+                {"x": weather_df["hour_start"].to_numpy(), "y": weather_df["avg_temp"].to_numpy(dtype=float),
+                 "color": "orange", "marker": "o", "label": "Temperature (°C)"},
+                {"x": weather_df["hour_start"].to_numpy(), "y": weather_df["avg_humidity"].to_numpy(dtype=float),
+                 "color": "blue", "marker": "x", "label": "Humidity (%)"},
+            ],
+        }
 
     # 💨 Air Quality Trends
     if not air_df.empty:
-        plt.figure(figsize=(8, 5))
-        plt.plot(air_df['hour_start'], air_df['avg_aqi'], color='green', marker='o', label='AQI')
-        plt.title('Air Quality Index Trends (Hourly)')
-        plt.xlabel('Hour')
-        plt.ylabel('AQI')
-        plt.legend()
-        plt.grid(True)
-        plt.show()
+        specs["air"] = {
+            "title": "Air Quality Index Trends (Hourly)", "xlabel": "Hour", "ylabel": "AQI", "grid": True,
+            "series": [
+                {"x": air_df["hour_start"].to_numpy(), "y": air_df["avg_aqi"].to_numpy(dtype=float),
+                 "color": "green", "marker": "o", "label": "AQI"},
+            ],
+        }
+
+    # Headless render through the chart service (cached by data hash)
+    try:
+        for name, spec in specs.items():
+            print(f"🖼️ {name}: {chart_renderer.render(spec)}")
+    finally:
+        chart_renderer.shutdown()
 
 if __name__ == "__main__":
     visualize()
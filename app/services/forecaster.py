@@ -0,0 +1,237 @@
+"""
+Short-horizon forecasting for AQI and traffic speed.
+
+Each series keeps an additive Holt-Winters state (level, trend, 24 hourly
+seasonal terms) plus an EWMA of squared one-step errors. Every new hourly
+point updates the state in O(1); forecasts with prediction intervals are
+computed straight from the state, without refitting on history. States are
+persisted in the forecast_state table next to the hourly tables.
+"""
+
+import json
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.db import database, models
+from app.services.latest_index import as_utc, normalize_key
+
+SEASON = 24
+Z_95 = 1.96
+
+# source -> (hourly model, key column, forecast metric)
+SERIES = {
+    "air_quality": (models.AirQualityHourly, "city", "avg_aqi"),
+    "traffic": (models.TrafficHourly, "location", "avg_speed"),
+}
+
+
+class HoltWinters:
+    __slots__ = ("level", "trend", "season", "mse", "n", "last_ts", "prev")
+
+    def __init__(self):
+        self.level = None
+        self.trend = 0.0
+        self.season = [0.0] * SEASON
+        self.mse = 0.0
+        self.n = 0
+        self.last_ts = None
+        self.prev = None    # state before the last hour was absorbed, to re-apply a re-aggregated hour
+
+    def _state(self):
+        return {
+            "level": self.level,
+            "trend": self.trend,
+            "season": list(self.season),
+            "mse": self.mse,
+            "n": self.n,
+            "last_ts": self.last_ts.isoformat() if self.last_ts else None,
+        }
+
+    def _restore(self, state):
+        self.level = state["level"]
+        self.trend = state["trend"]
+        self.season = list(state["season"])
+        self.mse = state["mse"]
+        self.n = state["n"]
+        self.last_ts = datetime.fromisoformat(state["last_ts"]) if state["last_ts"] else None
+
+    def _step(self, value, idx, alpha, beta, gamma):
+        if self.n < SEASON:
+            # first day: level is the running mean, seasonal terms the deviations from it
+            self.level = value if self.level is None else self.level + (value - self.level) / (self.n + 1)
+            self.season[idx] = value - self.level
+            self.n += 1
+            return
+        predicted = self.level + self.trend + self.season[idx]
+        error = value - predicted
+        # EWMA of squared one-step errors drives the prediction interval
+        self.mse = error * error if self.n == SEASON else (1 - alpha) * self.mse + alpha * error * error
+
+        prev_level = self.level
+        self.level = alpha * (value - self.season[idx]) + (1 - alpha) * (self.level + self.trend)
+        self.trend = beta * (self.level - prev_level) + (1 - beta) * self.trend
+        self.season[idx] = gamma * (value - self.level) + (1 - gamma) * self.season[idx]
+        self.n += 1
+
+    def update(self, ts, value, alpha, beta, gamma):
+        """
+        Absorb one hourly point. Missing hours in between only advance the level along the trend.
+        A new value for the last hour (re-aggregation) replaces it; older hours are skipped.
+        """
+        ts = as_utc(ts).replace(minute=0, second=0, microsecond=0)
+        if self.last_ts is not None and ts < self.last_ts:
+            return False
+        if self.last_ts is not None and ts == self.last_ts:
+            if self.prev is None:
+                return False
+            self._restore(self.prev)
+        else:
+            self.prev = self._state()
+        if self.last_ts is not None:
+            gap = int((ts - self.last_ts).total_seconds() // 3600) - 1
+            # seasonal terms are left untouched for unobserved hours
+            self.level += self.trend * min(max(gap, 0), SEASON * 7)
+        self._step(float(value), ts.hour, alpha, beta, gamma)
+        self.last_ts = ts
+        return True
+
+    @property
+    def ready(self):
+        """Seasonal terms and the error estimate exist only after the first full day plus one point."""
+        return self.n > SEASON
+
+    def forecast(self, hours, alpha, beta):
+        if not self.ready:
+            return []  # a flat running mean with zero-width intervals would be misleading
+        sigma = math.sqrt(self.mse)
+        points = []
+        spread = 1.0
+        for h in range(1, hours + 1):
+            ts = self.last_ts + timedelta(hours=h)
+            yhat = self.level + h * self.trend + self.season[ts.hour]
+            if h > 1:
+                spread += (alpha + (h - 1) * beta) ** 2
+            half_width = Z_95 * sigma * math.sqrt(spread)
+            points.append({
+                "hour_start": ts,
+                "forecast": yhat,
+                "lower": yhat - half_width,
+                "upper": yhat + half_width,
+            })
+        return points
+
+    def to_json(self):
+        return json.dumps({**self._state(), "prev": self.prev})
+
+    @classmethod
+    def from_json(cls, raw):
+        data = json.loads(raw)
+        model = cls()
+        model._restore(data)
+        model.prev = data.get("prev")
+        return model
+
+
+class Forecaster:
+    def __init__(self):
+        self.alpha = settings.FORECAST_ALPHA
+        self.beta = settings.FORECAST_BETA
+        self.gamma = settings.FORECAST_GAMMA
+        self._models = {}   # (source, key) -> HoltWinters
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def update(self, source, key, ts, value):
+        if value is None:
+            return False
+        key = normalize_key(source, key)
+        with self._lock:
+            model = self._models.get((source, key))
+            if model is None:
+                model = self._models[(source, key)] = HoltWinters()
+            changed = model.update(ts, value, self.alpha, self.beta, self.gamma)
+            if changed:
+                self._dirty.add((source, key))
+        return changed
+
+    def forecast(self, source, key, hours):
+        model = self._models.get((source, normalize_key(source, key)))
+        if model is None:
+            return None
+        return {
+            "samples": model.n,
+            "last_observed": model.last_ts,
+            "points": model.forecast(hours, self.alpha, self.beta),
+        }
+
+    def keys(self, source=None):
+        return sorted(key for src, key in self._models if source is None or src == source)
+
+    # ---------- Persistence ----------
+    def save(self, db=None):
+        """Write states changed since the last save to forecast_state."""
+        with self._lock:
+            dirty = {k: self._models[k].to_json() for k in self._dirty}
+            self._dirty.clear()
+        if not dirty:
+            return 0
+        own_session = db is None
+        db = db or database.SessionLocal()
+        try:
+            for (source, key), state in dirty.items():
+                metric = SERIES[source][2]
+                row = (
+                    db.query(models.ForecastState)
+                    .filter_by(source=source, series_key=key, metric=metric)
+                    .first()
+                )
+                if row is None:
+                    row = models.ForecastState(source=source, series_key=key, metric=metric)
+                    db.add(row)
+                row.state = state
+                row.updated_at = datetime.now(timezone.utc)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(dirty)
+            raise
+        finally:
+            if own_session:
+                db.close()
+        return len(dirty)
+
+    def load(self, db=None, warm_days=None):
+        """Load stored states; series with no stored state are fitted once from recent hourly rows."""
+        own_session = db is None
+        db = db or database.SessionLocal()
+        warm_days = warm_days or settings.FORECAST_WARM_DAYS
+        try:
+            for row in db.query(models.ForecastState).all():
+                if row.source in SERIES:
+                    self._models[(row.source, row.series_key)] = HoltWinters.from_json(row.state)
+
+            since = (datetime.now(timezone.utc) - timedelta(days=warm_days)).replace(tzinfo=None)
+            for source, (model, key_col, metric) in SERIES.items():
+                query = (
+                    db.query(getattr(model, key_col), model.hour_start, getattr(model, metric))
+                    .filter(model.hour_start >= since)
+                    .order_by(model.hour_start)
+                )
+                for key, hour_start, value in query:
+                    if key is None or hour_start is None:
+                        continue
+                    try:
+                        self.update(source, key, hour_start, value)  # no-op for hours already in the state
+                    except ValueError:
+                        continue  # malformed location string
+        finally:
+            if own_session:
+                db.close()
+        self.save(db=None)
+        return len(self._models)
+
+
+# single instance shared by the aggregator and forecast routes
+forecaster = Forecaster()
@@ -0,0 +1,155 @@
+"""
+Maintained weather × air quality × traffic join (city_hourly_joined).
+
+Each refresh takes the hours touched since ``since``, builds an hourly grid
+per city and matches each source onto it as-of (nearest reading within
+JOIN_TOLERANCE_MINUTES), then replaces just those hours in the joined table.
+Traffic locations are averaged per hour and attributed to the configured CITY,
+which is where the collector samples them. pandas is imported on first use so
+the API can import this module (for rolling_correlations) without paying for it.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from app.config import settings
+from app.db import database
+
+JOINED_COLUMNS = [
+    "avg_temp", "avg_humidity",
+    "avg_aqi", "avg_pm25", "avg_no2", "avg_o3",
+    "avg_speed", "free_flow_avg", "congestion_ratio",
+]
+
+# default pairs reported by the joined endpoint
+CORRELATION_PAIRS = [
+    ("avg_temp", "avg_o3"),
+    ("avg_temp", "avg_aqi"),
+    ("avg_humidity", "avg_speed"),
+    ("avg_aqi", "congestion_ratio"),
+]
+
+
+def _naive_utc(ts):
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _load_sources(conn, start, end):
+    import pandas as pd
+    params = {"start": start, "end": end}
+    weather = pd.read_sql_query(text("""
+        SELECT city, hour_start, avg_temp, avg_humidity
+        FROM weather_hourly WHERE hour_start BETWEEN :start AND :end
+    """), conn, params=params)
+    air = pd.read_sql_query(text("""
+        SELECT city, hour_start, avg_aqi, avg_pm25, avg_no2, avg_o3
+        FROM air_quality_hourly WHERE hour_start BETWEEN :start AND :end
+    """), conn, params=params)
+    traffic = pd.read_sql_query(text("""
+        SELECT hour_start,
+               AVG(avg_speed) AS avg_speed,
+               AVG(free_flow_avg) AS free_flow_avg
+        FROM traffic_hourly WHERE hour_start BETWEEN :start AND :end
+        GROUP BY hour_start
+    """), conn, params=params)
+    traffic["city"] = settings.CITY
+    for df in (weather, air, traffic):
+        df["hour_start"] = pd.to_datetime(df["hour_start"], utc=True).dt.tz_localize(None)
+    return weather, air, traffic
+
+
+def build_joined(weather, air, traffic, since, tolerance):
+    """As-of join of the three sources onto the hourly grid (hours >= since) of every city."""
+    import pandas as pd
+    frames = [df[["city", "hour_start"]] for df in (weather, air, traffic) if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=["city", "hour_start"] + JOINED_COLUMNS)
+    grid = pd.concat(frames).drop_duplicates()
+    grid = grid[grid["hour_start"] >= since]
+    grid["hour_start"] = grid["hour_start"].dt.floor("h")
+    grid = grid.drop_duplicates().sort_values("hour_start")
+
+    joined = grid
+    for df in (weather, air, traffic):
+        if df.empty:
+            continue
+        df = df.dropna(subset=["hour_start"]).sort_values("hour_start")
+        joined = pd.merge_asof(
+            joined.sort_values("hour_start"), df,
+            on="hour_start", by="city",
+            direction="nearest", tolerance=tolerance,
+        )
+
+    for col in JOINED_COLUMNS:
+        if col not in joined:
+            joined[col] = float("nan")
+    joined["congestion_ratio"] = joined["avg_speed"] / joined["free_flow_avg"].where(joined["free_flow_avg"] > 0)
+    return joined[["city", "hour_start"] + JOINED_COLUMNS].reset_index(drop=True)
+
+
+def refresh(since, engine=None):
+    """Rebuild joined rows for hours >= since. Returns the number of rows written."""
+    import pandas as pd
+    engine = engine or database.engine
+    since = _naive_utc(since).replace(minute=0, second=0, microsecond=0)
+    tolerance = pd.Timedelta(minutes=settings.JOIN_TOLERANCE_MINUTES)
+    end = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    with engine.begin() as conn:
+        weather, air, traffic = _load_sources(conn, since - tolerance.to_pytimedelta(), end)
+        joined = build_joined(weather, air, traffic, pd.Timestamp(since), tolerance)
+        if joined.empty:
+            return 0
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        records = []
+        for row in joined.itertuples(index=False):
+            record = {"city": row.city, "hour_start": row.hour_start.to_pydatetime(), "updated_at": now}
+            for col in JOINED_COLUMNS:
+                value = getattr(row, col)
+                record[col] = None if pd.isna(value) else float(value)
+            records.append(record)
+
+        # replace just the touched hours
+        conn.execute(
+            text("DELETE FROM city_hourly_joined WHERE hour_start >= :since"),
+            {"since": since},
+        )
+        cols = ["city", "hour_start", "updated_at"] + JOINED_COLUMNS
+        conn.execute(
+            text(f"INSERT INTO city_hourly_joined ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})"),
+            records,
+        )
+    return len(records)
+
+
+def ensure_backfilled(engine=None):
+    """Fill the joined table from JOIN_BACKFILL_DAYS of history if it is empty."""
+    engine = engine or database.engine
+    with engine.connect() as conn:
+        existing = conn.execute(text("SELECT COUNT(*) FROM city_hourly_joined")).scalar()
+    if existing:
+        return 0
+    since = datetime.now(timezone.utc) - timedelta(days=settings.JOIN_BACKFILL_DAYS)
+    return refresh(since, engine)
+
+
+def _finite(value):
+    return float(value) if value is not None and math.isfinite(value) else None
+
+
+def rolling_correlations(df, window, pairs=None):
+    """Rolling Pearson correlation per column pair, aligned with df rows (None until the window fills)."""
+    result = {}
+    for a, b in pairs or CORRELATION_PAIRS:
+        if a not in df or b not in df:
+            continue
+        series = df[a].rolling(window, min_periods=max(3, window // 2)).corr(df[b])
+        overall = df[a].corr(df[b])
+        result[f"{a}~{b}"] = {
+            "overall": _finite(overall),
+            "rolling": [_finite(v) for v in series],
+        }
+    return result
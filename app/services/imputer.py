@@ -0,0 +1,244 @@
+"""
+Gap filling for the hourly tables.
+
+Each series (one city or traffic location) is read in IMPUTE_CHUNK_HOURS
+windows and laid on a dense hourly grid. Per metric, NaNs and missing hours
+are filled with NumPy: linear interpolation, or (IMPUTE_MODE=seasonal)
+linear interpolation of the residual from the profile cube's hour-of-week
+mean, so a filled evening keeps its evening shape. Only gaps of at most
+IMPUTE_MAX_GAP_HOURS with real values on both sides are filled. Results go
+back in batched UPDATEs / INSERTs with imputed = true (whole missing hours get
+samples = 0), and a per-series checkpoint in imputation_state means each run
+only looks at hours after the last one it finished. Updated rows keep their
+created_at; their ids are reported through ``changed`` so the analytics
+mirror can re-copy them.
+
+CLI: python -m app.services.imputer [--table T] [--mode linear|seasonal] [--full]
+"""
+
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, func, select, text
+from app.config import settings
+from app.db import database, models
+from app.services.profile_cube import profile_cube
+
+# table -> (profile cube source, key column, nullable metric columns)
+TABLES = {
+    "traffic_hourly": ("traffic", "location", ["avg_speed", "free_flow_avg"]),
+    "weather_hourly": ("weather", "city", ["avg_temp", "avg_humidity"]),
+    "air_quality_hourly": ("air_quality", "city", ["avg_aqi", "avg_pm25", "avg_pm10", "avg_no2", "avg_o3"]),
+}
+
+MODES = ("linear", "seasonal")
+
+_run_lock = threading.Lock()
+
+
+def fill_gaps(values, max_gap, seasonal=None):
+    """
+    Fill NaN runs of at most ``max_gap`` that have real values on both sides.
+    ``seasonal`` (same length) is subtracted before and added back after the
+    linear interpolation. Returns (filled values, mask of filled positions).
+    """
+    y = np.asarray(values, dtype=float)
+    base = np.zeros_like(y) if seasonal is None else np.nan_to_num(np.asarray(seasonal, dtype=float))
+    known = ~np.isnan(y)
+    if known.sum() < 2:
+        return y, np.zeros(y.size, dtype=bool)
+
+    pos = np.arange(y.size)
+    prev_known = np.maximum.accumulate(np.where(known, pos, -1))
+    next_known = np.minimum.accumulate(np.where(known, pos, y.size)[::-1])[::-1]
+    fillable = (~known) & (prev_known >= 0) & (next_known < y.size) & (next_known - prev_known - 1 <= max_gap)
+    if not fillable.any():
+        return y, fillable
+
+    residual = y - base
+    filled = y.copy()
+    filled[fillable] = np.interp(pos[fillable], pos[known], residual[known]) + base[fillable]
+    return filled, fillable
+
+
+def _hour_of_week(hours, tz):
+    local = pd.DatetimeIndex(hours).tz_localize("UTC").tz_convert(tz)
+    return np.asarray(local.dayofweek * 24 + local.hour)
+
+
+def _seasonal(source, key, metric, how):
+    means = profile_cube.means(source, key, metric)
+    if means is None:
+        return None
+    mean, count = means
+    if (count[how] == 0).any():
+        return None  # partial profile: a 0 would pull filled values towards zero
+    return mean[how]
+
+
+def _load(conn, table, key_col, metrics, key, lo, hi):
+    t = models.Base.metadata.tables[table]
+    cols = ["id", "hour_start", "imputed"] + metrics
+    rows = conn.execute(
+        select(*[t.c[c] for c in cols])
+        .where(t.c[key_col] == key, t.c.hour_start >= lo, t.c.hour_start < hi)
+        .order_by(t.c.hour_start)
+    ).all()
+    df = pd.DataFrame(rows, columns=cols)
+    df["hour_start"] = pd.to_datetime(df["hour_start"], utc=True).dt.tz_localize(None).dt.floor("h")
+    return df.drop_duplicates("hour_start", keep="last")
+
+
+def impute_window(conn, table, key, lo, hi, mode, max_gap, batch_size):
+    """
+    Fill gaps of one series in [lo, hi). Returns (values filled in existing rows,
+    hours inserted, last real hour, ids of the updated rows).
+    """
+    source, key_col, metrics = TABLES[table]
+    df = _load(conn, table, key_col, metrics, key, lo, hi)
+    if df.empty:
+        return 0, 0, None, []
+
+    grid = pd.date_range(df["hour_start"].iloc[0], df["hour_start"].iloc[-1], freq="h")
+    frame = df.set_index("hour_start").reindex(grid)
+    how = _hour_of_week(grid, ZoneInfo(settings.LOCAL_TIMEZONE)) if mode == "seasonal" else None
+
+    filled_cols = {}
+    for metric in metrics:
+        seasonal = _seasonal(source, key, metric, how) if how is not None else None
+        values, mask = fill_gaps(frame[metric].to_numpy(dtype=float), max_gap, seasonal)
+        if mask.any():
+            filled_cols[metric] = (values, mask)
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    exists = frame["id"].notna().to_numpy()
+    updates, inserts = {}, []
+    for metric, (values, mask) in filled_cols.items():
+        for i in np.flatnonzero(mask & exists):
+            row = updates.setdefault(int(frame["id"].iloc[i]), {"id": int(frame["id"].iloc[i])})
+            row[metric] = float(values[i])
+    missing_hours = np.flatnonzero(~exists)
+    for i in missing_hours:
+        row = {metric: float(values[i]) for metric, (values, mask) in filled_cols.items() if mask[i]}
+        if row:
+            inserts.append({key_col: key, "hour_start": grid[i].to_pydatetime(), "samples": 0, "created_at": now,
+                            **{metric: row.get(metric) for metric in metrics}})
+
+    # batched writes, grouped by the set of columns each UPDATE touches
+    by_columns = {}
+    for row in updates.values():
+        by_columns.setdefault(tuple(sorted(k for k in row if k != "id")), []).append(row)
+    for columns, rows in by_columns.items():
+        set_clause = ", ".join(f"{c} = :{c}" for c in columns)
+        stmt = text(f"UPDATE {table} SET {set_clause}, imputed = :imputed WHERE id = :id")
+        for start in range(0, len(rows), batch_size):
+            conn.execute(stmt, [{**r, "imputed": True} for r in rows[start:start + batch_size]])
+    if inserts:
+        cols = [key_col, "hour_start", "samples", "created_at", "imputed"] + metrics
+        stmt = text(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})") \
+            .bindparams(bindparam("hour_start", type_=DateTime), bindparam("created_at", type_=DateTime))
+        for start in range(0, len(inserts), batch_size):
+            conn.execute(stmt, [{**r, "imputed": True} for r in inserts[start:start + batch_size]])
+
+    real = df.loc[~df["imputed"].fillna(0).astype(bool), "hour_start"]
+    last_real = real.iloc[-1].to_pydatetime() if not real.empty else None
+    return sum(len(r) - 1 for r in updates.values()), len(inserts), last_real, list(updates)
+
+
+def impute_table(table, mode=None, full=False, engine=None, progress=print, changed=None):
+    """
+    Fill new gaps in every series of one table. Returns (values filled, hours inserted);
+    ids of rows updated in place are appended to ``changed`` if given.
+    """
+    engine = engine or database.engine
+    mode = mode or settings.IMPUTE_MODE
+    max_gap = settings.IMPUTE_MAX_GAP_HOURS
+    chunk = timedelta(hours=settings.IMPUTE_CHUNK_HOURS)
+    # each window re-reads enough context before it to anchor a gap left open by the previous one
+    context = timedelta(hours=max_gap + 1)
+    _, key_col, _ = TABLES[table]
+
+    t = models.Base.metadata.tables[table]
+    with engine.connect() as conn:
+        series = conn.execute(
+            select(t.c[key_col], func.min(t.c.hour_start), func.max(t.c.hour_start))
+            .where(t.c[key_col].isnot(None), t.c.hour_start.isnot(None))
+            .group_by(t.c[key_col])
+        ).all()
+
+    session = database.SessionLocal(bind=engine)
+    try:
+        states = {
+            row.series_key: row
+            for row in session.query(models.ImputationState).filter_by(table_name=table)
+        }
+        total_values = total_hours = 0
+        for key, first, last in series:
+            state = states.get(key)
+            start = first if full or state is None or state.last_hour is None else max(first, state.last_hour - context)
+            last_real = state.last_hour if state is not None and not full else None
+            lo = start
+            while lo <= last:
+                hi = lo + chunk
+                with engine.begin() as conn:   # one short transaction per window
+                    values, hours, window_last, updated = impute_window(
+                        conn, table, key, lo - context, hi, mode, max_gap, settings.IMPUTE_BATCH_SIZE)
+                if changed is not None:
+                    changed.extend(updated)
+                total_values += values
+                total_hours += hours
+                if window_last is not None and (last_real is None or window_last > last_real):
+                    last_real = window_last
+                lo = hi
+            if last_real is not None:
+                if state is None:
+                    state = models.ImputationState(table_name=table, series_key=key)
+                    session.add(state)
+                state.last_hour = last_real
+                state.updated_at = datetime.now(timezone.utc)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    if total_values or total_hours:
+        progress(f"🩹 {table}: filled {total_values} values and {total_hours} missing hours ({mode}).")
+    return total_values, total_hours
+
+
+def run(tables=None, mode=None, full=False, engine=None, progress=print, changed=None):
+    """
+    Fill new gaps in all hourly tables. Safe to call every aggregation cycle.
+    ``changed`` (a dict) collects {table: [ids of rows updated in place]}.
+    """
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"Unknown imputation mode: {mode}")
+    with _run_lock:
+        return {
+            table: impute_table(table, mode, full, engine, progress,
+                                None if changed is None else changed.setdefault(table, []))
+            for table in (tables or TABLES)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill gaps in the hourly tables")
+    parser.add_argument("--table", choices=sorted(TABLES), help="only this table (default: all hourly tables)")
+    parser.add_argument("--mode", choices=MODES, default=None, help=f"default: IMPUTE_MODE ({settings.IMPUTE_MODE})")
+    parser.add_argument("--full", action="store_true", help="ignore checkpoints and rescan whole series")
+    args = parser.parse_args()
+
+    print("=== 🩹 UrbanPulse Gap Filler ===")
+    if args.mode == "seasonal" or (args.mode is None and settings.IMPUTE_MODE == "seasonal"):
+        profile_cube.warm()
+    run([args.table] if args.table else None, args.mode, args.full)
+    print("\n✅ Gap filling complete.\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Latest-reading index for UrbanPulse.
+
+Keeps the most recent raw reading per (source, city/location) in memory so
+"current value" reads are a dict lookup instead of an
+``ORDER BY timestamp DESC LIMIT 1`` scan or an upstream call.
+The collector updates it on every store; on startup it is rebuilt from the
+raw tables with one grouped query per source.
+"""
+
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import func, and_
+from app.db import database, models
+from app.utils.metrics import record_cache
+
+# source name -> (raw model, key columns)
+SOURCES = {
+    "traffic": (models.TrafficData, ("latitude", "longitude")),
+    "weather": (models.WeatherData, ("city",)),
+    "air_quality": (models.AirQualityData, ("city",)),
+}
+
+FIELDS = {
+    "traffic": ("latitude", "longitude", "current_speed", "free_flow_speed", "confidence", "road_closure"),
+    "weather": ("city", "temperature", "humidity", "condition", "description", "wind_speed"),
+    "air_quality": ("city", "aqi", "pm25", "pm10", "co", "no2", "o3"),
+}
+
+
+# ---------- Key helpers ----------
+def location_key(lat, lon):
+    """Traffic location key, same format as traffic_hourly.location."""
+    return f"{float(lat):.4f},{float(lon):.4f}"
+
+
+def normalize_key(source, key):
+    if source == "traffic":
+        lat, lon = str(key).split(",", 1)
+        return location_key(lat, lon)
+    return str(key).strip().lower()
+
+
+def as_utc(ts):
+    """DB timestamps come back naive; they are stored in UTC."""
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def record_from_row(source, row):
+    """Build (key, record) from a raw ORM row (or any object with the same attributes)."""
+    record = {field: getattr(row, field, None) for field in FIELDS[source]}
+    record["timestamp"] = as_utc(getattr(row, "timestamp", None)) or datetime.now(timezone.utc)
+    if source == "traffic":
+        key = location_key(row.latitude, row.longitude)
+        record["location"] = key
+    else:
+        key = normalize_key(source, row.city)
+    return key, record
+
+
+# ---------- Index ----------
+class LatestIndex:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def update(self, source, key, record):
+        """Store record if it is newer than what the index already holds."""
+        index_key = (source, normalize_key(source, key))
+        with self._lock:
+            current = self._data.get(index_key)
+            if current is None or record["timestamp"] >= current["timestamp"]:
+                self._data[index_key] = record
+
+    def update_from_row(self, source, row):
+        key, record = record_from_row(source, row)
+        self.update(source, key, record)
+
+    def get(self, source, key):
+        return self._data.get((source, normalize_key(source, key)))
+
+    def get_fresh(self, source, key, max_age):
+        """Return the record only if it is at most ``max_age`` seconds old."""
+        record = self.get(source, key)
+        if record is None or age_seconds(record) > max_age:
+            record_cache("latest", False)
+            return None
+        record_cache("latest", True)
+        return record
+
+    def items(self, source=None):
+        return [
+            (src, key, record)
+            for (src, key), record in list(self._data.items())
+            if source is None or src == source
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def rebuild(self, db=None):
+        """Reload the latest row per key from the raw tables. Returns number of keys loaded."""
+        own_session = db is None
+        db = db or database.SessionLocal()
+        loaded = 0
+        try:
+            for source, (model, key_cols) in SOURCES.items():
+                keys = [getattr(model, col) for col in key_cols]
+                latest = (
+                    db.query(*keys, func.max(model.timestamp).label("max_ts"))
+                    .group_by(*keys)
+                    .subquery()
+                )
+                rows = (
+                    db.query(model)
+                    .join(
+                        latest,
+                        and_(
+                            *[getattr(model, col) == getattr(latest.c, col) for col in key_cols],
+                            model.timestamp == latest.c.max_ts,
+                        ),
+                    )
+                    .all()
+                )
+                for row in rows:
+                    self.update_from_row(source, row)
+                    loaded += 1
+        finally:
+            if own_session:
+                db.close()
+        return loaded
+
+
+def age_seconds(record):
+    return (datetime.now(timezone.utc) - record["timestamp"]).total_seconds()
+
+
+# single instance shared by the collector and the routes
+latest_index = LatestIndex()
@@ -0,0 +1,289 @@
+"""
+Hour-of-week profile cube.
+
+For every (source, city/location, metric) the cube keeps, for each of the 168
+hours of the week (local time), a sample count, running mean and variance
+(Welford) and a fixed-bin histogram used as a quantile sketch. The aggregator
+adds each hourly row as it lands, so "is this normal for a Tuesday at 6pm?"
+is an array lookup instead of a scan over weeks of hourly rows. The aggregator
+re-aggregates the current hour every cycle; the values last absorbed for a
+series' latest hour are kept so a re-aggregation replaces them.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import numpy as np
+from app.config import settings
+from app.db import database, models
+from app.services.latest_index import as_utc, normalize_key
+
+HOURS_PER_WEEK = 168
+N_BINS = 64
+
+# source -> {metric: (histogram low, histogram high)}
+METRICS = {
+    "traffic": {
+        "avg_speed": (0.0, 160.0),
+        "free_flow_avg": (0.0, 160.0),
+        "congestion_ratio": (0.0, 1.6),
+    },
+    "weather": {
+        "avg_temp": (-30.0, 55.0),
+        "avg_humidity": (0.0, 100.0),
+    },
+    "air_quality": {
+        "avg_aqi": (0.0, 500.0),
+        "avg_pm25": (0.0, 500.0),
+        "avg_pm10": (0.0, 600.0),
+        "avg_no2": (0.0, 400.0),
+        "avg_o3": (0.0, 400.0),
+    },
+}
+
+# hourly metric -> field of the latest raw reading (latest_index)
+RAW_FIELDS = {
+    "avg_speed": "current_speed",
+    "free_flow_avg": "free_flow_speed",
+    "avg_temp": "temperature",
+    "avg_humidity": "humidity",
+    "avg_aqi": "aqi",
+    "avg_pm25": "pm25",
+    "avg_pm10": "pm10",
+    "avg_no2": "no2",
+    "avg_o3": "o3",
+}
+
+
+def hour_of_week(ts, tz=None):
+    """0 = Monday 00:00 local time."""
+    local = as_utc(ts).astimezone(tz or ZoneInfo(settings.LOCAL_TIMEZONE))
+    return local.weekday() * 24 + local.hour
+
+
+class Profile:
+    __slots__ = ("low", "high", "count", "mean", "m2", "hist")
+
+    def __init__(self, low, high):
+        self.low, self.high = low, high
+        self.count = np.zeros(HOURS_PER_WEEK, dtype=np.int64)
+        self.mean = np.zeros(HOURS_PER_WEEK)
+        self.m2 = np.zeros(HOURS_PER_WEEK)
+        self.hist = np.zeros((HOURS_PER_WEEK, N_BINS), dtype=np.int64)
+
+    def _bin(self, value):
+        b = int((value - self.low) / (self.high - self.low) * N_BINS)
+        return min(max(b, 0), N_BINS - 1)
+
+    def add(self, how, value):
+        self.count[how] += 1
+        delta = value - self.mean[how]
+        self.mean[how] += delta / self.count[how]
+        self.m2[how] += delta * (value - self.mean[how])
+        self.hist[how, self._bin(value)] += 1
+
+    def remove(self, how, value):
+        """Undo add(how, value) (reverse Welford step)."""
+        n = int(self.count[how])
+        if n <= 1:
+            self.count[how], self.mean[how], self.m2[how] = 0, 0.0, 0.0
+        else:
+            mean = self.mean[how]
+            previous = (n * mean - value) / (n - 1)
+            self.count[how] = n - 1
+            self.mean[how] = previous
+            self.m2[how] = max(0.0, self.m2[how] - (value - previous) * (value - mean))
+        b = self._bin(value)
+        self.hist[how, b] = max(0, self.hist[how, b] - 1)
+
+    def quantiles(self, how, qs):
+        counts = self.hist[how]
+        total = counts.sum()
+        if total == 0:
+            return [None for _ in qs]
+        cum = np.cumsum(counts)
+        width = (self.high - self.low) / N_BINS
+        result = []
+        for q in qs:
+            target = q * total
+            b = int(np.searchsorted(cum, target))
+            before = cum[b - 1] if b > 0 else 0
+            frac = (target - before) / counts[b] if counts[b] else 0.0
+            result.append(self.low + (b + frac) * width)
+        return result
+
+    def band(self, how):
+        n = int(self.count[how])
+        if n == 0:
+            return {"count": 0}
+        std = float(np.sqrt(self.m2[how] / (n - 1))) if n > 1 else 0.0
+        p10, p50, p90 = self.quantiles(how, (0.1, 0.5, 0.9))
+        return {
+            "count": n,
+            "mean": float(self.mean[how]),
+            "std": std,
+            "p10": p10,
+            "p50": p50,
+            "p90": p90,
+        }
+
+
+class ProfileCube:
+    def __init__(self, path=None):
+        self.path = path or settings.PROFILE_CUBE_PATH
+        self._profiles = {}     # (source, key, metric) -> Profile
+        self._last_hour = {}    # (source, key) -> last hour_start absorbed
+        self._last_values = {}  # (source, key) -> {metric: value} absorbed for that hour
+        self._lock = threading.Lock()
+
+    def add_row(self, source, key, hour_start, row):
+        """
+        Absorb one hourly row (dict of metric values). A re-aggregation of the series'
+        latest hour replaces that hour's earlier values; older hours are skipped.
+        """
+        key = normalize_key(source, key)
+        hour_start = as_utc(hour_start)
+        values = dict(row)
+        if source == "traffic" and values.get("avg_speed") is not None and values.get("free_flow_avg"):
+            values["congestion_ratio"] = values["avg_speed"] / values["free_flow_avg"]
+
+        how = hour_of_week(hour_start)
+        with self._lock:
+            last = self._last_hour.get((source, key))
+            if last is not None and hour_start < last:
+                return False
+            if last is not None and hour_start == last:
+                for metric, value in self._last_values.get((source, key), {}).items():
+                    self._profiles[(source, key, metric)].remove(how, value)
+            absorbed = {}
+            for metric, (low, high) in METRICS[source].items():
+                value = values.get(metric)
+                if value is None:
+                    continue
+                profile = self._profiles.get((source, key, metric))
+                if profile is None:
+                    profile = self._profiles[(source, key, metric)] = Profile(low, high)
+                absorbed[metric] = float(value)
+                profile.add(how, absorbed[metric])
+            self._last_hour[(source, key)] = hour_start
+            self._last_values[(source, key)] = absorbed
+        return True
+
+    def band(self, source, key, metric, at=None):
+        profile = self._profiles.get((source, normalize_key(source, key), metric))
+        how = hour_of_week(at or datetime.now(timezone.utc))
+        if profile is None:
+            return how, None
+        return how, profile.band(how)
+
+    def week(self, source, key, metric):
+        profile = self._profiles.get((source, normalize_key(source, key), metric))
+        if profile is None:
+            return None
+        return [profile.band(how) for how in range(HOURS_PER_WEEK)]
+
+    def means(self, source, key, metric):
+        """(mean, count) arrays over the 168 hours of the week, or None if the series is unknown."""
+        profile = self._profiles.get((source, normalize_key(source, key), metric))
+        if profile is None:
+            return None
+        with self._lock:
+            return profile.mean.copy(), profile.count.copy()
+
+    def keys(self):
+        return sorted({(source, key) for source, key, _ in self._profiles})
+
+    # ---------- Persistence ----------
+    def save(self):
+        with self._lock:
+            names = list(self._profiles)
+            if not names:
+                return
+            profiles = [self._profiles[name] for name in names]
+            arrays = {
+                "series": np.array(json.dumps([list(name) for name in names])),
+                "last_hour": np.array(json.dumps({
+                    f"{source}|{key}": ts.isoformat() for (source, key), ts in self._last_hour.items()
+                })),
+                "last_values": np.array(json.dumps({
+                    f"{source}|{key}": values for (source, key), values in self._last_values.items()
+                })),
+                "bounds": np.array([[p.low, p.high] for p in profiles]),
+                "count": np.stack([p.count for p in profiles]),
+                "mean": np.stack([p.mean for p in profiles]),
+                "m2": np.stack([p.m2 for p in profiles]),
+                "hist": np.stack([p.hist for p in profiles]),
+            }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return False
+        with np.load(self.path) as data:
+            names = [tuple(name) for name in json.loads(str(data["series"]))]
+            last_hour = json.loads(str(data["last_hour"]))
+            # cubes saved before last_values existed: the next re-aggregation adds instead of replacing
+            last_values = json.loads(str(data["last_values"])) if "last_values" in data.files else {}
+            profiles = {}
+            for i, name in enumerate(names):
+                profile = Profile(*data["bounds"][i])
+                profile.count = data["count"][i].copy()
+                profile.mean = data["mean"][i].copy()
+                profile.m2 = data["m2"][i].copy()
+                profile.hist = data["hist"][i].copy()
+                profiles[name] = profile
+        with self._lock:
+            self._profiles = profiles
+            self._last_hour = {
+                tuple(k.split("|", 1)): datetime.fromisoformat(v) for k, v in last_hour.items()
+            }
+            self._last_values = {tuple(k.split("|", 1)): v for k, v in last_values.items()}
+        return True
+
+    def rebuild(self, db=None):
+        """One-off full build from the hourly tables (used when no saved cube exists)."""
+        own_session = db is None
+        db = db or database.SessionLocal()
+        tables = {
+            "traffic": (models.TrafficHourly, "location"),
+            "weather": (models.WeatherHourly, "city"),
+            "air_quality": (models.AirQualityHourly, "city"),
+        }
+        rows = 0
+        try:
+            for source, (model, key_col) in tables.items():
+                metrics = [m for m in METRICS[source] if hasattr(model, m)]
+                query = (
+                    db.query(getattr(model, key_col), model.hour_start, *[getattr(model, m) for m in metrics])
+                    .order_by(model.hour_start)
+                    .yield_per(5000)
+                )
+                for key, hour_start, *values in query:
+                    if key is None or hour_start is None:
+                        continue
+                    try:
+                        self.add_row(source, key, hour_start, dict(zip(metrics, values)))
+                        rows += 1
+                    except ValueError:
+                        continue  # malformed location string
+        finally:
+            if own_session:
+                db.close()
+        self.save()
+        return rows
+
+    def warm(self):
+        """Load the saved cube, or build it from the DB the first time."""
+        if self.load():
+            return len(self._profiles)
+        self.rebuild()
+        return len(self._profiles)
+
+
+# single instance shared by the aggregator and analytics routes
+profile_cube = ProfileCube()
@@ -0,0 +1,343 @@
+"""
+In-memory store of recent raw readings.
+
+Every (source, city/location) series is one preallocated ring buffer: a
+float64 array of RECENT_CAPACITY rows x (epoch seconds + the source's numeric
+columns), so a series costs a fixed ``capacity * (1 + columns) * 8`` bytes no
+matter how many readings pass through it. The collector appends each reading
+it stores; range reads are two ``searchsorted`` calls and a slice per
+contiguous part of the ring instead of a DB query.
+
+On startup the store is loaded from its snapshot (one memory-mapped ``.npy``
+per source under RECENT_SNAPSHOT_PATH, only the used rows are read) and
+topped up from the DB with the readings newer than each series' last one;
+without a usable snapshot the last RECENT_HOURS are read from the raw tables.
+The snapshot is written after aggregation cycles and on shutdown.
+
+A source is "covered" from the moment the store holds all of its readings;
+windows starting earlier (or a series whose ring has wrapped past the window
+start) are not answered from memory, so callers fall back to the DB. That only
+holds while this process's collector is the sole writer of readings: the
+background collector switches the memory path on while it runs, and only when
+RECENT_SOLE_WRITER says no other process (another uvicorn worker,
+app/scheduler.py) collects as well.
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import func
+from app.config import settings
+from app.db import database
+from app.services.latest_index import SOURCES, as_utc, location_key, normalize_key
+from app.utils.metrics import GaugeFunc
+
+# source -> numeric columns kept per reading (weather.condition is text and stays in the DB)
+COLUMNS = {
+    "traffic": ("current_speed", "free_flow_speed", "confidence", "road_closure"),
+    "weather": ("temperature", "humidity"),
+    "air_quality": ("aqi", "pm25", "pm10", "co", "no2", "o3"),
+}
+
+META_FILE = "meta.json"
+
+
+def _number(value):
+    """Column value as float; None / unparseable -> NaN, booleans (road_closure is stored as text) -> 0/1."""
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("true", "false"):
+            return 1.0 if lowered == "true" else 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# ---------- Ring buffer ----------
+class SeriesBuffer:
+    """Fixed-capacity ring of [timestamp, column...] rows, oldest overwritten first."""
+
+    def __init__(self, capacity, width):
+        self.rows = np.full((capacity, width + 1), np.nan)
+        self.capacity = capacity
+        self.head = 0   # next row to write
+        self.size = 0
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+    def _parts(self):
+        """The filled rows as (at most two) contiguous views, oldest first."""
+        if self.size < self.capacity:
+            return (self.rows[:self.size],)
+        return (self.rows[self.head:], self.rows[:self.head])
+
+    def first_ts(self):
+        return self._parts()[0][0, 0] if self.size else None
+
+    def last_ts(self):
+        return self.rows[self.head - 1, 0] if self.size else None
+
+    def append(self, ts, values):
+        """Add one reading; readings not newer than the last one are skipped."""
+        if self.size and ts <= self.last_ts():
+            return False
+        self.rows[self.head, 0] = ts
+        self.rows[self.head, 1:] = values
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return True
+
+    def extend(self, block):
+        """Add rows (sorted by timestamp) newer than the last one, in at most two slice writes."""
+        if self.size:
+            block = block[block[:, 0] > self.last_ts()]
+        block = block[-self.capacity:]
+        n = len(block)
+        if n == 0:
+            return 0
+        first = min(n, self.capacity - self.head)
+        self.rows[self.head:self.head + first] = block[:first]
+        self.rows[:n - first] = block[first:]
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return n
+
+    def ordered(self):
+        return np.concatenate(self._parts())
+
+    def range(self, start, end):
+        """Copy of the rows with start <= timestamp < end."""
+        parts = []
+        for part in self._parts():
+            ts = part[:, 0]
+            lo, hi = np.searchsorted(ts, start, "left"), np.searchsorted(ts, end, "left")
+            if hi > lo:
+                parts.append(part[lo:hi])
+        if not parts:
+            return np.empty((0, self.rows.shape[1]))
+        return np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+
+
+# ---------- Store ----------
+class RecentStore:
+    def __init__(self, capacity=None, hours=None, path=None):
+        self.capacity = capacity or settings.RECENT_CAPACITY
+        self.hours = hours or settings.RECENT_HOURS
+        self.path = settings.RECENT_SNAPSHOT_PATH if path is None else path
+        self._series = {}           # (source, key) -> SeriesBuffer
+        self._covered_since = {}    # source -> epoch seconds from which the store holds every reading
+        self.sole_writer = False    # set by the collector that feeds the store
+        self._lock = threading.Lock()
+
+    def _buffer(self, source, key):
+        buf = self._series.get((source, key))
+        if buf is None:
+            buf = self._series[(source, key)] = SeriesBuffer(self.capacity, len(COLUMNS[source]))
+        return buf
+
+    # ---------- Writes ----------
+    def append(self, source, key, record):
+        """Add a reading (a latest_index record: column values plus ``timestamp``)."""
+        values = [_number(record.get(column)) for column in COLUMNS[source]]
+        ts = as_utc(record["timestamp"]).timestamp()
+        with self._lock:
+            return self._buffer(source, normalize_key(source, key)).append(ts, values)
+
+    # ---------- Reads ----------
+    def covers(self, source, key, start):
+        """True if every reading of the series since ``start`` (epoch seconds) is in memory."""
+        with self._lock:
+            return self._covers_locked(source, normalize_key(source, key), start)
+
+    def _covers_locked(self, source, key, start):
+        if not self.sole_writer:
+            return False  # readings stored by other processes never reach this store
+        since = self._covered_since.get(source)
+        if since is None or start < since:
+            return False
+        buf = self._series.get((source, key))
+        # a full ring has dropped its oldest rows: it only vouches for what it still holds
+        return buf is None or buf.size < buf.capacity or start >= buf.first_ts()
+
+    def range(self, source, key, start, end=None):
+        """
+        Rows (epoch seconds, *COLUMNS[source]) with start <= timestamp < end, oldest
+        first, or None when the window is not fully in memory.
+        """
+        key = normalize_key(source, key)
+        end = time.time() + 1 if end is None else end
+        with self._lock:
+            if not self._covers_locked(source, key, start):
+                return None
+            buf = self._series.get((source, key))
+            if buf is None:
+                return np.empty((0, len(COLUMNS[source]) + 1))
+            return buf.range(start, end)
+
+    def keys(self, source=None):
+        return sorted(k for k in list(self._series) if source is None or k[0] == source)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for source in COLUMNS:
+                buffers = [buf for (src, _), buf in self._series.items() if src == source]
+                result[source] = {
+                    "series": len(buffers),
+                    "rows": sum(buf.size for buf in buffers),
+                    "bytes": sum(buf.nbytes for buf in buffers),
+                    "bytes_per_series": self.capacity * (len(COLUMNS[source]) + 1) * 8,
+                    "covered_since": self._covered_since.get(source),
+                    "serving": self.sole_writer,
+                }
+            return result
+
+    # ---------- Bootstrap ----------
+    def read_db(self, db, source, since, key=None):
+        """{key: rows array} of the raw readings at or after ``since`` (epoch seconds), same layout as range()."""
+        model, key_cols = SOURCES[source]
+        query = (
+            db.query(*[getattr(model, c) for c in key_cols], model.timestamp,
+                     *[getattr(model, c) for c in COLUMNS[source]])
+            .filter(model.timestamp >= datetime.fromtimestamp(since, timezone.utc).replace(tzinfo=None))
+        )
+        if key is not None and source == "traffic":
+            # location keys are rounded to 4 decimals
+            lat, lon = (float(v) for v in normalize_key(source, key).split(","))
+            query = query.filter(model.latitude.between(lat - 5e-5, lat + 5e-5),
+                                 model.longitude.between(lon - 5e-5, lon + 5e-5))
+        elif key is not None:
+            query = query.filter(func.lower(model.city) == normalize_key(source, key))
+        query = query.order_by(model.timestamp).yield_per(5000)
+        grouped = {}
+        for row in query:
+            keys, ts, values = row[:len(key_cols)], row[len(key_cols)], row[len(key_cols) + 1:]
+            if ts is None or any(k is None for k in keys):
+                continue
+            try:
+                key = location_key(*keys) if source == "traffic" else normalize_key(source, keys[0])
+            except ValueError:
+                continue
+            grouped.setdefault(key, []).append([as_utc(ts).timestamp(), *map(_number, values)])
+        return {key: np.array(rows, dtype=np.float64) for key, rows in grouped.items()}
+
+    def _top_up_since(self, source):
+        """Oldest "last reading" among the source's series: every series is complete up to its own last reading."""
+        lasts = [buf.last_ts() for (src, _), buf in self._series.items() if src == source and buf.size]
+        return min(lasts) if lasts else self._covered_since[source]
+
+    def rebuild(self, db=None):
+        """
+        Read raw readings into the store: the last RECENT_HOURS for sources it does
+        not cover yet; for the others (a loaded snapshot) the readings newer than
+        each series' last one. Returns the number of rows added.
+        """
+        own_session = db is None
+        db = db or database.SessionLocal()
+        window_start = time.time() - self.hours * 3600
+        added = 0
+        try:
+            for source in COLUMNS:
+                with self._lock:
+                    since = self._top_up_since(source) if source in self._covered_since else window_start
+                blocks = self.read_db(db, source, since)
+                with self._lock:
+                    for key, block in blocks.items():
+                        added += self._buffer(source, key).extend(block)  # keeps rows after the series' last one
+                    self._covered_since.setdefault(source, window_start)
+        finally:
+            if own_session:
+                db.close()
+        return added
+
+    def warm(self, db=None):
+        """Load the snapshot and top it up from the DB, or read the window from the DB. Returns the series count."""
+        self.load()
+        self.rebuild(db)
+        return len(self._series)
+
+    # ---------- Snapshots ----------
+    def save(self):
+        """Write one memory-mapped ``<source>.npy`` (series x capacity x columns) per source plus meta.json."""
+        if not self.path:
+            return False
+        with self._lock:
+            series = {source: [] for source in COLUMNS}
+            for (source, key), buf in self._series.items():
+                series[source].append((key, buf.ordered()))
+            covered = dict(self._covered_since)
+        os.makedirs(self.path, exist_ok=True)
+        meta = {"saved_at": time.time(), "capacity": self.capacity, "sources": {}}
+        for source, entries in series.items():
+            if source not in covered:
+                continue
+            file_path = os.path.join(self.path, f"{source}.npy")
+            tmp_path = f"{file_path}.tmp"
+            shape = (len(entries), self.capacity, len(COLUMNS[source]) + 1)
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float64, shape=shape)
+            for i, (_, rows) in enumerate(entries):
+                out[i, :len(rows)] = rows
+            out.flush()
+            del out
+            os.replace(tmp_path, file_path)
+            meta["sources"][source] = {
+                "columns": list(COLUMNS[source]),
+                "covered_since": covered[source],
+                "keys": [key for key, _ in entries],
+                "sizes": [len(rows) for _, rows in entries],
+            }
+        meta_path = os.path.join(self.path, META_FILE)
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        return True
+
+    def load(self):
+        """Replace the store with the snapshot. Returns its save time, or None if there is no usable one."""
+        meta_path = os.path.join(self.path, META_FILE) if self.path else None
+        if not meta_path or not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["saved_at"] < time.time() - self.hours * 3600:
+            return None  # older than the window: reading the window from the DB is as cheap
+        loaded, covered = {}, {}
+        for source, info in meta["sources"].items():
+            if info["columns"] != list(COLUMNS.get(source, ())):
+                continue  # columns changed since the snapshot was written
+            try:
+                data = np.load(os.path.join(self.path, f"{source}.npy"), mmap_mode="r")
+            except (OSError, ValueError):
+                continue
+            if len(data) != len(info["keys"]):
+                continue
+            for i, (key, size) in enumerate(zip(info["keys"], info["sizes"])):
+                buf = SeriesBuffer(self.capacity, len(COLUMNS[source]))
+                buf.extend(np.asarray(data[i, :size]))  # only the used rows are paged in
+                loaded[(source, key)] = buf
+            covered[source] = info["covered_since"]
+            del data
+        with self._lock:
+            self._series = loaded
+            self._covered_since = covered
+        return meta["saved_at"]
+
+
+# single instance fed by the collector and read by the recent-data routes
+recent_store = RecentStore()
+
+
+def _store_bytes():
+    for source, stats in recent_store.stats().items():
+        yield {"source": source}, stats["bytes"]
+
+
+GaugeFunc("urbanpulse_recent_store_bytes", "Memory held by the recent-readings ring buffers", ["source"], _store_bytes)
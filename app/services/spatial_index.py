@@ -0,0 +1,187 @@
+"""
+Grid-cell spatial index over recent traffic readings.
+
+Points are bucketed into fixed lat/lon cells (SPATIAL_CELL_DEG) so k-nearest
+and within-radius lookups only look at the few cells around the query point.
+Each location keeps only its newest reading (raw TrafficData or traffic_hourly),
+and readings older than SPATIAL_WINDOW_HOURS are pruned.
+"""
+
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+from app.db import database, models
+from app.services.latest_index import location_key, record_from_row, as_utc
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG_LAT = 111320.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class SpatialIndex:
+    def __init__(self, cell_deg=None, window_hours=None):
+        self.cell_deg = cell_deg or settings.SPATIAL_CELL_DEG
+        self.window = timedelta(hours=window_hours or settings.SPATIAL_WINDOW_HOURS)
+        self._cells = {}      # (i, j) -> {location: (lat, lon, record)}
+        self._cell_of = {}    # location -> (i, j)
+        self._lock = threading.Lock()
+        self._adds = 0
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def __len__(self):
+        return len(self._cell_of)
+
+    # ---------- Writes ----------
+    def add(self, lat, lon, record):
+        """Insert or replace the reading for the location at (lat, lon) if it is newer."""
+        lat, lon = float(lat), float(lon)
+        loc = location_key(lat, lon)
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old_cell = self._cell_of.get(loc)
+            if old_cell is not None:
+                current = self._cells[old_cell][loc][2]
+                if record["timestamp"] < current["timestamp"]:
+                    return
+                del self._cells[old_cell][loc]
+            self._cells.setdefault(cell, {})[loc] = (lat, lon, record)
+            self._cell_of[loc] = cell
+            self._adds += 1
+            if self._adds % 1000 == 0:
+                self._prune_locked()
+
+    def add_raw(self, row):
+        """Index a TrafficData row."""
+        _, record = record_from_row("traffic", row)
+        record["kind"] = "raw"
+        self.add(row.latitude, row.longitude, record)
+
+    def add_hourly(self, location, hour_start, avg_speed, free_flow_avg, samples=None):
+        """Index a traffic_hourly row ("lat,lon" location)."""
+        lat, lon = (float(v) for v in location.split(",", 1))
+        self.add(lat, lon, {
+            "location": location_key(lat, lon),
+            "latitude": lat,
+            "longitude": lon,
+            "current_speed": avg_speed,
+            "free_flow_speed": free_flow_avg,
+            "confidence": None,
+            "road_closure": None,
+            "samples": samples,
+            "timestamp": as_utc(hour_start),
+            "kind": "hourly",
+        })
+
+    def prune(self):
+        with self._lock:
+            self._prune_locked()
+
+    def _prune_locked(self):
+        cutoff = datetime.now(timezone.utc) - self.window
+        for cell in list(self._cells):
+            bucket = self._cells[cell]
+            for loc in [loc for loc, (_, _, rec) in bucket.items() if rec["timestamp"] < cutoff]:
+                del bucket[loc]
+                del self._cell_of[loc]
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._cell_of.clear()
+
+    # ---------- Queries ----------
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for di in range(-r, r + 1):
+            for dj in (-r, r) if abs(di) != r else range(-r, r + 1):
+                yield (ci + di, cj + dj)
+
+    def _candidates(self, cells, lat, lon, cutoff):
+        for cell in cells:
+            for plat, plon, record in list(self._cells.get(cell, {}).values()):
+                if cutoff is not None and record["timestamp"] < cutoff:
+                    continue
+                yield haversine_m(lat, lon, plat, plon), record
+
+    def within_radius(self, lat, lon, radius_m, max_age=None):
+        """All readings within ``radius_m`` meters, nearest first, as (distance_m, record)."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age) if max_age else None
+        dlat = radius_m / METERS_PER_DEG_LAT
+        dlon = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        i0, j0 = self._cell(lat - dlat, lon - dlon)
+        i1, j1 = self._cell(lat + dlat, lon + dlon)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            # box larger than the populated grid: filter the populated cells instead of walking the box
+            cells = [(i, j) for i, j in list(self._cells) if i0 <= i <= i1 and j0 <= j <= j1]
+        else:
+            cells = ((i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+        hits = [(d, rec) for d, rec in self._candidates(cells, lat, lon, cutoff) if d <= radius_m]
+        return sorted(hits, key=lambda hit: hit[0])
+
+    def nearest(self, lat, lon, k=1, max_distance_m=None, max_age=None):
+        """k nearest readings as (distance_m, record), searching outward ring by ring."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age) if max_age else None
+        ci, cj = self._cell(lat, lon)
+        # smallest distance spanned by one cell (longitude shrinks with latitude)
+        cell_m = self.cell_deg * METERS_PER_DEG_LAT * min(1.0, max(math.cos(math.radians(lat)), 1e-6))
+        max_rings = int(max_distance_m / cell_m) + 1 if max_distance_m else 64
+
+        found = []
+        for r in range(max_rings + 1):
+            found.extend(self._candidates(self._ring(ci, cj, r), lat, lon, cutoff))
+            found.sort(key=lambda hit: hit[0])
+            # anything in ring r+1 is at least r * cell_m away
+            if len(found) >= k and found[k - 1][0] <= r * cell_m:
+                break
+        if max_distance_m is not None:
+            found = [hit for hit in found if hit[0] <= max_distance_m]
+        return found[:k]
+
+    # ---------- Bootstrap ----------
+    def rebuild(self, db=None):
+        """Load recent raw and hourly traffic readings. Returns number of indexed locations."""
+        own_session = db is None
+        db = db or database.SessionLocal()
+        since = datetime.now(timezone.utc) - self.window
+        try:
+            self.clear()
+            hourly = (
+                db.query(models.TrafficHourly)
+                .filter(models.TrafficHourly.hour_start >= since.replace(tzinfo=None))
+                .all()
+            )
+            for row in hourly:
+                try:
+                    self.add_hourly(row.location, row.hour_start, row.avg_speed, row.free_flow_avg, row.samples)
+                except (AttributeError, ValueError):
+                    continue  # malformed location string
+            raw = (
+                db.query(models.TrafficData)
+                .filter(models.TrafficData.timestamp >= since.replace(tzinfo=None))
+                .all()
+            )
+            for row in raw:
+                if row.latitude is not None and row.longitude is not None:
+                    self.add_raw(row)
+        finally:
+            if own_session:
+                db.close()
+        return len(self)
+
+
+# single instance shared by the collector, aggregator and traffic routes
+spatial_index = SpatialIndex()
@@ -0,0 +1,184 @@
+"""
+Admission control for calls to quota-limited upstream providers.
+
+Each provider gets:
+- a token bucket refilled at its daily quota (burst = UPSTREAM_BURST_FRACTION of the quota),
+- a concurrency limit on in-flight calls,
+- a bounded wait queue with a deadline (UPSTREAM_QUEUE_TIMEOUT).
+
+Callers that cannot be admitted are shed immediately with 429 (quota spent) or
+503 (too busy), both carrying a Retry-After header. Limits are per process.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from fastapi import HTTPException
+from app.config import settings
+from app.utils.metrics import Counter, GaugeFunc, Histogram
+
+UPSTREAM_SECONDS = Histogram(
+    "urbanpulse_upstream_request_duration_seconds", "Upstream call latency while holding an admission slot",
+    ["provider"],
+)
+UPSTREAM_CALLS = Counter(
+    "urbanpulse_upstream_requests",
+    "Upstream calls by outcome (ok, error, rejected_quota, rejected_busy, circuit_open)",
+    ["provider", "outcome"],
+)
+
+
+class AdmissionRejected(HTTPException):
+    def __init__(self, provider, status_code, retry_after, reason):
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=status_code,
+            detail=f"{provider} upstream {reason}; retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate                # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available. Returns (ok, seconds until enough tokens)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class ProviderGate:
+    def __init__(self, name, daily_quota, max_concurrency, max_queue, queue_timeout, burst_fraction):
+        self.name = name
+        self.bucket = TokenBucket(
+            rate=daily_quota / 86400.0,
+            capacity=max(1.0, daily_quota * burst_fraction),
+        )
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected_quota = 0
+        self.rejected_busy = 0
+
+    def _take_slot(self, timeout):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self._slots.acquire(timeout=timeout) if timeout > 0 else False
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def enter(self, timeout=None):
+        """Take a concurrency slot and one quota token (or raise AdmissionRejected). Returns the start time for exit()."""
+        timeout = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        if not self._take_slot(timeout):
+            with self._lock:
+                self.rejected_busy += 1
+            UPSTREAM_CALLS.inc(provider=self.name, outcome="rejected_busy")
+            raise AdmissionRejected(self.name, 503, self.queue_timeout, "busy")
+
+        ok, wait = self.bucket.try_acquire()
+        if not ok:
+            self._slots.release()
+            with self._lock:
+                self.rejected_quota += 1
+            UPSTREAM_CALLS.inc(provider=self.name, outcome="rejected_quota")
+            raise AdmissionRejected(self.name, 429, min(wait, 86400), "quota exhausted")
+
+        with self._lock:
+            self.admitted += 1
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def exit(self, start, ok):
+        """Release what enter() took and record the call."""
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, provider=self.name)
+        UPSTREAM_CALLS.inc(provider=self.name, outcome="ok" if ok else "error")
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Hold a concurrency slot and one quota token for the duration of an upstream call."""
+        start = self.enter(timeout)
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.exit(start, ok)
+
+    def stats(self):
+        return {
+            "provider": self.name,
+            "tokens": round(self.bucket.tokens, 2),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_quota": self.rejected_quota,
+            "rejected_busy": self.rejected_busy,
+        }
+
+
+def _gate(name, daily_quota):
+    return ProviderGate(
+        name,
+        daily_quota=daily_quota,
+        max_concurrency=settings.UPSTREAM_MAX_CONCURRENCY,
+        max_queue=settings.UPSTREAM_MAX_QUEUE,
+        queue_timeout=settings.UPSTREAM_QUEUE_TIMEOUT,
+        burst_fraction=settings.UPSTREAM_BURST_FRACTION,
+    )
+
+
+GATES = {
+    "tomtom": _gate("tomtom", settings.TOMTOM_DAILY_QUOTA),
+    "openweather": _gate("openweather", settings.OPENWEATHER_DAILY_QUOTA),
+    "open_meteo": _gate("open_meteo", settings.OPEN_METEO_DAILY_QUOTA),
+}
+
+
+def admit(provider, timeout=None):
+    return GATES[provider].admit(timeout)
+
+
+def reserved_threads():
+    """Worst-case threads held by upstream calls (in flight + queued) across providers."""
+    return sum(gate.max_concurrency + gate.max_queue for gate in GATES.values())
+
+
+def _gate_stats():
+    for gate in GATES.values():
+        stats = gate.stats()
+        for stat in ("tokens", "in_flight", "waiting"):
+            yield {"provider": gate.name, "stat": stat}, stats[stat]
+
+
+GaugeFunc("urbanpulse_upstream_gate", "Admission gate state (quota tokens, in_flight, waiting)", ["provider", "stat"], _gate_stats)
@@ -1,69 +1,462 @@
-import requests
+"""
+The one HTTP client for upstream providers (TomTom, OpenWeather, Open-Meteo).
+
+- Connections are pooled and kept alive (one httpx client per provider, plus
+  an async one per event loop), so repeat calls skip the TCP + TLS handshake.
+- Every attempt goes through the provider's admission gate (app.utils.admission).
+- Transport errors, timeouts, 5xx and 429 are retried up to UPSTREAM_RETRIES
+  times with decorrelated jitter (AWS style: random between the base delay and
+  3x the previous delay, capped at UPSTREAM_BACKOFF_CAP); a 429 whose
+  Retry-After is longer than the cap is not retried.
+- A circuit breaker per provider opens after CIRCUIT_FAILURE_THRESHOLD failed
+  calls in a row. While open, calls fail fast with 503 + Retry-After instead of
+  holding a worker thread for the full timeout; after CIRCUIT_RESET_TIMEOUT one
+  probe call is let through, and its result closes or re-opens the circuit.
+- Calls made with a ``deadline`` (live routes, see app.utils.deadline) give each
+  attempt only the time that is left, skip retries that cannot finish in time
+  and raise DeadlineExceeded when it runs out. Such an attempt is hedged: if
+  it has not answered after the provider's learned HEDGE_QUANTILE latency, a
+  second copy is sent (through the admission gate) and the first success wins.
+
+Usage:
+    data = client("openweather").get(OPENWEATHER_WEATHER_URL, params={...})
+    data = client("tomtom").get(TOMTOM_FLOW_URL, params={...}, deadline=deadline)
+    data = await client("open_meteo").aget(OPEN_METEO_URL)
+"""
+
+import asyncio
+import math
+import random
+import threading
 import time
-import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import httpx
+from fastapi import HTTPException
+from app.config import settings
+from app.utils.admission import GATES, UPSTREAM_CALLS, AdmissionRejected, reserved_threads
+from app.utils.logs import get_logger
+from app.utils.metrics import Counter, GaugeFunc
+
+log = get_logger("api_client")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+UPSTREAM_RETRIES = Counter("urbanpulse_upstream_retries", "Upstream attempts retried, by reason", ["provider", "reason"])
+UPSTREAM_HEDGES = Counter("urbanpulse_upstream_hedges", "Hedged upstream attempts (sent, won, rejected)", ["provider", "outcome"])
+
+# a timeout with less budget than this left is the deadline's, not the provider's
+DEADLINE_SLACK = 0.05
+
+
+# ---------- Errors ----------
+class UpstreamError(Exception):
+    """The provider could not be reached or did not answer in time."""
+
+    def __init__(self, provider, message):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+
+
+class UpstreamTimeout(UpstreamError):
+    pass
+
+
+class DeadlineExceeded(UpstreamTimeout):
+    """The caller's deadline ran out before the provider answered."""
+
+    def __init__(self, provider):
+        super().__init__(provider, "deadline exceeded")
+
+
+class UpstreamHTTPError(UpstreamError):
+    """The provider answered with a non-2xx status."""
+
+    def __init__(self, provider, status_code, text):
+        super().__init__(provider, f"HTTP {status_code}: {text[:500]}")
+        self.status_code = status_code
+        self.text = text
+
+
+class CircuitOpen(HTTPException):
+    def __init__(self, provider, retry_after):
+        retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"{provider} upstream unavailable (circuit open); retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+# ---------- Circuit breaker ----------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now (half-open admits a single probe)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    raise CircuitOpen(self.name, remaining)
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpen(self.name, 1)
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info(f"Circuit closed for {self.name}")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    log.warning(f"Circuit opened for {self.name} after {self.failures} failed calls",
+                                extra={"provider": self.name})
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended without saying anything about provider health (e.g. 4xx, admission rejected)."""
+        with self._lock:
+            self._probing = False
+
+
+# ---------- Hedging ----------
+class LatencyTracker:
+    """Latencies of a provider's recent successful calls; their quantile is the hedge delay."""
+
+    def __init__(self, window, quantile, min_samples):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def value(self):
+        """The learned quantile in seconds, or None until ``min_samples`` calls were seen."""
+        samples = sorted(self._samples)
+        if len(samples) < max(1, self.min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _attempt_pool():
+    """Threads running deadline-bound attempts, so the route thread can stop waiting at the deadline."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # the admission gates never let more attempts than this in flight or queued
+                _pool = ThreadPoolExecutor(max_workers=reserved_threads(), thread_name_prefix="upstream")
+    return _pool
+
+
+# ---------- Client ----------
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class APIClient:
-    def __init__(self, base_url, headers=None, retries=3, backoff_factor=2, timeout=10):
+    def __init__(self, provider, base_url="", headers=None, retries=None, timeout=None, breaker=None):
+        self.provider = provider
         self.base_url = base_url
         self.headers = headers or {}
-        self.retries = retries
-        self.backoff_factor = backoff_factor
-        self.timeout = timeout
-
-    def get(self, endpoint, params=None, expected_keys=None):
-        return self._request("GET", endpoint, params=params, expected_keys=expected_keys)
-
-    def post(self, endpoint, data=None, json=None, expected_keys=None):
-        return self._request("POST", endpoint, data=data, json=json, expected_keys=expected_keys)
-
-    def _request(self, method, endpoint, **kwargs):
-        params = kwargs.get('params')
-        data = kwargs.get('data')
-        json_payload = kwargs.get('json')
-        expected_keys = kwargs.get('expected_keys', [])
-
-        url = f"{self.base_url}{endpoint}"
-        attempt = 0
-
-        while attempt < self.retries:
-            try:
-                response = requests.request(
-                    method,
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    data=data,
-                    json=json_payload,
-                    timeout=self.timeout
-                )
-
-                if response.status_code == 200:
-                    res_json = response.json()
-                    if expected_keys and not set(expected_keys).issubset(res_json.keys()):
-                        logging.warning(f"Unexpected response structure: {res_json}")
-                    return res_json
-                elif response.status_code == 403:
-                    logging.error("Forbidden: Check API key or permissions.")
-                    return None
-                elif response.status_code == 404:
-                    logging.error(f"Endpoint not found: {url}")
-                    return None
-                elif response.status_code == 429:
-                    wait = self.backoff_factor ** attempt
-                    logging.warning(f"Rate limited. Retrying in {wait} sec...")
-                    time.sleep(wait)
-                    attempt += 1
+        self.retries = settings.UPSTREAM_RETRIES if retries is None else retries
+        self.timeout = timeout or httpx.Timeout(settings.UPSTREAM_READ_TIMEOUT, connect=settings.UPSTREAM_CONNECT_TIMEOUT)
+        self.breaker = breaker or CircuitBreaker(
+            provider, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT,
+        )
+        self.latency = LatencyTracker(settings.HEDGE_WINDOW, settings.HEDGE_QUANTILE, settings.HEDGE_MIN_SAMPLES)
+        self._client = None
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+
+    def _sync_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=self._limits(),
+                    )
+        return self._client
+
+    def _async_client(self):
+        # an AsyncClient's connections belong to the event loop that opened them
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=self._limits(),
+            )
+        return client
+
+    # ---------- Attempt outcome (shared by sync and async) ----------
+    def _before_call(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            UPSTREAM_CALLS.inc(provider=self.provider, outcome="circuit_open")
+            raise
+
+    def _outcome(self, response, error, deadline=None):
+        """(result, retry reason, error to raise) for one attempt."""
+        if isinstance(error, UpstreamError):
+            return None, None, error
+        if error is not None:
+            if isinstance(error, httpx.TimeoutException):
+                if deadline is not None and deadline.remaining() < DEADLINE_SLACK:
+                    return None, None, DeadlineExceeded(self.provider)
+                return None, "timeout", UpstreamTimeout(self.provider, f"timed out ({type(error).__name__})")
+            return None, "transport", UpstreamError(self.provider, f"{type(error).__name__}: {error}")
+        if response.is_success:
+            return response, None, None
+        failure = UpstreamHTTPError(self.provider, response.status_code, response.text)
+        if response.status_code == 429:
+            retry_after = _retry_after(response)
+            if retry_after is not None and retry_after > settings.UPSTREAM_BACKOFF_CAP:
+                return None, None, failure
+            return None, "rate_limited", failure
+        return None, ("server_error" if response.status_code in RETRY_STATUSES else None), failure
+
+    def _delay(self, previous, response):
+        retry_after = _retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return min(settings.UPSTREAM_BACKOFF_CAP, retry_after)
+        return min(settings.UPSTREAM_BACKOFF_CAP, random.uniform(settings.UPSTREAM_BACKOFF_BASE, previous * 3))
+
+    def _finish(self, response, failure, expected_keys):
+        """Update the breaker and return the JSON body, or raise the final error."""
+        if failure is None:
+            self.breaker.record_success()
+            payload = response.json()
+            if expected_keys and not set(expected_keys).issubset(payload.keys()):
+                log.warning(f"Unexpected response structure from {self.provider}: {str(payload)[:500]}")
+            return payload
+        if isinstance(failure, DeadlineExceeded) or (isinstance(failure, UpstreamHTTPError) and failure.status_code < 500):
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+        raise failure
+
+    # ---------- Sync ----------
+    def hedge_delay(self):
+        learned = self.latency.value()
+        return max(settings.HEDGE_MIN_DELAY, settings.HEDGE_DEFAULT_DELAY if learned is None else learned)
+
+    def _send(self, method, url, params, json, timeout=httpx.USE_CLIENT_DEFAULT, gate_timeout=None):
+        """One admitted attempt: (response, transport error). Raises AdmissionRejected."""
+        gate = GATES.get(self.provider)
+        start = gate.enter(gate_timeout) if gate else None
+        sent = time.perf_counter()
+        raw = error = None
+        try:
+            raw = self._sync_client().request(method, url, params=params, json=json, timeout=timeout)
+        except httpx.HTTPError as e:
+            error = e
+        finally:
+            if gate:
+                gate.exit(start, raw is not None and raw.status_code < 500)
+        if raw is not None and raw.is_success:
+            self.latency.observe(time.perf_counter() - sent)
+        return raw, error
+
+    def _send_within(self, method, url, params, json, deadline):
+        """Submit one attempt that must finish within the deadline to the attempt pool."""
+        remaining = deadline.remaining()
+        timeout = httpx.Timeout(
+            min(settings.UPSTREAM_READ_TIMEOUT, remaining),
+            connect=min(settings.UPSTREAM_CONNECT_TIMEOUT, remaining),
+        )
+        return _attempt_pool().submit(self._send, method, url, params, json, timeout, remaining)
+
+    def _hedged(self, method, url, params, json, deadline):
+        """
+        One attempt bounded by the deadline, plus a hedge once it has been
+        outstanding for hedge_delay(). Returns the first success, else the last
+        failure, like _send; DeadlineExceeded if nothing answered in time.
+        """
+        if deadline.expired:
+            return None, DeadlineExceeded(self.provider)
+        primary = self._send_within(method, url, params, json, deadline)
+        pending = {primary}
+        hedge_at = time.monotonic() + self.hedge_delay() if settings.HEDGE_QUANTILE > 0 else None
+        result = rejected = None
+        while pending:
+            until = deadline.expires if hedge_at is None else min(deadline.expires, hedge_at)
+            done, pending = wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    raw, error = future.result()
+                except AdmissionRejected as e:
+                    if future is not primary:
+                        UPSTREAM_HEDGES.inc(provider=self.provider, outcome="rejected")
+                    rejected = e
+                    continue
+                if raw is not None and raw.is_success:
+                    if future is not primary:
+                        UPSTREAM_HEDGES.inc(provider=self.provider, outcome="won")
+                    return raw, None
+                result = (raw, error)
+            if not pending:
+                break
+            if deadline.expired:
+                return None, DeadlineExceeded(self.provider)
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                pending.add(self._send_within(method, url, params, json, deadline))
+                UPSTREAM_HEDGES.inc(provider=self.provider, outcome="sent")
+        if result is None:
+            raise rejected
+        return result
+
+    def request(self, method, url, params=None, json=None, expected_keys=None, deadline=None):
+        """
+        Send with retries; returns the decoded JSON body or raises UpstreamError
+        (DeadlineExceeded when ``deadline`` runs out) / CircuitOpen / AdmissionRejected.
+        """
+        self._before_call()
+        delay = settings.UPSTREAM_BACKOFF_BASE
+        try:
+            for attempt in range(self.retries + 1):
+                if deadline is None:
+                    raw, error = self._send(method, url, params, json)
                 else:
-                    logging.error(f"HTTP {response.status_code}: {response.text}")
-                    return None
+                    raw, error = self._hedged(method, url, params, json, deadline)
+                response, reason, failure = self._outcome(raw, error, deadline)
+                if failure is None or reason is None or attempt == self.retries:
+                    break
+                delay = self._delay(delay, raw)
+                if deadline is not None and deadline.remaining() <= delay:
+                    break  # no time left for another attempt
+                UPSTREAM_RETRIES.inc(provider=self.provider, reason=reason)
+                time.sleep(delay)
+        except BaseException:
+            self.breaker.release()  # rejected by the gate or interrupted: no verdict on the provider
+            raise
+        return self._finish(response, failure, expected_keys)
 
-            except requests.exceptions.RequestException as e:
-                wait = self.backoff_factor ** attempt
-                logging.warning(f"Request failed: {e}. Retrying in {wait} sec...")
-                time.sleep(wait)
-                attempt += 1
+    def get(self, url, params=None, expected_keys=None, deadline=None):
+        return self.request("GET", url, params=params, expected_keys=expected_keys, deadline=deadline)
 
-        logging.error("Max retries reached. Could not fetch data.")
-        return None
+    # ---------- Async ----------
+    async def arequest(self, method, url, params=None, json=None, expected_keys=None):
+        """Async request(); the admission gate is entered on a worker thread (it may queue)."""
+        self._before_call()
+        gate = GATES.get(self.provider)
+        delay = settings.UPSTREAM_BACKOFF_BASE
+        try:
+            for attempt in range(self.retries + 1):
+                start = await asyncio.to_thread(gate.enter) if gate else None
+                raw = error = None
+                try:
+                    raw = await self._async_client().request(method, url, params=params, json=json)
+                except httpx.HTTPError as e:
+                    error = e
+                finally:
+                    if gate:
+                        gate.exit(start, raw is not None and raw.status_code < 500)
+                response, reason, failure = self._outcome(raw, error)
+                if failure is None or reason is None or attempt == self.retries:
+                    break
+                UPSTREAM_RETRIES.inc(provider=self.provider, reason=reason)
+                delay = self._delay(delay, raw)
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.breaker.release()
+            raise
+        return self._finish(response, failure, expected_keys)
+
+    async def aget(self, url, params=None, expected_keys=None):
+        return await self.arequest("GET", url, params=params, expected_keys=expected_keys)
+
+    # ---------- Lifecycle ----------
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# ---------- Shared clients ----------
+CLIENTS = {
+    provider: APIClient(provider)
+    for provider in ("tomtom", "openweather", "open_meteo")
+}
+
+
+def client(provider):
+    return CLIENTS[provider]
+
+
+def close_all():
+    global _pool
+    for c in CLIENTS.values():
+        c.close()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def aclose_all():
+    for c in CLIENTS.values():
+        await c.aclose()
+
+
+def _breaker_state():
+    states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    for c in CLIENTS.values():
+        yield {"provider": c.provider}, states[c.breaker.state]
+
+
+def _hedge_delays():
+    for c in CLIENTS.values():
+        yield {"provider": c.provider}, c.hedge_delay()
+
+
+GaugeFunc("urbanpulse_upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["provider"],
+          _breaker_state)
+GaugeFunc("urbanpulse_upstream_hedge_delay_seconds", "Current hedge delay (learned latency quantile)", ["provider"],
+          _hedge_delays)
@@ -1,5 +1,18 @@
+import hashlib
+import threading
+from datetime import datetime
 from app.db.database import engine
-from sqlalchemy import text
+from app.db import models
+from sqlalchemy import delete, inspect, insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+# bump when a column migration below changes, so databases stamped with the
+# previous fingerprint run it again
+MIGRATIONS_VERSION = 2
+SCHEMA_STATE_NAME = "urbanpulse"
+
+_checked = set()
+_checked_lock = threading.Lock()
 
 def migrate_created_at():
     with engine.connect() as conn:
@@ -26,6 +39,84 @@ def migrate_created_at():
         conn.commit()
         print("\n🎯 Migration complete!")
 
+def migrate_imputed_flag(bind=None):
+    """Add the imputed flag to hourly tables created before it existed (portable, safe to re-run)."""
+    bind = bind or engine
+    tables = ["traffic_hourly", "weather_hourly", "air_quality_hourly"]
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in tables:
+            if not inspector.has_table(table):
+                continue
+            if "imputed" not in {col["name"] for col in inspector.get_columns(table)}:
+                print(f"🧩 Adding imputed to {table} ...")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN imputed BOOLEAN DEFAULT FALSE"))
+
+def migrate_weather_details(bind=None):
+    """Add description / wind_speed to weather_data tables created before they existed (safe to re-run)."""
+    bind = bind or engine
+    inspector = inspect(bind)
+    if not inspector.has_table("weather_data"):
+        return
+    existing = {col["name"] for col in inspector.get_columns("weather_data")}
+    with bind.begin() as conn:
+        for name, ddl in (("description", "VARCHAR(100)"), ("wind_speed", "FLOAT")):
+            if name not in existing:
+                print(f"🧩 Adding {name} to weather_data ...")
+                conn.execute(text(f"ALTER TABLE weather_data ADD COLUMN {name} {ddl}"))
+
+def schema_fingerprint():
+    """Hash of every declared table (columns, types, nullability, keys) plus MIGRATIONS_VERSION."""
+    digest = hashlib.sha256(f"migrations={MIGRATIONS_VERSION}".encode())
+    for table in models.Base.metadata.sorted_tables:
+        digest.update(f"|{table.name}".encode())
+        for col in table.columns:
+            digest.update(f";{col.name}:{col.type}:{col.nullable}:{col.primary_key}:{col.unique}".encode())
+        constraints = sorted(
+            f"{type(c).__name__}:{c.name}:{','.join(sorted(col.name for col in c.columns))}" for c in table.constraints
+        )
+        digest.update(";".join(constraints).encode())
+    return digest.hexdigest()
+
+
+def _stored_fingerprint(bind):
+    t = models.SchemaState.__table__
+    try:
+        with bind.connect() as conn:
+            return conn.execute(select(t.c.fingerprint).where(t.c.name == SCHEMA_STATE_NAME)).scalar()
+    except SQLAlchemyError:
+        return None  # schema_state does not exist yet
+
+
+def ensure_schema(bind=None, force=False):
+    """
+    Create missing tables and run the column migrations, once per schema version:
+    the result is stamped in schema_state, so later starts cost one SELECT.
+    Returns True if the schema work ran, False if the stamp was current.
+    """
+    bind = bind or engine
+    key = bind.url.render_as_string(hide_password=True)
+    fingerprint = schema_fingerprint()
+    with _checked_lock:
+        if not force and key in _checked:
+            return False
+        if not force and _stored_fingerprint(bind) == fingerprint:
+            _checked.add(key)
+            return False
+
+        models.Base.metadata.create_all(bind=bind)
+        migrate_imputed_flag(bind)
+        migrate_weather_details(bind)
+        t = models.SchemaState.__table__
+        with bind.begin() as conn:
+            conn.execute(delete(t).where(t.c.name == SCHEMA_STATE_NAME))
+            conn.execute(insert(t).values(name=SCHEMA_STATE_NAME, fingerprint=fingerprint, updated_at=datetime.utcnow()))
+        _checked.add(key)
+        print(f"✅ Schema checked and stamped ({fingerprint[:12]})")
+        return True
+
+
 if __name__ == "__main__":
+    ensure_schema(force=True)
     migrate_created_at()
 
@@ -0,0 +1,63 @@
+"""
+Deadline budgets for live routes.
+
+A live request gets LIVE_DEADLINE seconds, counted from the moment it reached
+the API (MetricsMiddleware stamps the arrival time), or less if the caller
+sends a smaller ``X-Request-Timeout: <seconds>``. The route hands its Deadline
+to the upstream client, which gives every attempt, hedge and retry only the
+time that is left. When the budget runs out the client raises DeadlineExceeded
+and the route answers with the most recent stored reading, marked
+``"stale": true``, so the route's latency is bounded by the budget instead of
+by the slowest upstream response.
+
+Usage:
+    @router.get("/weather/{city}")
+    def get_weather(city: str, deadline: Deadline = Depends(live_deadline)):
+        data = client("openweather").get(url, params=params, deadline=deadline)
+"""
+
+import time
+from fastapi import Header, Request
+from app.config import settings
+from app.utils.metrics import Counter
+
+# ASGI scope key holding the request's arrival time (time.monotonic())
+RECEIVED_AT = "urbanpulse.received_at"
+
+STALE_RESPONSES = Counter(
+    "urbanpulse_stale_responses",
+    "Live requests answered from the stored reading because the upstream call missed the deadline",
+    ["source"],
+)
+
+
+class Deadline:
+    def __init__(self, budget, start=None):
+        self.budget = budget
+        self.start = time.monotonic() if start is None else start
+        self.expires = self.start + budget
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+
+async def live_deadline(request: Request, x_request_timeout: float | None = Header(None)):
+    """FastAPI dependency: the request's Deadline (LIVE_DEADLINE, or the caller's smaller X-Request-Timeout)."""
+    budget = settings.LIVE_DEADLINE
+    if x_request_timeout is not None and 0 < x_request_timeout < budget:
+        budget = x_request_timeout
+    return Deadline(budget, start=request.scope.get(RECEIVED_AT))
+
+
+def mark_stale(source, response, record):
+    """Flag a response built from a stored reading as a deadline fallback."""
+    STALE_RESPONSES.inc(source=source)
+    age = time.time() - record["timestamp"].timestamp()
+    return {**response, "stale": True, "age_seconds": round(age, 1)}
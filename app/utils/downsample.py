@@ -0,0 +1,142 @@
+"""
+Downsampling for long-range time series.
+
+- lttb:    Largest-Triangle-Three-Buckets, keeps the visual shape of a line
+- minmax:  min and max point of each time bucket, keeps spikes
+- avg:     mean of each time bucket
+
+All modes are vectorized with NumPy (LTTB loops over output buckets only).
+``bucket_query`` pushes avg/min/max bucket aggregation into SQL so long ranges
+never leave the database at full resolution.
+"""
+
+import calendar
+import math
+import numpy as np
+from sqlalchemy import Integer, cast, func, select, literal, literal_column
+
+MODES = ("lttb", "minmax", "avg")
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if x.dtype.kind == "M":
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float) / 1e9
+    return x.astype(float)
+
+
+def lttb(x, y, n):
+    """Indices of the ``n`` points LTTB keeps (first and last always included)."""
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    xf, yf = _as_float(x), np.asarray(y, dtype=float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)   # n-2 buckets between first and last
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        avg_x, avg_y = xf[nlo:nhi].mean(), yf[nlo:nhi].mean()
+        bx, by = xf[lo:hi], yf[lo:hi]
+        area = np.abs((xf[a] - avg_x) * (by - yf[a]) - (xf[a] - bx) * (avg_y - yf[a]))
+        a = lo + int(np.nanargmax(area)) if np.isfinite(area).any() else lo
+        keep[i + 1] = a
+    return keep
+
+
+def _buckets(x, n):
+    xf = _as_float(x)
+    span = xf[-1] - xf[0]
+    if span <= 0:
+        return np.zeros(len(xf), dtype=np.int64)
+    return np.minimum(((xf - xf[0]) / span * n).astype(np.int64), n - 1)
+
+
+def minmax(x, y, n):
+    """Indices of the min and max point of each of n/2 time buckets, in time order."""
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    yf = np.asarray(y, dtype=float)
+    bucket = _buckets(x, max(1, n // 2))
+    order = np.lexsort((np.nan_to_num(yf, nan=np.inf), bucket))   # by bucket, then value
+    sorted_buckets = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    # last non-NaN value in each bucket is its max
+    valid = ~np.isnan(yf[order])
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(order)), -1))[ends]
+    ends = np.where(last_valid >= starts, last_valid, ends)
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def avg(x, y, n):
+    """(bucket mean x, bucket mean y) for n equal-time buckets."""
+    if n >= len(y):
+        return np.asarray(x), np.asarray(y, dtype=float)
+    xf, yf = _as_float(x), np.asarray(y, dtype=float)
+    bucket = _buckets(x, n)
+    counts = np.bincount(bucket, minlength=n)
+    ok = ~np.isnan(yf)
+    y_counts = np.bincount(bucket[ok], minlength=n)
+    y_sums = np.bincount(bucket[ok], weights=yf[ok], minlength=n)
+    x_means = np.bincount(bucket, weights=xf, minlength=n)[counts > 0] / counts[counts > 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y_means = (y_sums / y_counts)[counts > 0]
+    if np.asarray(x).dtype.kind == "M":
+        x_means = (x_means * 1e9).astype("int64").astype("datetime64[ns]")
+    return x_means, y_means
+
+
+def downsample(x, y, max_points, mode="lttb"):
+    """Return (x, y) reduced to at most ``max_points`` points."""
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    if max_points is None or len(y) <= max_points:
+        return x, y
+    if mode == "avg":
+        return avg(x, y, max_points)
+    idx = minmax(x, y, max_points) if mode == "minmax" else lttb(x, y, max_points)
+    return x[idx], y[idx]
+
+
+# ---------- SQL push-down ----------
+def _epoch(column, dialect):
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    if dialect == "postgresql":
+        return func.extract("epoch", column)
+    # not UNIX_TIMESTAMP(): it reads DATETIMEs in the session time zone, columns hold naive UTC
+    return func.timestampdiff(literal_column("SECOND"), literal("1970-01-01"), column)
+
+
+def bucket_seconds(start, end, max_points, floor=3600):
+    """Bucket width so [start, end) yields at most max_points buckets (never below ``floor``)."""
+    span = max((end - start).total_seconds(), 1)
+    return max(floor, int(math.ceil(span / max_points)))
+
+
+def bucket_query(table, time_col, value_cols, start, end, max_points, dialect, where=None, stats=("avg",), floor=3600):
+    """
+    SELECT bucket, <col> (avg) / min_<col> / max_<col>... grouped into equal-time buckets covering [start, end).
+    Returns (statement, bucket width in seconds); ``bucket`` is the bucket start as epoch seconds.
+    """
+    width = bucket_seconds(start, end, max_points, floor)
+    ts = table.c[time_col]
+    origin = calendar.timegm(start.utctimetuple())   # buckets aligned to start, naive = UTC
+    bucket = (origin + func.floor((_epoch(ts, dialect) - origin) / width) * width).label("bucket")
+    aggregates = {"avg": func.avg, "min": func.min, "max": func.max}
+    columns = [
+        aggregates[stat](table.c[col]).label(col if stat == "avg" else f"{stat}_{col}")
+        for col in value_cols for stat in stats
+    ]
+    stmt = (
+        select(bucket, func.count().label("samples"), *columns)
+        .where(ts >= start, ts < end)
+        .group_by(literal_column("bucket"))
+        .order_by(literal_column("bucket"))
+    )
+    for clause in where or ():
+        stmt = stmt.where(clause)
+    return stmt, width
@@ -0,0 +1,37 @@
+"""
+Script: export_data.py
+Purpose: Stream a raw or hourly table to NDJSON / CSV / Parquet with constant memory
+
+Usage:
+    python -m app.utils.export_data air_quality_hourly -f parquet -o air.parquet
+    python -m app.utils.export_data traffic_data -f ndjson --gzip --start 2025-01-01 -o traffic.ndjson.gz
+"""
+
+import argparse
+import time
+from datetime import datetime
+from app.services import data_exporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UrbanPulse bulk data export")
+    parser.add_argument("table", choices=sorted(data_exporter.TABLES))
+    parser.add_argument("-f", "--format", choices=data_exporter.FORMATS, default="ndjson")
+    parser.add_argument("-o", "--output", required=True, help="output file path")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="inclusive start (ISO format)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="exclusive end (ISO format)")
+    parser.add_argument("--gzip", action="store_true", help="gzip output (Parquet uses gzip column compression)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows per fetch / row group")
+    args = parser.parse_args()
+
+    print(f"📦 Exporting {args.table} → {args.output} ({args.format})...")
+    started = time.perf_counter()
+    rows = data_exporter.export_table(
+        args.table, args.format, args.output,
+        start=args.start, end=args.end, compress=args.gzip, chunk_size=args.chunk_size,
+    )
+    print(f"✅ Exported {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Non-blocking structured logging for UrbanPulse.
+
+Every ``urbanpulse.*`` logger writes into a bounded in-memory queue; a single
+background QueueListener thread formats the records and does the file and
+console I/O, so the collector, aggregator and request threads only pay for an
+enqueue. If the writer falls behind and the queue is full, new records are
+dropped and counted (urbanpulse_log_records_dropped_total) instead of blocking.
+
+Outputs:
+- LOG_FILE: one JSON object per line (ts, level, logger, msg plus structured
+  fields such as source, table, rows, duration_ms), rotated at LOG_MAX_BYTES,
+- console: the familiar ``time | LEVEL | message`` lines (LOG_CONSOLE=text),
+  JSON (LOG_CONSOLE=json) or nothing (LOG_CONSOLE=off).
+
+Worker processes (the background aggregation pool) do no log I/O of their own:
+``log_to_queue`` points them at a multiprocessing queue that the API process
+drains into its own log queue (``start_worker_relay``).
+
+Entry points call ``setup_logging()`` once (the app's lifespan, the CLI
+``__main__`` blocks); importing a module that logs starts nothing. Until then
+records propagate to Python's default handling (warnings and up on stderr).
+
+Usage:
+    log = get_logger("collector")
+    log.info("Traffic stored", extra={"source": "traffic", "duration_ms": 12.5})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from app.config import settings
+from app.utils.metrics import Counter
+
+ROOT_LOGGER = "urbanpulse"
+
+DROPPED = Counter("urbanpulse_log_records_dropped", "Log records dropped because the log queue was full")
+
+# attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_relayed = False
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+def _handlers():
+    handlers = []
+    log_dir = os.path.dirname(settings.LOG_FILE)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        settings.LOG_FILE, maxBytes=settings.LOG_MAX_BYTES, backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+
+    if settings.LOG_CONSOLE != "off":
+        console = logging.StreamHandler()
+        console.setFormatter(
+            JsonFormatter() if settings.LOG_CONSOLE == "json"
+            else logging.Formatter("%(asctime)s | %(levelname)s | %(message)s")
+        )
+        handlers.append(console)
+    return handlers
+
+
+def setup_logging():
+    """Attach the queue handler and start the writer thread (idempotent, per process)."""
+    global _listener
+    if _listener is not None or _relayed:
+        return
+    with _lock:
+        if _listener is not None or _relayed:
+            return
+        log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [DroppingQueueHandler(log_queue)]
+        root.setLevel(settings.LOG_LEVEL.upper())
+        root.propagate = False
+        listener = logging.handlers.QueueListener(log_queue, *_handlers(), respect_handler_level=True)
+        listener.start()
+        _listener = listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+
+
+# ---------- Worker processes ----------
+class _Relay(logging.Handler):
+    """Re-emits a worker process's record through this process's logger of the same name."""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def start_worker_relay(mp_context):
+    """Queue for worker processes' records plus the listener draining it here. Returns (queue, listener)."""
+    setup_logging()
+    worker_queue = mp_context.Queue(settings.LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(worker_queue, _Relay())
+    listener.start()
+    return worker_queue, listener
+
+
+def log_to_queue(worker_queue):
+    """Worker-process side: send every ``urbanpulse.*`` record to the parent's relay queue."""
+    global _relayed
+    shutdown_logging()
+    with _lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [DroppingQueueHandler(worker_queue)]
+        root.setLevel(settings.LOG_LEVEL.upper())
+        root.propagate = False
+        _relayed = True
+
+
+def _after_fork_in_child():
+    # the writer thread does not survive fork; the child starts its own on next use
+    global _listener
+    _listener = None
+    logging.getLogger(ROOT_LOGGER).handlers = []
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,323 @@
+"""
+In-process metrics with Prometheus text exposition (GET /metrics).
+
+Counters, gauges and histograms keep their values per label combination in a
+dict behind one lock per metric, so recording from request threads, the
+collector and the aggregator costs a lookup and an increment. Callback gauges
+(GaugeFunc) are evaluated only when /metrics is scraped. Values are per
+process; with several uvicorn workers, scrape each one.
+
+Metrics are declared next to the code they measure; this module holds the
+types, the registry, the route middleware and the DB pool instrumentation.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ---------- Formatting ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+# ---------- Metric types ----------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class GaugeFunc(_Metric):
+    """Gauge read at scrape time: ``fn()`` yields (labels dict, value) pairs."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames, fn, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            items = list(self.fn())
+        except Exception:
+            return []
+        return [
+            f"{self.name}{_labels(self.labelnames, self._key(labels))} {_number(value)}"
+            for labels, value in items if value is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts + overflow, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = [("le", _number(float(bound)))]
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    return REGISTRY.render()
+
+
+# ---------- HTTP routes ----------
+HTTP_REQUEST_SECONDS = Histogram(
+    "urbanpulse_http_request_duration_seconds", "Route latency, including the streamed body",
+    ["method", "route"],
+)
+HTTP_REQUESTS = Counter(
+    "urbanpulse_http_requests", "Requests by route and status code", ["method", "route", "status"],
+)
+HTTP_IN_PROGRESS = Gauge("urbanpulse_http_requests_in_progress", "Requests currently being served")
+
+
+def route_template(scope):
+    # routes of included routers may keep their own path (without the include
+    # prefix); FastAPI records the full effective path alongside
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path", None) or getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Requests are labelled with the
+    route template (``/api/latest/{source}/{key}``), not the raw path, so label
+    cardinality stays bounded; unmatched paths share the ``unmatched`` label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        # outermost middleware: live-route deadlines count from here (app.utils.deadline)
+        scope["urbanpulse.received_at"] = time.monotonic()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_PROGRESS.dec()
+            route = route_template(scope)
+            method = scope.get("method", "GET")
+            HTTP_REQUEST_SECONDS.observe(elapsed, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+
+
+# ---------- Caches ----------
+CACHE_LOOKUPS = Counter("urbanpulse_cache_lookups", "Cache lookups by result (hit/miss)", ["cache", "result"])
+
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _cache_hit_ratios():
+    totals = {}
+    for (cache, result), n in list(CACHE_LOOKUPS._values.items()):
+        hits, lookups = totals.get(cache, (0, 0))
+        totals[cache] = (hits + (n if result == "hit" else 0), lookups + n)
+    return [({"cache": cache}, hits / lookups) for cache, (hits, lookups) in totals.items() if lookups]
+
+
+GaugeFunc("urbanpulse_cache_hit_ratio", "Hits / lookups since process start", ["cache"], _cache_hit_ratios)
+
+
+# ---------- Database pools ----------
+DB_POOL_ACQUIRE_SECONDS = Histogram(
+    "urbanpulse_db_pool_acquire_seconds",
+    "Time to get a connection from the pool (waiting for a free slot or opening a new one)",
+    ["pool"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CHECKOUTS = Counter("urbanpulse_db_pool_checkouts", "Connections checked out of the pool", ["pool"])
+_POOLS = {}
+
+
+def instrument_engine(engine, name):
+    """Time pool checkouts and expose the pool's size / in-use / overflow gauges."""
+    pool = engine.pool
+    if getattr(pool, "_metrics_name", None):
+        return engine
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - start, pool=name)
+
+    pool.connect = timed_connect
+    pool._metrics_name = name
+    event.listen(pool, "checkout", lambda *args: DB_POOL_CHECKOUTS.inc(pool=name))
+    _POOLS[name] = pool
+    return engine
+
+
+def _pool_stats():
+    for name, pool in list(_POOLS.items()):
+        for stat, method in (("size", "size"), ("in_use", "checkedout"), ("idle", "checkedin"), ("overflow", "overflow")):
+            fn = getattr(pool, method, None)
+            if fn is not None:
+                # QueuePool.overflow() counts up from -pool_size
+                yield {"pool": name, "stat": stat}, max(0, fn()) if stat == "overflow" else fn()
+
+
+GaugeFunc("urbanpulse_db_pool", "Connection pool state (size, in_use, idle, overflow)", ["pool", "stat"], _pool_stats)
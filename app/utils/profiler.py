@@ -0,0 +1,326 @@
+"""
+Opt-in request profiling and SQL statement instrumentation.
+
+Off by default. A request is profiled when it carries ``X-Profile: <ADMIN_TOKEN>``
+or ``?profile=<ADMIN_TOKEN>``, or when it is picked by PROFILE_SAMPLE_RATE.
+A profiled request records:
+
+- wall time of the whole request, of the endpoint function and of the rest of
+  the route handler (parameter validation + response serialization),
+- every SQL statement it ran, with duration and parameters (SQLAlchemy cursor
+  events, so ORM and Core queries alike),
+- a cProfile call-stack profile of the endpoint (top functions by cumulative time).
+
+The last PROFILE_KEEP profiles are kept in memory; the response carries an
+``X-Profile-Id`` header to look one up. Independently, statements slower than
+SLOW_QUERY_MS from any engine (API, collector, aggregator) go into a bounded
+slow-query log. Both are served by /api/admin.
+"""
+
+import contextvars
+import cProfile
+import functools
+import hmac
+import inspect
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+from app.utils.metrics import route_template
+
+_current = contextvars.ContextVar("urbanpulse_request_profile", default=None)
+_profiles = deque(maxlen=settings.PROFILE_KEEP)
+_slow_queries = deque(maxlen=settings.SLOW_QUERY_KEEP)
+_lock = threading.Lock()
+
+# not profiled even when sampled
+SKIP_PREFIXES = ("/api/admin", "/metrics", "/favicon.ico")
+MAX_STATEMENTS = 200
+
+
+# ---------- Formatting ----------
+def _short(value, limit=500):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _statement(statement, limit=2000):
+    text = re.sub(r"\s+", " ", statement).strip()
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _params(parameters, executemany):
+    if executemany and isinstance(parameters, (list, tuple)):
+        return {"rows": len(parameters), "first": _short(parameters[0]) if parameters else None}
+    return _short(parameters)
+
+
+def _function_name(key):
+    filename, line, name = key
+    for marker in ("site-packages" + os.sep, os.getcwd() + os.sep):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    return f"{filename}:{line}({name})"
+
+
+def _top_functions(profiler, n):
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:n]
+    return [
+        {
+            "function": _function_name(key),
+            "calls": nc,
+            "primitive_calls": cc,
+            "self_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        }
+        for key, (cc, nc, tt, ct, _) in rows
+    ]
+
+
+# ---------- Request profile ----------
+class RequestProfile:
+    def __init__(self, method, path, query, reason):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.query = query
+        self.reason = reason
+        self.started_at = datetime.now(timezone.utc)
+        self.route = None
+        self.status = None
+        self.total_s = 0.0
+        self.handler_s = 0.0
+        self.endpoint_s = 0.0
+        self.sql_count = 0
+        self.sql_s = 0.0
+        self.statements = []
+        self.functions = None
+        self.profile_note = None
+        self._lock = threading.Lock()
+
+    def add_statement(self, seconds, statement, parameters, executemany):
+        with self._lock:
+            self.sql_count += 1
+            self.sql_s += seconds
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append({
+                    "ms": round(seconds * 1000, 3),
+                    "statement": _statement(statement),
+                    "params": _params(parameters, executemany),
+                })
+
+    def run_endpoint(self, fn, args, kwargs):
+        """Call the endpoint under cProfile (in the thread it runs on)."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            enabled = True
+        except ValueError as e:  # another profiler is active on this interpreter
+            enabled, self.profile_note = False, str(e)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.endpoint_s += time.perf_counter() - start
+            if enabled:
+                profiler.disable()
+                self.functions = _top_functions(profiler, settings.PROFILE_TOP_FUNCTIONS)
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "started_at": self.started_at.isoformat(),
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "reason": self.reason,
+            "total_ms": round(self.total_s * 1000, 3),
+            "endpoint_ms": round(self.endpoint_s * 1000, 3),
+            # validation, dependencies and response serialization inside the route handler
+            "handler_overhead_ms": round(max(0.0, self.handler_s - self.endpoint_s) * 1000, 3),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_s * 1000, 3),
+        }
+
+    def to_dict(self):
+        return {
+            **self.summary(),
+            "query": self.query,
+            "statements": sorted(self.statements, key=lambda s: s["ms"], reverse=True),
+            "statements_truncated": self.sql_count > len(self.statements),
+            "functions": self.functions,
+            "profile_note": self.profile_note,
+        }
+
+
+# ---------- Stores ----------
+def profiles(limit=None):
+    with _lock:
+        items = list(_profiles)[::-1]
+    return [p.summary() for p in items[:limit]]
+
+
+def get_profile(profile_id):
+    with _lock:
+        for p in _profiles:
+            if p.id == profile_id:
+                return p.to_dict()
+    return None
+
+
+def slow_queries(limit=None):
+    with _lock:
+        return list(_slow_queries)[::-1][:limit]
+
+
+def clear_profiles():
+    with _lock:
+        _profiles.clear()
+
+
+def clear_slow_queries():
+    with _lock:
+        _slow_queries.clear()
+
+
+# ---------- SQLAlchemy hooks (all engines) ----------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.add_statement(elapsed, statement, parameters, executemany)
+    if settings.SLOW_QUERY_MS > 0 and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "ms": round(elapsed * 1000, 3),
+            "statement": _statement(statement),
+            "params": _params(parameters, executemany),
+            "database": conn.engine.url.render_as_string(hide_password=True),
+            "request": f"{profile.method} {profile.path}" if profile is not None else None,
+            "thread": threading.current_thread().name,
+        }
+        with _lock:
+            _slow_queries.append(entry)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+# ---------- Route class + middleware ----------
+def _wrap_endpoint(endpoint):
+    @functools.wraps(endpoint)
+    def profiled_endpoint(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        return profile.run_endpoint(endpoint, args, kwargs)
+    return profiled_endpoint
+
+
+class ProfiledRoute(APIRoute):
+    """
+    APIRoute that profiles its (sync) endpoint and times the route handler when
+    the request is being profiled; otherwise one context-variable lookup per call.
+    """
+
+    def __init__(self, path, endpoint, **kwargs):
+        if not (inspect.iscoroutinefunction(endpoint) or inspect.isasyncgenfunction(endpoint)):
+            endpoint = _wrap_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            profile = _current.get()
+            if profile is None:
+                return await handler(request)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                profile.handler_s += time.perf_counter() - start
+
+        return profiled_handler
+
+
+def _matches_token(value):
+    token = settings.ADMIN_TOKEN
+    return bool(token and value) and hmac.compare_digest(value.encode(), token.encode())
+
+
+def _reason(scope):
+    if scope["path"].startswith(SKIP_PREFIXES):
+        return None
+    if settings.ADMIN_TOKEN:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile" and _matches_token(value.decode("latin-1")):
+                return "requested"
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if any(_matches_token(v) for v in query.get("profile", [])):
+            return "requested"
+    if settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+class ProfilerMiddleware:
+    """Decides per request whether to profile, and stores the finished profile."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        reason = _reason(scope) if scope["type"] == "http" else None
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        query = {k: v for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()
+                 if k != "profile"}
+        profile = RequestProfile(scope.get("method"), scope["path"], query, reason)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.total_s = time.perf_counter() - start
+            profile.route = route_template(scope)
+            _current.reset(token)
+            with _lock:
+                _profiles.append(profile)
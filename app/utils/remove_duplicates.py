@@ -1,46 +1,118 @@
 """
 Script: remove_duplicates.py
-Purpose: Detect and remove duplicate hourly entries safely for MySQL
+Purpose: Detect and remove duplicate hourly entries without long locks
+
+The table is walked in bounded hour_start ranges (DEDUP_CHUNK_HOURS). In each
+range ROW_NUMBER() over (key, hour_start) picks every row but the newest, and
+those ids are deleted in batches of DEDUP_BATCH_SIZE, each in its own short
+transaction. The aggregator already dedups its own writes, so this is only
+needed for legacy data.
+
+CLI: python -m app.utils.remove_duplicates [--table T] [--dry-run] [--add-unique-index]
 """
 
-from sqlalchemy import text
+import argparse
+from datetime import timedelta
+from sqlalchemy import func, select, text
+from app.config import settings
+from app.db import models
 from app.db.database import engine
 
-def remove_duplicates(table_name, unique_cols):
-    with engine.begin() as conn:
-        print(f"\n🧹 Checking for duplicates in {table_name}...")
+# table -> columns that identify one hourly row
+TABLES = {
+    "traffic_hourly": ["location", "hour_start"],
+    "weather_hourly": ["city", "hour_start"],
+    "air_quality_hourly": ["city", "hour_start"],
+}
+
+
+def _chunks(first, last, hours):
+    step = timedelta(hours=hours)
+    lo = first
+    while lo <= last:
+        yield lo, lo + step
+        lo += step
 
-        # Detect duplicates
-        dup_query = text(f"""
-            SELECT {', '.join(unique_cols)}, COUNT(*) AS duplicate_count
+
+def find_duplicate_ids(conn, table_name, unique_cols, lo, hi):
+    """Ids of every row in [lo, hi) that has a newer row with the same key."""
+    partition = ", ".join(unique_cols)
+    query = text(f"""
+        SELECT id FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY id DESC) AS rn
             FROM {table_name}
-            GROUP BY {', '.join(unique_cols)}
-            HAVING COUNT(*) > 1;
-        """)
-        duplicates = conn.execute(dup_query).fetchall()
-
-        if not duplicates:
-            print(f"✅ No duplicates found in {table_name}.")
-            return
-
-        print(f"⚠️ Duplicates found in {table_name}: {len(duplicates)} groups")
-
-        # Safe delete using JOIN to avoid MySQL 1093 error
-        delete_query = text(f"""
-            DELETE t1 FROM {table_name} t1
-            JOIN {table_name} t2
-            ON { ' AND '.join([f't1.{col} = t2.{col}' for col in unique_cols]) }
-            WHERE t1.id < t2.id;
-        """)
-        result = conn.execute(delete_query)
-        print(f"🗑️ Removed {result.rowcount} duplicate rows from {table_name}")
+            WHERE hour_start >= :lo AND hour_start < :hi
+        ) ranked
+        WHERE rn > 1
+    """)
+    return [row[0] for row in conn.execute(query, {"lo": lo, "hi": hi})]
+
+
+def remove_duplicates(table_name, unique_cols, chunk_hours=None, batch_size=None, dry_run=False, progress=print):
+    """Remove all but the newest row of each key. Returns the number of rows deleted (or found, on dry runs)."""
+    chunk_hours = chunk_hours or settings.DEDUP_CHUNK_HOURS
+    batch_size = batch_size or settings.DEDUP_BATCH_SIZE
+    progress(f"\n🧹 Checking for duplicates in {table_name}...")
+
+    hour_start = models.Base.metadata.tables[table_name].c.hour_start   # typed, so sqlite returns datetimes
+    with engine.connect() as conn:
+        first, last = conn.execute(select(func.min(hour_start), func.max(hour_start))).one()
+    if first is None:
+        progress(f"✅ {table_name} is empty.")
+        return 0
+
+    chunks = list(_chunks(first, last, chunk_hours))
+    removed = 0
+    for i, (lo, hi) in enumerate(chunks, 1):
+        with engine.connect() as conn:
+            ids = find_duplicate_ids(conn, table_name, unique_cols, lo, hi)
+        if ids and not dry_run:
+            for start in range(0, len(ids), batch_size):
+                batch = ids[start:start + batch_size]
+                params = {f"id{n}": value for n, value in enumerate(batch)}
+                with engine.begin() as conn:  # one short transaction per batch
+                    conn.execute(
+                        text(f"DELETE FROM {table_name} WHERE id IN ({', '.join(':' + k for k in params)})"),
+                        params,
+                    )
+        removed += len(ids)
+        if ids or i == len(chunks):
+            progress(f"   [{i}/{len(chunks)}] {lo:%Y-%m-%d} → {hi:%Y-%m-%d}: {len(ids)} duplicates (total {removed})")
+
+    if removed == 0:
+        progress(f"✅ No duplicates found in {table_name}.")
+    elif dry_run:
+        progress(f"⚠️ {removed} duplicate rows in {table_name} (dry run, nothing deleted)")
+    else:
+        progress(f"🗑️ Removed {removed} duplicate rows from {table_name}")
+    return removed
+
+
+def add_unique_index(table_name, unique_cols):
+    """Once a table is clean, let the database reject duplicates (models declare the same constraint)."""
+    name = f"uq_{table_name}_{unique_cols[0]}_hour"
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table_name} ({', '.join(unique_cols)})"))
+    print(f"🔒 Unique index {name} added to {table_name}")
+
 
 def main():
-    print("=== 🧠 UrbanPulse Hourly Duplicate Cleaner ===")
+    parser = argparse.ArgumentParser(description="Remove duplicate hourly rows in small batches")
+    parser.add_argument("--table", choices=sorted(TABLES), help="only this table (default: all hourly tables)")
+    parser.add_argument("--dry-run", action="store_true", help="count duplicates without deleting")
+    parser.add_argument("--add-unique-index", action="store_true", help="add a unique (key, hour_start) index afterwards")
+    args = parser.parse_args()
 
-    remove_duplicates("traffic_hourly", ["location", "hour_start"])
-    remove_duplicates("weather_hourly", ["city", "hour_start"])
-    remove_duplicates("air_quality_hourly", ["city", "hour_start"])
+    print("=== 🧠 UrbanPulse Hourly Duplicate Cleaner ===")
+    for table_name, unique_cols in TABLES.items():
+        if args.table and table_name != args.table:
+            continue
+        remove_duplicates(table_name, unique_cols, dry_run=args.dry_run)
+        if args.add_unique_index and not args.dry_run:
+            try:
+                add_unique_index(table_name, unique_cols)
+            except Exception as e:
+                print(f"⚠️ Could not add unique index to {table_name}: {e}")
 
     print("\n✅ Duplicate cleanup complete.\n")
 
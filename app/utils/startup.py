@@ -0,0 +1,138 @@
+"""
+Startup timing: how long ``import app.main`` and each startup phase took.
+
+``report`` is filled in by app.main (import time, then one entry per startup
+phase: schema, indexes, background warm-up) and served at GET /api/health/startup.
+The API is ready once the synchronous phases are done; the warm-up phases run
+in a background thread afterwards.
+
+Per-module import times come from the interpreter itself
+(``python -X importtime``) in a fresh process:
+
+    python -m app.utils.startup --top 25
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# set when app.main starts importing (it imports this module first)
+IMPORT_STARTED = time.perf_counter()
+
+
+class StartupReport:
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.import_s = None
+        self.ready_s = None
+        self.warm_s = None
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def imported(self):
+        self.import_s = time.perf_counter() - IMPORT_STARTED
+
+    def ready(self):
+        self.ready_s = time.perf_counter() - IMPORT_STARTED
+
+    def warmed(self):
+        self.warm_s = time.perf_counter() - IMPORT_STARTED
+
+    @contextmanager
+    def phase(self, name, background=False):
+        """Time one startup phase; failures are recorded and re-raised."""
+        entry = {"phase": name, "background": background, "status": "ok"}
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Exception as e:
+            entry["status"] = "error"
+            entry["error"] = str(e)
+            raise
+        finally:
+            entry["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            with self._lock:
+                self.phases.append(entry)
+
+    def to_dict(self):
+        def ms(seconds):
+            return round(seconds * 1000, 2) if seconds is not None else None
+
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            "started_at": self.started_at.isoformat(),
+            "import_ms": ms(self.import_s),
+            "ready_ms": ms(self.ready_s),
+            "warm_ms": ms(self.warm_s),
+            "status": "warm" if self.warm_s is not None else "ready" if self.ready_s is not None else "starting",
+            "phases": phases,
+        }
+
+
+report = StartupReport()
+
+
+# ---------- Import-time report (fresh interpreter) ----------
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_times(module="app.main"):
+    """(module, self µs, cumulative µs, depth) for every module ``import module`` loads, in load order."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if m:
+            self_us, cumulative_us, indent, name = m.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"import {module} failed")
+    return rows
+
+
+def summarize(rows, top=25):
+    """Total, per top-level package and the slowest app.* modules."""
+    packages = {}
+    for name, self_us, _, _ in rows:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    app_modules = sorted(
+        ((name, cumulative_us) for name, _, cumulative_us, _ in rows if name == "app" or name.startswith("app.")),
+        key=lambda r: r[1], reverse=True,
+    )
+    return {
+        "total_ms": round(sum(self_us for _, self_us, _, _ in rows) / 1000, 1),
+        "modules": len(rows),
+        "packages": [(p, round(us / 1000, 1)) for p, us in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]],
+        "app_modules": [(m, round(us / 1000, 1)) for m, us in app_modules[:top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-module import time of the API (python -X importtime)")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    summary = summarize(import_times(args.module), args.top)
+    print(f"=== ⏱️ import {args.module}: {summary['total_ms']} ms, {summary['modules']} modules ===")
+    print("\n📦 By top-level package (self time, ms):")
+    for name, ms in summary["packages"]:
+        print(f"   {name:<30} {ms:8.1f}")
+    print("\n🧩 app modules (cumulative, ms):")
+    for name, ms in summary["app_modules"]:
+        print(f"   {name:<40} {ms:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare two benchmark result files from benchmarks.run.
+
+Matches results by (name, days) and reports the ratio of medians. Exits with
+status 1 if any benchmark got slower than --threshold (default 20%), so it can
+gate a CI job.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.2]
+"""
+
+import argparse
+import json
+
+
+def _index(report):
+    index = {}
+    for r in report["results"]:
+        if "median_s" not in r:
+            continue
+        days = r["size"]["days"] if r["size"] else None
+        index[(r["name"], days)] = r["median_s"]
+    return index
+
+
+def compare(baseline, candidate, threshold=0.2):
+    """Rows of (name, days, baseline s, candidate s, ratio, status)."""
+    base, cand = _index(baseline), _index(candidate)
+    rows = []
+    for key in sorted(set(base) | set(cand), key=lambda k: (k[0], k[1] or 0)):
+        old, new = base.get(key), cand.get(key)
+        if old is None or new is None:
+            rows.append((*key, old, new, None, "added" if old is None else "removed"))
+            continue
+        ratio = new / old if old > 0 else float("inf")
+        status = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        rows.append((*key, old, new, ratio, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two UrbanPulse benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"=== ⚖️ {baseline['meta'].get('commit')} → {candidate['meta'].get('commit')} ===")
+    icons = {"slower": "🔺", "faster": "🟢", "same": "  ", "added": "➕", "removed": "➖"}
+    regressions = 0
+    for name, days, old, new, ratio, status in compare(baseline, candidate, args.threshold):
+        size = f"{days:g}d" if days is not None else "-"
+        old_ms = f"{old * 1000:.2f}" if old is not None else "-"
+        new_ms = f"{new * 1000:.2f}" if new is not None else "-"
+        ratio_s = f"x{ratio:.2f}" if ratio is not None else ""
+        print(f"{icons[status]} {name:<55} {size:>6} {old_ms:>10} → {new_ms:>10} ms {ratio_s}")
+        regressions += status == "slower"
+
+    if regressions:
+        print(f"\n⚠️ {regressions} benchmark(s) slower than {args.threshold:.0%}")
+        raise SystemExit(1)
+    print("\n✅ No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Closed-loop load driver for a running UrbanPulse API.
+
+For each concurrency level, N worker threads send requests back to back for
+--duration seconds, each picking endpoints round-robin from the target list.
+Reported per endpoint and level: throughput, p50/p95/p99 latency and the
+status-code breakdown. The first level whose overall throughput stops growing
+by --saturation (default 10%) is flagged as the saturation point.
+
+Point the app at benchmarks.upstream_sim first so live routes never reach the
+real providers:
+
+    python -m benchmarks.upstream_sim --port 9100 --latency-ms 150 --rate-limit 100
+    TOMTOM_BASE_URL=http://127.0.0.1:9100 OPENWEATHER_BASE_URL=http://127.0.0.1:9100 \\
+    OPEN_METEO_URL=http://127.0.0.1:9100/v1/air-quality COLLECTION_INTERVAL=30 \\
+    TOMTOM_DAILY_QUOTA=1e9 OPENWEATHER_DAILY_QUOTA=1e9 OPEN_METEO_DAILY_QUOTA=1e9 \\
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --concurrency 1,4,16,64 --duration 20
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import numpy as np
+import requests
+
+from benchmarks.run import RESULTS_DIR, _git_commit
+
+# live routes (hit the upstreams) and the DB-backed routes most clients poll
+DEFAULT_ENDPOINTS = [
+    "/api/weather/Bangalore?live=true",
+    "/api/traffic/12.9716/77.5946?live=true",
+    "/api/air_quality/?live=true",
+    "/api/weather/Bangalore",
+    "/api/traffic/12.9716/77.5946",
+    "/api/latest/",
+    "/api/hourly",
+    "/api/air_quality/hourly",
+]
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+            "max_ms": round(max(latencies) * 1000, 2)}
+
+
+def run_level(base_url, endpoints, concurrency, duration, timeout):
+    """Drive ``concurrency`` closed-loop workers for ``duration`` seconds."""
+    samples = {ep: [] for ep in endpoints}       # (latency s, status or error name)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        i = offset
+        local = []
+        while time.monotonic() < deadline:
+            ep = endpoints[i % len(endpoints)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                status = session.get(base_url + ep, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            local.append((ep, time.perf_counter() - start, status))
+        session.close()
+        with lock:
+            for ep, latency, status in local:
+                samples[ep].append((latency, status))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    per_endpoint = {}
+    for ep, rows in samples.items():
+        ok = [lat for lat, status in rows if status == 200]
+        per_endpoint[ep] = {
+            "requests": len(rows),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            "ok": len(ok),
+            "statuses": dict(Counter(str(status) for _, status in rows)),
+            **_percentiles(ok),
+        }
+    all_ok = [lat for rows in samples.values() for lat, status in rows if status == 200]
+    total = sum(len(rows) for rows in samples.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "ok_rps": round(len(all_ok) / elapsed, 2),
+        "error_rate": round(1 - len(all_ok) / total, 4) if total else None,
+        **_percentiles(all_ok),
+        "endpoints": per_endpoint,
+    }
+
+
+def saturation_point(levels, threshold=0.1):
+    """First concurrency level whose successful throughput grew by less than ``threshold``."""
+    for prev, cur in zip(levels, levels[1:]):
+        if cur["ok_rps"] < prev["ok_rps"] * (1 + threshold):
+            return cur["concurrency"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running UrbanPulse API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--endpoint", action="append", help="path to hit (repeatable, default: built-in mix)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--saturation", type=float, default=0.1, help="throughput growth below which a level saturates")
+    parser.add_argument("--sim-url", help="upstream simulator URL, to include its /_sim/stats in the report")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    endpoints = args.endpoint or DEFAULT_ENDPOINTS
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    print(f"=== 🚦 UrbanPulse load test: {base_url} ===")
+    results = []
+    for concurrency in levels:
+        print(f"🔁 concurrency={concurrency} for {args.duration:g}s ...", flush=True)
+        level = run_level(base_url, endpoints, concurrency, args.duration, args.timeout)
+        results.append(level)
+        print(f"   {level['throughput_rps']:8.1f} req/s  ok {level['ok_rps']:8.1f}/s  "
+              f"p50 {level['p50_ms']} ms  p95 {level['p95_ms']} ms  p99 {level['p99_ms']} ms  "
+              f"errors {level['error_rate']:.1%}" if level["error_rate"] is not None else "   no requests completed")
+        for ep, r in level["endpoints"].items():
+            statuses = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+            print(f"     {ep:<50} {r['throughput_rps']:7.1f}/s  p50 {r['p50_ms']}  p95 {r['p95_ms']}  "
+                  f"p99 {r['p99_ms']}  [{statuses}]")
+
+    saturated = saturation_point(results, args.saturation)
+    upstream = None
+    if args.sim_url:
+        try:
+            upstream = requests.get(args.sim_url.rstrip("/") + "/_sim/stats", timeout=5).json()
+        except (requests.RequestException, ValueError) as e:
+            print(f"⚠️ Could not read simulator stats: {e}")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "base_url": base_url,
+            "params": {"concurrency": levels, "duration": args.duration, "endpoints": endpoints},
+        },
+        "levels": results,
+        "saturation_concurrency": saturated,
+        "upstream": upstream,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, "load-" + datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if saturated is not None:
+        print(f"\n📈 Throughput saturates at concurrency={saturated}")
+    print(f"✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
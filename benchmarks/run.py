@@ -0,0 +1,211 @@
+"""
+Offline micro-benchmarks for UrbanPulse.
+
+Each data size runs in a fresh child process against its own SQLite database
+in a temp directory (no network, no MySQL), filled by benchmarks.synthetic.
+Timed per size:
+
+- aggregate_hourly_data (first cycle and repeat cycles),
+- the hourly route queries and the series endpoint,
+- response serialization of those results (jsonable_encoder + json.dumps),
+
+plus the AQI calculators once per run. Results are written as JSON
+(benchmarks/results/<timestamp>.json by default) for benchmarks.compare.
+
+Usage:
+    python -m benchmarks.run --days 1,7,30 --points 10 --cities 3 --rate 12
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def timed(fn, repeat=5, warmup=1):
+    """Run fn warmup + repeat times; returns (timing summary, last result)."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "min_s": min(runs),
+        "median_s": statistics.median(runs),
+        "mean_s": statistics.fmean(runs),
+    }, result
+
+
+# ---------- Child: one data size ----------
+def _bench_size(args):
+    # imported here: app modules read DATABASE_URL etc. at import time
+    import numpy as np
+    from fastapi.encoders import jsonable_encoder
+    from app.db import database, models
+    from benchmarks import synthetic
+
+    models.Base.metadata.create_all(bind=database.engine)
+    start = time.perf_counter()
+    rows = synthetic.generate(database.engine, args.points, args.cities, args.days, args.rate, args.seed)
+    size = {"days": args.days, "points": args.points, "cities": args.cities, "rate": args.rate,
+            "raw_rows": sum(v for k, v in rows.items() if not k.endswith("_hourly")),
+            "hourly_rows": sum(v for k, v in rows.items() if k.endswith("_hourly"))}
+    results = [{"name": "generate_synthetic", "size": size, "runs": [time.perf_counter() - start]}]
+
+    def record(name, timing):
+        results.append({"name": name, "size": size, **timing})
+
+    # --- aggregation ---
+    from app.services import data_aggregator
+    first, _ = timed(data_aggregator.aggregate_hourly_data, repeat=1, warmup=0)
+    record("aggregate_hourly_data:first", first)
+    repeat, _ = timed(data_aggregator.aggregate_hourly_data, repeat=args.repeat, warmup=0)
+    record("aggregate_hourly_data:repeat", repeat)
+
+    # --- route queries + serialization ---
+    from app.routes import analytics, weather, air_quality, traffic
+    routes = {
+        "route:/api/weather/hourly": weather.get_hourly_weather,
+        "route:/api/air_quality/hourly": air_quality.get_hourly_air_quality,
+        "route:/api/traffic/hourly": traffic.get_hourly_traffic,
+        "route:/api/analytics/traffic/hourly": analytics.get_traffic_hourly,
+        "route:/api/analytics/weather/hourly": analytics.get_weather_hourly,
+        "route:/api/analytics/air/hourly": analytics.get_air_hourly,
+        "route:/api/analytics/series/air_quality?mode=lttb": lambda db: analytics.get_series(
+            "air_quality", "avg_aqi", key="City0", start=datetime(2000, 1, 1), end=None,
+            max_points=1000, mode="lttb", db=db),
+    }
+    for name, fn in routes.items():
+        db = database.SessionLocal()
+        try:
+            timing, result = timed(lambda: fn(db), repeat=args.repeat)
+            record(name, timing)
+            timing, _ = timed(lambda: json.dumps(jsonable_encoder(result)), repeat=args.repeat)
+            record(name.replace("route:", "serialize:", 1), timing)
+        finally:
+            db.close()
+
+    # --- AQI (size independent) ---
+    if args.with_aqi:
+        from app.services.data_collector import calculate_aqi as collector_aqi
+        from app.routes.air_quality import calculate_aqi as route_aqi
+        values = np.random.default_rng(args.seed).uniform(0, 520, 10000).tolist()
+        for name, fn in (("aqi:data_collector.calculate_aqi", collector_aqi),
+                         ("aqi:air_quality.calculate_aqi", route_aqi)):
+            timing, _ = timed(lambda: [fn(v) for v in values], repeat=args.repeat)
+            results.append({"name": f"{name} x{len(values)}", "size": None, **timing})
+
+    return results
+
+
+def _child(args):
+    results = _bench_size(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+# ---------- Parent ----------
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _run_size(args, days, with_aqi):
+    workdir = tempfile.mkdtemp(prefix="urbanpulse-bench-")
+    out = os.path.join(workdir, "result.json")
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "TOMTOM_KEY": "benchmark", "OPENWEATHER_KEY": "benchmark",
+        "PROFILE_CUBE_PATH": os.path.join(workdir, "profile_cube.npz"),
+        "ANALYTICS_DB_PATH": os.path.join(workdir, "analytics.duckdb"),
+        "CHART_CACHE_DIR": os.path.join(workdir, "charts"),
+        "EXPORT_DIR": os.path.join(workdir, "exports"),
+    }
+    cmd = [sys.executable, "-m", "benchmarks.run", "--child", "--out", out,
+           "--days", str(days), "--points", str(args.points), "--cities", str(args.cities),
+           "--rate", str(args.rate), "--repeat", str(args.repeat), "--seed", str(args.seed)]
+    if with_aqi:
+        cmd.append("--with-aqi")
+    # cwd = workdir so relative paths (logs/, data/) stay out of the repo
+    proc = subprocess.run(cmd, cwd=workdir, env=env, capture_output=not args.verbose, text=True)
+    if proc.returncode != 0:
+        if not args.verbose:
+            sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        raise SystemExit(f"❌ Benchmark for days={days} failed (workdir kept: {workdir})")
+    with open(out, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline UrbanPulse micro-benchmarks (SQLite, synthetic data)")
+    parser.add_argument("--days", default="1,7,30", help="comma-separated history sizes in days")
+    parser.add_argument("--points", type=int, default=10, help="traffic locations")
+    parser.add_argument("--cities", type=int, default=3)
+    parser.add_argument("--rate", type=int, default=12, help="readings per hour per series")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show app output from the benchmark runs")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--with-aqi", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.days = float(args.days)
+        _child(args)
+        return
+
+    sizes = [float(d) for d in args.days.split(",") if d.strip()]
+    print("=== ⏱️ UrbanPulse Benchmarks ===")
+    results = []
+    for i, days in enumerate(sizes):
+        print(f"📦 days={days:g} points={args.points} cities={args.cities} rate={args.rate}/h ...", flush=True)
+        results += _run_size(args, days, with_aqi=(i == 0))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {"days": sizes, "points": args.points, "cities": args.cities,
+                       "rate": args.rate, "repeat": args.repeat, "seed": args.seed},
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for r in results:
+        if "median_s" not in r:
+            continue
+        days = f"{r['size']['days']:g}d" if r["size"] else "-"
+        print(f"   {r['name']:<55} {days:>6} {r['median_s'] * 1000:10.2f} ms")
+    print(f"\n✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
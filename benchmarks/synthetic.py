@@ -0,0 +1,103 @@
+"""
+Synthetic UrbanPulse data for offline benchmarks.
+
+Generates raw readings (traffic per point, weather and air quality per city)
+for the last ``days`` at ``rate`` readings per hour per series, plus the
+hourly rows the aggregator would already have written for every hour before
+the current one. Values follow a daily cycle with noise so the analytics
+code paths see realistic shapes. Deterministic for a given seed.
+"""
+
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import insert
+from app.db import models
+
+BASE_LAT, BASE_LON = 12.9716, 77.5946
+
+
+def _timestamps(days, rate, now):
+    n = int(days * 24 * rate)
+    step = 3600.0 / rate
+    # newest reading a few seconds ago, so the aggregator's 20-minute window has data
+    return [now - timedelta(seconds=5 + step * i) for i in range(n)][::-1]
+
+
+def _daily(ts, rng, base, amplitude, noise):
+    hours = np.array([t.hour + t.minute / 60 for t in ts])
+    return base + amplitude * np.sin((hours - 6) / 24 * 2 * np.pi) + rng.normal(0, noise, len(ts))
+
+
+def _chunks(rows, size=5000):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def generate(engine, points=10, cities=3, days=7, rate=12, seed=42, now=None):
+    """
+    Fill an empty database with synthetic data: ``points`` traffic locations,
+    ``cities`` weather/air quality cities, ``days`` of history at ``rate``
+    readings per hour per series. Returns row counts per table.
+    """
+    rng = np.random.default_rng(seed)
+    now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+    ts = _timestamps(days, rate, now)
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    city_names = [f"City{i}" for i in range(cities)]
+    locations = [
+        (round(BASE_LAT + rng.uniform(-0.05, 0.05), 4), round(BASE_LON + rng.uniform(-0.05, 0.05), 4))
+        for _ in range(points)
+    ]
+
+    traffic, weather, air = [], [], []
+    for lat, lon in locations:
+        free_flow = float(rng.uniform(40, 70))
+        speeds = np.clip(_daily(ts, rng, free_flow * 0.75, -free_flow * 0.2, 3), 3, None)
+        traffic += [
+            {"latitude": lat, "longitude": lon, "current_speed": float(s), "free_flow_speed": free_flow,
+             "confidence": 0.9, "road_closure": "False", "timestamp": t}
+            for t, s in zip(ts, speeds)
+        ]
+    for city in city_names:
+        temps = _daily(ts, rng, 26, 5, 0.8)
+        humidity = np.clip(_daily(ts, rng, 60, -15, 4), 5, 100)
+        pm25 = np.clip(_daily(ts, rng, 45, 20, 8), 1, None)
+        weather += [
+            {"city": city, "temperature": float(t_), "humidity": float(h), "condition": "Clouds", "timestamp": t}
+            for t, t_, h in zip(ts, temps, humidity)
+        ]
+        air += [
+            {"city": city, "aqi": float(p * 1.4), "pm25": float(p), "pm10": float(p * 1.6), "co": 300.0,
+             "no2": float(p * 0.5), "o3": float(p * 0.8), "timestamp": t}
+            for t, p in zip(ts, pm25)
+        ]
+
+    # hourly rows for every completed hour, as earlier aggregation cycles would have left them
+    hours = sorted({t.replace(minute=0, second=0, microsecond=0) for t in ts if t < current_hour})
+    traffic_hourly = [
+        {"location": f"{lat:.4f},{lon:.4f}", "hour_start": h, "avg_speed": float(rng.uniform(20, 60)),
+         "free_flow_avg": float(rng.uniform(50, 70)), "samples": rate, "created_at": now}
+        for lat, lon in locations for h in hours
+    ]
+    weather_hourly = [
+        {"city": c, "hour_start": h, "avg_temp": float(26 + 5 * np.sin(h.hour / 24 * 2 * np.pi)),
+         "avg_humidity": float(rng.uniform(40, 80)), "samples": rate, "created_at": now}
+        for c in city_names for h in hours
+    ]
+    air_hourly = [
+        {"city": c, "hour_start": h, "avg_aqi": float(rng.uniform(50, 150)), "avg_pm25": float(rng.uniform(20, 80)),
+         "avg_pm10": float(rng.uniform(40, 120)), "avg_no2": float(rng.uniform(10, 40)),
+         "avg_o3": float(rng.uniform(20, 60)), "samples": rate, "created_at": now}
+        for c in city_names for h in hours
+    ]
+
+    tables = [
+        (models.TrafficData, traffic), (models.WeatherData, weather), (models.AirQualityData, air),
+        (models.TrafficHourly, traffic_hourly), (models.WeatherHourly, weather_hourly),
+        (models.AirQualityHourly, air_hourly),
+    ]
+    with engine.begin() as conn:
+        for model, rows in tables:
+            for chunk in _chunks(rows):
+                conn.execute(insert(model), chunk)
+    return {model.__tablename__: len(rows) for model, rows in tables}
@@ -0,0 +1,206 @@
+"""
+Local simulator for the TomTom, OpenWeather and Open-Meteo endpoints UrbanPulse calls.
+
+Responses mimic each provider's shape (flowSegmentData, OpenWeather current
+weather, Open-Meteo hourly arrays). Per provider you can set:
+
+- latency: lognormal around ``latency_ms`` (median) with shape ``latency_sigma``,
+- error_rate: fraction of requests answered with a 500,
+- rate_limit / burst: token bucket in requests per second; over it -> 429 with Retry-After.
+
+Run it and point the app at it:
+
+    python -m benchmarks.upstream_sim --port 9100 --latency-ms 120 --error-rate 0.01 --rate-limit 50
+    TOMTOM_BASE_URL=http://127.0.0.1:9100 OPENWEATHER_BASE_URL=http://127.0.0.1:9100 \\
+    OPEN_METEO_URL=http://127.0.0.1:9100/v1/air-quality uvicorn app.main:app
+
+Per-provider overrides: --profile profile.json with {"tomtom": {"latency_ms": 300, ...}, ...}.
+GET /_sim/stats returns request / error / 429 counts per provider.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+PROVIDERS = ("tomtom", "openweather", "open_meteo")
+
+DEFAULT_PROFILE = {
+    "latency_ms": 80.0,
+    "latency_sigma": 0.5,
+    "error_rate": 0.0,
+    "rate_limit": 0.0,   # requests per second, 0 = unlimited
+    "burst": 10.0,
+}
+
+
+class Bucket:
+    def __init__(self, rate, burst):
+        self.rate, self.capacity = rate, max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Returns 0 if admitted, else seconds until a token is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class Simulator:
+    def __init__(self, profiles=None, seed=None):
+        self.profiles = {p: {**DEFAULT_PROFILE, **(profiles or {}).get(p, {})} for p in PROVIDERS}
+        self.buckets = {
+            p: Bucket(cfg["rate_limit"], cfg["burst"]) for p, cfg in self.profiles.items() if cfg["rate_limit"] > 0
+        }
+        self.stats = {p: {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0} for p in PROVIDERS}
+        self.random = random.Random(seed)
+
+    async def gate(self, provider):
+        """Latency, 429 and error injection. Returns an error response or None."""
+        cfg, stats = self.profiles[provider], self.stats[provider]
+        stats["requests"] += 1
+        bucket = self.buckets.get(provider)
+        if bucket is not None:
+            wait = bucket.take()
+            if wait > 0:
+                stats["rate_limited"] += 1
+                return JSONResponse(
+                    {"error": "Too Many Requests", "provider": provider},
+                    status_code=429, headers={"Retry-After": str(max(1, math.ceil(wait)))},
+                )
+        median = cfg["latency_ms"] / 1000
+        if median > 0:
+            await asyncio.sleep(median * math.exp(self.random.gauss(0, cfg["latency_sigma"])))
+        if self.random.random() < cfg["error_rate"]:
+            stats["errors"] += 1
+            return JSONResponse({"error": "Internal Server Error", "provider": provider}, status_code=500)
+        stats["ok"] += 1
+        return None
+
+
+def create_app(profiles=None, seed=None):
+    sim = Simulator(profiles, seed)
+    app = FastAPI(title="UrbanPulse upstream simulator")
+    app.state.sim = sim
+    rnd = sim.random
+
+    @app.get("/traffic/services/4/flowSegmentData/{style}/{zoom}/json")
+    async def tomtom_flow(style: str, zoom: int, point: str = "12.9716,77.5946", unit: str = "KMPH", key: str = ""):
+        error = await sim.gate("tomtom")
+        if error is not None:
+            return error
+        lat, lon = (float(v) for v in point.split(","))
+        free_flow = 40 + (abs(hash(point)) % 30)
+        current = max(3, round(free_flow * rnd.uniform(0.3, 1.0)))
+        return {
+            "flowSegmentData": {
+                "frc": "FRC2",
+                "currentSpeed": current,
+                "freeFlowSpeed": free_flow,
+                "currentTravelTime": round(3600 / current),
+                "freeFlowTravelTime": round(3600 / free_flow),
+                "confidence": round(rnd.uniform(0.7, 1.0), 2),
+                "roadClosure": False,
+                "coordinates": {"coordinate": [
+                    {"latitude": lat + i * 0.0005, "longitude": lon + i * 0.0005} for i in range(12)
+                ]},
+                "@version": "traffic-service-flow-sim",
+            }
+        }
+
+    @app.get("/data/2.5/weather")
+    async def openweather_current(q: str = "Bangalore", appid: str = "", units: str = "metric"):
+        error = await sim.gate("openweather")
+        if error is not None:
+            return error
+        main, description = rnd.choice([("Clouds", "scattered clouds"), ("Clear", "clear sky"), ("Rain", "light rain")])
+        return {
+            "coord": {"lon": 77.5946, "lat": 12.9716},
+            "weather": [{"id": 802, "main": main, "description": description, "icon": "03d"}],
+            "base": "stations",
+            "main": {
+                "temp": round(rnd.uniform(18, 34), 2),
+                "feels_like": round(rnd.uniform(18, 36), 2),
+                "pressure": 1012,
+                "humidity": rnd.randint(30, 95),
+            },
+            "wind": {"speed": round(rnd.uniform(0, 8), 2), "deg": rnd.randint(0, 359)},
+            "dt": int(time.time()),
+            "name": q,
+            "cod": 200,
+        }
+
+    @app.get("/v1/air-quality")
+    async def open_meteo_air_quality(latitude: float = 12.97, longitude: float = 77.59, hourly: str = ""):
+        error = await sim.gate("open_meteo")
+        if error is not None:
+            return error
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hours = [now - timedelta(hours=h) for h in range(23, -1, -1)]
+
+        def series(low, high):
+            return [round(rnd.uniform(low, high), 1) for _ in hours]
+
+        return {
+            "latitude": latitude,
+            "longitude": longitude,
+            "timezone": "GMT",
+            "hourly_units": {"pm10": "μg/m³", "pm2_5": "μg/m³"},
+            "hourly": {
+                "time": [h.strftime("%Y-%m-%dT%H:%M") for h in hours],
+                "pm10": series(20, 150),
+                "pm2_5": series(10, 120),
+                "carbon_monoxide": series(200, 900),
+                "nitrogen_dioxide": series(5, 60),
+                "ozone": series(10, 120),
+            },
+        }
+
+    @app.get("/_sim/stats")
+    def stats():
+        return {"profiles": sim.profiles, "stats": sim.stats}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated TomTom / OpenWeather / Open-Meteo upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_PROFILE["latency_ms"], help="median latency")
+    parser.add_argument("--latency-sigma", type=float, default=DEFAULT_PROFILE["latency_sigma"], help="lognormal shape")
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_PROFILE["error_rate"])
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_PROFILE["rate_limit"], help="req/s per provider, 0 = off")
+    parser.add_argument("--burst", type=float, default=DEFAULT_PROFILE["burst"])
+    parser.add_argument("--profile", help="JSON file with per-provider overrides")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    base = {"latency_ms": args.latency_ms, "latency_sigma": args.latency_sigma, "error_rate": args.error_rate,
+            "rate_limit": args.rate_limit, "burst": args.burst}
+    overrides = {}
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            overrides = json.load(f)
+    profiles = {p: {**base, **overrides.get(p, {})} for p in PROVIDERS}
+
+    import uvicorn
+    print(f"🧪 Upstream simulator on http://{args.host}:{args.port}")
+    uvicorn.run(create_app(profiles, args.seed), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()